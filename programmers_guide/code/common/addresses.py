@@ -0,0 +1,33 @@
+# addresses
+# Compact forms of MAC and IPv4 addresses: MACs as 48-bit ints, IPs as 32-bit ints.
+#
+# NIBs take and hand back MACs in this form, as LazyPacket's ethSrcInt and ethDstInt give
+# them, and apps only turn them into strings for log messages and NetKAT policies, which
+# want "11:11:11:11:11:11" and "10.0.1.2".
+
+import socket, struct
+
+def mac_to_int(mac):
+  return int(mac.replace(":", ""), 16)
+
+HEX_BYTES = [ "%02x" % b for b in range(256) ]
+
+# Policies list every learned MAC, so this gets called a lot.  A table lookup per byte
+# is quicker than formatting the whole int.
+def int_to_mac(i):
+  return HEX_BYTES[i >> 40]+":"+HEX_BYTES[(i >> 32) & 255]+":"+HEX_BYTES[(i >> 24) & 255]+":"+ \
+    HEX_BYTES[(i >> 16) & 255]+":"+HEX_BYTES[(i >> 8) & 255]+":"+HEX_BYTES[i & 255]
+
+# A list of MACs as NetKAT predicates like EthDstEq take them
+def ints_to_macs(macs):
+  return [ int_to_mac(m) for m in macs ]
+
+def ip_to_int(ip):
+  return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+def int_to_ip(i):
+  return socket.inet_ntoa(struct.pack("!I", i))
+
+# The netmask for a CIDR prefix length, e.g. 24 => 0xffffff00
+def mask_for_prefix(prefix_len):
+  return (0xffffffff << (32 - prefix_len)) & 0xffffffff
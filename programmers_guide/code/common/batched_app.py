@@ -0,0 +1,124 @@
+# batched_app
+# A frenetic.App that handles packet_ins in batches.
+#
+# frenetic.App pulls one event at a time from GET /<client_id>/event and handles it
+# before asking for the next.  In a burst - hosts coming up, an ARP storm - each
+# packet_in may learn a MAC and push a whole new policy, only for the next one to push
+# another.  BatchedApp keeps the event pull going flat out and collects events for up to
+# batch_window seconds, or max_batch events, whichever comes first.  While the events
+# are waiting in Frenetic each GET returns at once, so the batch drains the backlog.
+#
+# Runs of packet_ins in a batch go to packet_in_batch(events), where events is a list
+# of (dpid, port_id, payload) tuples.  Other events are handled one by one, in order,
+# by the usual hooks.  The default packet_in_batch calls packet_in for each event and
+# holds back their update()s, so only the last policy is sent, once per batch.  Apps
+# that can do better, say by learning all the MACs first, override packet_in_batch.
+#
+# pkt_outs go through a PktOutBatcher, which is flushed at the end of each batch.
+#
+# BatchedApp is a CoroutineApp, so hooks may be coroutines.  Only the part of a hook
+# before its first yield runs inside the batch.
+
+import time, logging
+from tornado.concurrent import Future, chain_future
+from tornado.ioloop import IOLoop
+from frenetic.syntax import PacketIn
+from coroutine_app import CoroutineApp, event_type
+from pkt_out_batcher import PktOutBatcher
+from frenetic_client import update_for_client
+
+class BatchedApp(CoroutineApp):
+
+  # How long to wait for more events after the first one, and how many to take at most.
+  # Apps can override these like client_id.
+  batch_window = 0.01
+  max_batch = 500
+
+  def __init__(self):
+    self.event_batch = []
+    self.batch_timeout = None
+
+    # While a batch is being handled, update() just remembers the latest policy
+    self.in_batch = False
+    self.held_policy = None
+    self.held_update = None
+
+    self.batches = 0
+    self.events = 0
+    self.updates_held = 0
+
+    CoroutineApp.__init__(self)
+    self.pkt_outs = PktOutBatcher(self, logging)
+
+  # frenetic.App calls this, by its private name, when a GET /<client_id>/event returns
+  def _App__handle_event(self, response):
+    if response.exception() != None:
+      # Frenetic went away.  Handle what we have before CoroutineApp reconnects.
+      self.handle_batch()
+    CoroutineApp._App__handle_event(self, response)
+
+  def event_received(self, event):
+    self.event_batch.append(event)
+    if len(self.event_batch) >= self.max_batch:
+      self.handle_batch()
+    elif self.batch_timeout == None:
+      self.batch_timeout = IOLoop.instance().add_timeout(
+        time.time() + self.batch_window, self.handle_batch
+      )
+
+  def handle_batch(self):
+    if self.batch_timeout != None:
+      IOLoop.instance().remove_timeout(self.batch_timeout)
+      self.batch_timeout = None
+    batch = self.event_batch
+    self.event_batch = []
+    if batch == []:
+      return
+    self.batches += 1
+    self.events += len(batch)
+
+    self.in_batch = True
+    try:
+      packet_ins = []
+      for event in batch:
+        if event_type(event) == "packet_in":
+          pk = PacketIn(event)
+          packet_ins.append( (pk.switch_id, pk.port_id, pk.payload) )
+          continue
+        if packet_ins != []:
+          self.packet_in_batch(packet_ins)
+          packet_ins = []
+        self.handle_event(event)
+      if packet_ins != []:
+        self.packet_in_batch(packet_ins)
+    finally:
+      self.in_batch = False
+      self.release_held_update()
+      self.pkt_outs.flush()
+
+  # The default adapter for apps that only know about packet_in
+  def packet_in_batch(self, events):
+    for (dpid, port_id, payload) in events:
+      self.run_hook(self.packet_in, dpid, port_id, payload)
+
+  # Same arguments as frenetic.App.pkt_out, policies included
+  def pkt_out(self, switch_id, payload, actions, in_port=None, policies=None):
+    return self.pkt_outs.pkt_out(switch_id, payload, actions, in_port, policies)
+
+  def update(self, policy):
+    if not self.in_batch:
+      return update_for_client(self, self.client_id, policy)
+    if self.held_update == None:
+      self.held_update = Future()
+    else:
+      self.updates_held += 1
+    self.held_policy = policy
+    return self.held_update
+
+  def release_held_update(self):
+    if self.held_update == None:
+      return
+    (policy, ftr) = (self.held_policy, self.held_update)
+    self.held_policy = None
+    self.held_update = None
+    chain_future(update_for_client(self, self.client_id, policy), ftr)
@@ -0,0 +1,162 @@
+# Benchmark: event-to-action latency, frenetic.App vs. CoroutineApp
+#
+# A stand-in Frenetic runs in its own process and queues packet_ins at a steady rate.
+# Each app answers every packet_in with a pkt_out of the same payload, and the stand-in
+# times each packet from the moment it was queued to the moment its pkt_out arrives.
+# That includes time spent waiting in the event queue, so an app that can't keep up
+# shows it in the tail.
+#
+# In "lookup" mode the app first asks Frenetic something - a query, answered after
+# lookup_ms - before it sends the pkt_out, like an app checking a counter or a host table
+# kept elsewhere.  The frenetic.App version chains the pkt_out onto the query with
+# add_future, the CoroutineApp version yields the query.
+#
+#   python bench_event_latency.py [packets] [packets_per_second] [lookup_ms]
+
+import sys, os, json, time, base64, multiprocessing
+from frenetic.syntax import SetPort
+import frenetic
+from tornado import gen, web
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop, PeriodicCallback
+from coroutine_app import CoroutineApp
+
+PORT = 9124
+
+def run_controller(n_packets, rate, lookup_ms, results):
+  queued = {}
+  answered = {}
+  events = []
+  waiting = []
+  started = []
+
+  def arrive():
+    due = min(n_packets, int((time.time() - started[0]) * rate) + 1)
+    for i in range(len(queued), due):
+      queued[i] = time.time()
+      data = "%08d" % i + "\x00" * 52
+      events.append(json.dumps({
+        "type": "packet_in", "switch_id": 1, "port_id": 1,
+        "payload": { "id": None, "buffer": base64.b64encode(data) }
+      }))
+    while events != [] and waiting != []:
+      waiting.pop(0).set_result(events.pop(0))
+
+  def finish():
+    results.put( (queued, answered) )
+    IOLoop.instance().stop()
+
+  class Version(web.RequestHandler):
+    def get(self):
+      self.write("4.1")
+
+  class Event(web.RequestHandler):
+    @gen.coroutine
+    def get(self, client_id):
+      if started == []:
+        started.append(time.time())
+        PeriodicCallback(arrive, 1).start()
+        IOLoop.instance().call_later(n_packets / float(rate) + 10, finish)
+      ftr = Future()
+      waiting.append(ftr)
+      arrive()
+      event = yield ftr
+      self.write(event)
+
+  class Query(web.RequestHandler):
+    @gen.coroutine
+    def get(self, label):
+      yield gen.sleep(lookup_ms / 1000.0)
+      self.write(json.dumps({ "packets": 0, "bytes": 0 }))
+
+  class PktOut(web.RequestHandler):
+    def post(self):
+      data = base64.b64decode(json.loads(self.request.body)["payload"]["data"])
+      answered[int(data[:8])] = time.time()
+      if len(answered) == n_packets:
+        finish()
+
+  class Switches(web.RequestHandler):
+    def get(self):
+      self.write(json.dumps([ { "switch_id": 1, "ports": [1, 2] } ]))
+
+  web.Application([
+    (r"/version", Version), (r"/(\w+)/event", Event), (r"/query/(\w+)", Query),
+    (r"/pkt_out", PktOut), (r"/current_switches", Switches)
+  ]).listen(PORT, address="127.0.0.1")
+  IOLoop.instance().start()
+
+class CallbackApp(frenetic.App):
+  client_id = "bench"
+  frenetic_http_port = str(PORT)
+  lookup = False
+
+  def connected(self):
+    pass
+
+  def packet_in(self, dpid, port_id, payload):
+    if not self.lookup:
+      self.pkt_out(dpid, payload, SetPort(2))
+      return
+    IOLoop.instance().add_future(
+      self.query("hosts"), lambda f: self.pkt_out(dpid, payload, SetPort(2))
+    )
+
+class CoroutineFloodApp(CoroutineApp):
+  client_id = "bench"
+  frenetic_http_port = str(PORT)
+  lookup = False
+
+  def connected(self):
+    pass
+
+  @gen.coroutine
+  def packet_in(self, dpid, port_id, payload):
+    if self.lookup:
+      yield self.query("hosts")
+    yield self.pkt_out(dpid, payload, SetPort(2))
+
+def run_app(app_class, lookup):
+  # The app's output would only get in the way
+  sys.stdout = open(os.devnull, "w")
+  app_class.lookup = lookup
+  app_class()
+  IOLoop.instance().start()
+
+def measure(app_class, lookup, n_packets, rate, lookup_ms):
+  results = multiprocessing.Queue()
+  controller = multiprocessing.Process(
+    target=run_controller, args=(n_packets, rate, lookup_ms, results)
+  )
+  controller.start()
+  time.sleep(0.5)
+  app = multiprocessing.Process(target=run_app, args=(app_class, lookup))
+  app.start()
+  (queued, answered) = results.get()
+  app.terminate()
+  controller.join()
+  app.join()
+
+  latencies = sorted( (answered[i] - queued[i]) * 1000 for i in answered )
+  if latencies == []:
+    return (0, 0, 0, 0)
+  elapsed = max(answered.values()) - min(queued.values())
+  return (
+    len(answered) / elapsed,
+    latencies[len(latencies) // 2],
+    latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)],
+    n_packets - len(answered)
+  )
+
+if __name__ == '__main__':
+  n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+  rate = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+  lookup_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+  print "%d packet_ins at %d/s, lookups take %.1fms" % (n_packets, rate, lookup_ms)
+  print "%-14s%-8s%12s%12s%12s%10s" % ("app", "mode", "actions/s", "p50 ms", "p99 ms", "lost")
+  for lookup in [ False, True ]:
+    for app_class in [ CallbackApp, CoroutineFloodApp ]:
+      print "%-14s%-8s%12.0f%12.2f%12.2f%10d" % (
+        (app_class.__bases__[0].__name__, "lookup" if lookup else "flood") + \
+        measure(app_class, lookup, n_packets, rate, lookup_ms)
+      )
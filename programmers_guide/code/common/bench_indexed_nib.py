@@ -0,0 +1,110 @@
+# Benchmark: NIB lookups with and without IndexedNIB's reverse indexes
+#
+# ScanningNIB below is how the NIBs stored hosts before IndexedNIB: one dictionary of
+# MAC => (dpid, port), with every reverse lookup a scan over all hosts.  We time the
+# operations the apps do on port_down/port_up and when building per-switch policies.
+#
+#   python bench_indexed_nib.py [hosts [switches [lookups]]]
+
+import sys, time, logging
+from indexed_nib import IndexedNIB
+
+class ScanningNIB(object):
+
+  def __init__(self, logger):
+    self.logger = logger
+    self.hosts = {}
+
+  def learn(self, mac, dpid, port_id):
+    self.hosts[mac] = (dpid, port_id)
+
+  def unlearn(self, mac):
+    if mac in self.hosts:
+      del self.hosts[mac]
+
+  def port_for_mac_on_switch(self, mac, dpid):
+    return self.hosts[mac][1] \
+      if mac in self.hosts and self.hosts[mac][0] == dpid else None
+
+  def mac_for_port_on_switch(self, dpid, port_id):
+    for mac in self.hosts:
+      if self.hosts[mac][0] == dpid and self.hosts[mac][1] == port_id:
+        return mac
+    return None
+
+  def unlearn_port_on_switch(self, dpid, port_id):
+    mac = self.mac_for_port_on_switch(dpid, port_id)
+    self.unlearn(mac)
+    return [mac]
+
+  def all_mac_port_pairs_on_switch(self, dpid):
+    return [
+      (mac, self.hosts[mac][1])
+      for mac in self.hosts.keys() if self.hosts[mac][0] == dpid
+    ]
+
+class IndexedHostNIB(IndexedNIB):
+
+  def learn(self, mac, dpid, port_id):
+    self.add_host(mac, dpid, port_id)
+
+PORTS_PER_SWITCH = 48
+
+# As a 48-bit int, the way IndexedNIB keeps it: 02:00:00:00:00:01 and so on
+def mac_for(i):
+  return 0x020000000000 | (i & 0xffffffff)
+
+def location_for(i, n_switches):
+  return (i % n_switches + 1, (i / n_switches) % PORTS_PER_SWITCH + 1)
+
+def timed(fn, repeat):
+  start = time.time()
+  for i in xrange(repeat):
+    fn(i)
+  return (time.time() - start) * 1000000.0 / repeat
+
+def run(nib_class, n_hosts, n_switches, n_lookups):
+  nib = nib_class(logging)
+  macs = [ mac_for(i) for i in xrange(n_hosts) ]
+  locations = [ location_for(i, n_switches) for i in xrange(n_hosts) ]
+
+  def learn(i):
+    (dpid, port_id) = locations[i]
+    nib.learn(macs[i], dpid, port_id)
+  results = { "learn": timed(learn, n_hosts) }
+
+  def port_for_mac(i):
+    j = (i * 7919) % n_hosts
+    nib.port_for_mac_on_switch(macs[j], locations[j][0])
+  results["port_for_mac"] = timed(port_for_mac, n_lookups * 100)
+
+  def mac_for_port(i):
+    (dpid, port_id) = locations[(i * 7919) % n_hosts]
+    nib.mac_for_port_on_switch(dpid, port_id)
+  results["mac_for_port"] = timed(mac_for_port, n_lookups)
+
+  def pairs_on_switch(i):
+    nib.all_mac_port_pairs_on_switch(i % n_switches + 1)
+  results["pairs_on_switch"] = timed(pairs_on_switch, n_lookups)
+
+  # Take ports down, then learn their hosts back so the table stays the same size
+  def port_down_up(i):
+    (dpid, port_id) = locations[(i * 7919) % n_hosts]
+    for mac in nib.unlearn_port_on_switch(dpid, port_id):
+      nib.learn(mac, dpid, port_id)
+  results["port_down_up"] = timed(port_down_up, n_lookups)
+
+  return results
+
+COLUMNS = [ "learn", "port_for_mac", "mac_for_port", "pairs_on_switch", "port_down_up" ]
+
+if __name__ == '__main__':
+  args = [ int(a) for a in sys.argv[1:] ]
+  n_hosts = args[0] if len(args) > 0 else 100000
+  n_switches = args[1] if len(args) > 1 else 100
+  n_lookups = args[2] if len(args) > 2 else 100
+  print "%d hosts on %d switches, microseconds per operation" % (n_hosts, n_switches)
+  print "%-15s" % "nib" + "".join("%16s" % c for c in COLUMNS)
+  for nib_class in [ ScanningNIB, IndexedHostNIB ]:
+    results = run(nib_class, n_hosts, n_switches, n_lookups)
+    print "%-15s" % nib_class.__name__ + "".join("%16.2f" % results[c] for c in COLUMNS)
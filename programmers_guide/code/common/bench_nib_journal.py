@@ -0,0 +1,50 @@
+# Benchmark: how long a respawned app takes to get its hosts back from a NibJournal
+#
+# Learns the hosts into a journaled NIB, so every one is a record in the change log, and
+# times replaying that log into a fresh NIB, which includes folding it into a snapshot.
+# Then we time the restart after that, which replays only the snapshot.
+#
+#   python bench_nib_journal.py [hosts [switches]]
+
+import sys, os, time, shutil, tempfile, logging
+from indexed_nib import IndexedNIB
+from nib_journal import NibJournal
+from bench_indexed_nib import mac_for, location_for
+
+def restore(path, n_hosts):
+  nib = IndexedNIB(logging)
+  journal = NibJournal(path, logging, nib.journal_tables, compact_every=n_hosts * 2)
+  start = time.time()
+  journal.restore_into(nib)
+  elapsed = time.time() - start
+  return (nib, journal, elapsed)
+
+if __name__ == '__main__':
+  args = [ int(a) for a in sys.argv[1:] ]
+  n_hosts = args[0] if len(args) > 0 else 1000000
+  n_switches = args[1] if len(args) > 1 else 100
+  directory = tempfile.mkdtemp()
+  path = os.path.join(directory, "nib")
+  try:
+    (nib, journal, _) = restore(path, n_hosts)
+    start = time.time()
+    for i in xrange(n_hosts):
+      (dpid, port_id) = location_for(i, n_switches)
+      nib.add_host(mac_for(i), dpid, port_id)
+    learn_us = (time.time() - start) * 1000000.0 / n_hosts
+    journal.close()
+    log_mb = os.path.getsize(path + ".log") / 1048576.0
+
+    (nib, journal, from_log) = restore(path, n_hosts)
+    journal.close()
+    snapshot_mb = os.path.getsize(path + ".snap") / 1048576.0
+    (nib, journal, from_snapshot) = restore(path, n_hosts)
+    journal.close()
+
+    print "%d hosts on %d switches" % (n_hosts, n_switches)
+    print "learning with the journal on: %.2f us per host" % learn_us
+    print "restart from the log (%.1f MB):      %.2f s, including compaction" % (log_mb, from_log)
+    print "restart from the snapshot (%.1f MB): %.2f s" % (snapshot_mb, from_snapshot)
+    print "hosts restored: %d" % len(nib.location)
+  finally:
+    shutil.rmtree(directory)
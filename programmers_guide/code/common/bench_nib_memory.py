@@ -0,0 +1,119 @@
+# Benchmark: memory per learned host and lookup time, string keys vs. compact ints
+#
+# StringKeyedNIB is IndexedNIB as it was before addresses.py and host_table.py: MAC
+# strings as keys everywhere and a (dpid, port) tuple per host.  Each NIB is handed MACs
+# the way its apps have them: strings from Packet.ethSrc for StringKeyedNIB, ints from
+# LazyPacket.ethSrcInt for IndexedNIB.  Policies still want strings, so we also time
+# turning a switch's MACs into them.  Each NIB is measured in its own process, since
+# Python rarely hands freed memory back to the OS.
+#
+#   python bench_nib_memory.py [hosts [switches]]
+
+import sys, time, gc, logging, subprocess
+from indexed_nib import IndexedNIB
+from addresses import int_to_mac, ints_to_macs
+from bench_indexed_nib import mac_for, location_for
+
+class StringKeyedNIB(object):
+
+  def __init__(self, logger):
+    self.logger = logger
+    self.location = {}
+    self.macs_on_switch = {}
+    self.macs_on_port = {}
+
+  def learn(self, mac, dpid, port_id):
+    self.location[mac] = (dpid, port_id)
+    self.macs_on_switch.setdefault(dpid, set()).add(mac)
+    self.macs_on_port.setdefault((dpid, port_id), set()).add(mac)
+
+  def port_for_mac_on_switch(self, mac, dpid):
+    loc = self.location.get(mac)
+    return loc[1] if loc != None and loc[0] == dpid else None
+
+  def mac_for_port_on_switch(self, dpid, port_id):
+    for mac in self.macs_on_port.get((dpid, port_id), ()):
+      return mac
+    return None
+
+  def all_learned_macs_on_switch(self, dpid):
+    return list(self.macs_on_switch.get(dpid, ()))
+
+  # Already strings
+  def macs_for_policy(self, macs):
+    return macs
+
+class CompactNIB(IndexedNIB):
+
+  def learn(self, mac, dpid, port_id):
+    self.add_host(mac, dpid, port_id)
+
+  def macs_for_policy(self, macs):
+    return ints_to_macs(macs)
+
+# NIB => (its class, the MAC for host i as its apps would hand it over)
+NIBS = {
+  "StringKeyedNIB": (StringKeyedNIB, lambda i: int_to_mac(mac_for(i))),
+  "CompactNIB": (CompactNIB, mac_for),
+}
+
+def resident_bytes():
+  # Second field of statm is resident pages
+  f = open("/proc/self/statm")
+  pages = int(f.read().split()[1])
+  f.close()
+  return pages * 4096
+
+def timed(fn, repeat):
+  start = time.time()
+  for i in xrange(repeat):
+    fn(i)
+  return (time.time() - start) * 1000000.0 / repeat
+
+def measure(nib_name, n_hosts, n_switches):
+  (nib_class, mac_of) = NIBS[nib_name]
+  locations = [ location_for(i, n_switches) for i in xrange(n_hosts) ]
+  gc.collect()
+  before = resident_bytes()
+  nib = nib_class(logging)
+  for i in xrange(n_hosts):
+    (dpid, port_id) = locations[i]
+    # Each MAC is fresh, as if it came from a packet, and the NIB decides what to keep
+    nib.learn(mac_of(i), dpid, port_id)
+  gc.collect()
+  bytes_per_host = float(resident_bytes() - before) / n_hosts
+
+  macs = [ mac_of(i) for i in xrange(n_hosts) ]
+
+  def port_for_mac(i):
+    j = (i * 7919) % n_hosts
+    nib.port_for_mac_on_switch(macs[j], locations[j][0])
+  def mac_for_port(i):
+    (dpid, port_id) = locations[(i * 7919) % n_hosts]
+    nib.mac_for_port_on_switch(dpid, port_id)
+  def macs_on_switch(i):
+    nib.all_learned_macs_on_switch(i % n_switches + 1)
+  def macs_for_policy(i):
+    nib.macs_for_policy(nib.all_learned_macs_on_switch(i % n_switches + 1))
+  return [ 
+    bytes_per_host, timed(port_for_mac, 100000), timed(mac_for_port, 100000), 
+    timed(macs_on_switch, 20), timed(macs_for_policy, 20)
+  ]
+
+if __name__ == '__main__':
+  args = sys.argv[1:]
+  if len(args) > 0 and args[0] in NIBS:
+    print " ".join(str(r) for r in measure(args[0], int(args[1]), int(args[2])))
+    sys.exit(0)
+  n_hosts = int(args[0]) if len(args) > 0 else 1000000
+  n_switches = int(args[1]) if len(args) > 1 else 100
+  print "%d hosts on %d switches" % (n_hosts, n_switches)
+  print "%-15s %12s %16s %16s %18s %16s" % \
+    ("nib", "bytes/host", "port_for_mac us", "mac_for_port us", "macs_on_switch ms", "as strings ms")
+  for nib_name in [ "StringKeyedNIB", "CompactNIB" ]:
+    out = subprocess.check_output(
+      [ sys.executable, sys.argv[0], nib_name, str(n_hosts), str(n_switches) ]
+    )
+    r = [ float(x) for x in out.split() ]
+    print "%-15s %12.0f %16.2f %16.2f %18.2f %16.2f" % \
+      (nib_name, r[0], r[1], r[2], r[3] / 1000.0, r[4] / 1000.0)
@@ -0,0 +1,45 @@
+# Benchmark: packet_in parsing throughput, Packet vs. LazyPacket
+#
+# For each parser we decode a batch of TCP frames and read the fields a typical app
+# would: just the MACs (the learning switches), the MACs plus VLAN (VlanApp2), or the
+# whole TCP flow (NatApp1).  Frames are built once up front, so only parsing is timed.
+#
+#   python bench_packet_in.py [packets]
+
+import sys, time
+from frenetic.packet import *
+from lazy_packet import LazyPacket
+
+def tcp_payload(i):
+  return Packet(
+    ethSrc="02:00:00:00:%02x:%02x" % ((i >> 8) & 255, i & 255), ethDst="02:00:00:00:ff:fe",
+    ethType=0x800, ipProto=6,
+    ip4Src="10.0.%d.%d" % ((i >> 8) & 255, i & 255), ip4Dst="10.0.255.254",
+    tcpSrcPort=1024 + (i % 60000), tcpDstPort=80
+  ).to_payload()
+
+def read_l2(pkt):
+  return (pkt.ethSrc, pkt.ethDst)
+
+def read_vlan(pkt):
+  return (pkt.ethSrc, pkt.ethDst, pkt.vlan)
+
+def read_flow(pkt):
+  return (pkt.ethSrc, pkt.ethDst, pkt.ethType, pkt.ipProto,
+    pkt.ip4Src, pkt.tcpSrcPort, pkt.ip4Dst, pkt.tcpDstPort)
+
+def run(parser, reader, payloads):
+  start = time.time()
+  for payload in payloads:
+    reader(parser.from_payload(1, 1, payload))
+  return len(payloads) / (time.time() - start)
+
+if __name__ == '__main__':
+  n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  payloads = [ tcp_payload(i) for i in xrange(n_packets) ]
+  readers = [ ("l2", read_l2), ("vlan", read_vlan), ("tcp flow", read_flow) ]
+  print "%d packets, packet_ins per second" % n_packets
+  print "%-12s" % "parser" + "".join("%12s" % name for (name, _) in readers)
+  for parser in [ Packet, LazyPacket ]:
+    print "%-12s" % parser.__name__ + \
+      "".join("%12.0f" % run(parser, reader, payloads) for (_, reader) in readers)
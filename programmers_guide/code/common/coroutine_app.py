@@ -0,0 +1,114 @@
+# coroutine_app
+# A frenetic.App whose event hooks can be Tornado coroutines.
+#
+# Our apps run on Python 2.7, so there's no asyncio, but Tornado's gen.coroutine gives us
+# the same style: a hook decorated with @gen.coroutine can yield the futures returned
+# by update(), pkt_out(), query(), port_stats() and current_switches() and carry on when
+# they resolve, instead of chaining callbacks with add_future.  For example:
+#
+#   @gen.coroutine
+#   def connected(self):
+#     switches = yield self.current_switches()
+#     yield self.update( self.policy() )
+#
+# frenetic.App would call such a hook and drop the future it returns, along with any
+# exception.  CoroutineApp watches each future and logs failures.  It also asks
+# Frenetic for the next event as soon as one arrives, rather than after the hook is
+# done, so a hook waiting on I/O doesn't hold up the events behind it.  Hooks start in
+# the order their events arrive, but coroutine hooks interleave wherever they yield.
+# At most max_hooks_in_flight hooks may be unfinished before we stop pulling events, and
+# the HTTP client allows max_requests_in_flight requests to Frenetic at once.
+#
+# Plain hooks work as before, so apps can move over one hook at a time.
+
+import json, logging
+import frenetic
+from tornado import httpclient
+from tornado.concurrent import is_future
+from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import IOLoop
+from frenetic.syntax import PacketIn
+
+class CoroutineApp(frenetic.App):
+
+  # Apps can override these like client_id
+  max_hooks_in_flight = 1000
+  max_requests_in_flight = 100
+
+  def __init__(self):
+    self.hooks_in_flight = 0
+    self.polling = False
+
+    # frenetic.App makes its HTTP client in __init__, so this has to come first
+    AsyncHTTPClient.configure(
+      AsyncHTTPClient.configured_class(), max_clients=self.max_requests_in_flight
+    )
+    frenetic.App.__init__(self)
+
+  # frenetic.App calls these by their private names.  The first runs when Frenetic
+  # answers GET /version, the second when a GET /<client_id>/event returns.
+  def _App__handle_connect(self, response_future):
+    try:
+      response_future.result()
+    except httpclient.HTTPError:
+      # Let frenetic.App retry
+      return frenetic.App._App__handle_connect(self, response_future)
+    self.poll_event()
+    self.run_hook(self.connected)
+
+  def _App__handle_event(self, response):
+    self.polling = False
+    try:
+      event = json.loads(response.result().body)
+    except httpclient.HTTPError:
+      # Frenetic went away, so let frenetic.App reconnect
+      return frenetic.App._App__handle_event(self, response)
+    self.poll_event()
+    self.event_received(event)
+
+  def poll_event(self):
+    if self.polling or self.hooks_in_flight >= self.max_hooks_in_flight:
+      return
+    self.polling = True
+    self._App__poll_event()
+
+  # Subclasses that queue or forward events, rather than handle them, override this
+  def event_received(self, event):
+    self.handle_event(event)
+
+  def handle_event(self, event):
+    typ = event_type(event)
+    if typ == 'packet_in':
+      pk = PacketIn(event)
+      self.run_hook(self.packet_in, pk.switch_id, pk.port_id, pk.payload)
+    elif typ == 'switch_up':
+      self.run_hook(self.switch_up, event['switch_id'], event['ports'])
+    elif typ == 'switch_down':
+      self.run_hook(self.switch_down, event['switch_id'])
+    elif typ == 'port_up':
+      self.run_hook(self.port_up, event['switch_id'], event['port_id'])
+    elif typ == 'port_down':
+      self.run_hook(self.port_down, event['switch_id'], event['port_id'])
+
+  # Calls a hook, and if it's a coroutine, keeps track of it until it's done
+  def run_hook(self, hook, *args):
+    ftr = hook(*args)
+    if not is_future(ftr):
+      return
+    self.hooks_in_flight += 1
+    IOLoop.instance().add_future(ftr, lambda f: self.hook_done(hook, f))
+
+  def hook_done(self, hook, ftr):
+    self.hooks_in_flight -= 1
+    if ftr.exception() != None:
+      logging.error(
+        hook.__name__+" failed", exc_info=getattr(ftr, "exc_info", lambda: None)()
+      )
+    # We may have stopped pulling events while too many hooks were running
+    self.poll_event()
+
+def event_type(event):
+  # As in frenetic.App, port stats sometimes leak into the event queue
+  if isinstance(event, list) or 'type' not in event:
+    return "UNKNOWN"
+  return event['type']
@@ -0,0 +1,28 @@
+# flood_cache
+# Flood actions, built once per ingress port rather than once per flooded packet.
+#
+# Before a MAC is learned - and all through an ARP storm - every packet_in ends in a
+# flood, and building the port list and SetPort for each one adds up.  FloodCache builds
+# the SetPort for a key like (dpid, in_port) or (vlan, in_port) the first time it's asked
+# for, and hands back the same object after that.  The actions are shared, so nobody
+# should modify them.
+#
+# ports_for is the NIB's function from a key to the list of ports to flood.  The NIB
+# calls invalidate() whenever the answer could change: ports going up or down, a new
+# set of ports, or a port joining a VLAN.
+
+from frenetic.syntax import SetPort
+
+class FloodCache(object):
+
+  def __init__(self, ports_for):
+    self.ports_for = ports_for
+    self.actions = {}
+
+  def get(self, *key):
+    if key not in self.actions:
+      self.actions[key] = SetPort( self.ports_for(*key) )
+    return self.actions[key]
+
+  def invalidate(self):
+    self.actions.clear()
@@ -0,0 +1,41 @@
+# frenetic_client
+# Thin helpers around the Frenetic REST verbs that frenetic.App doesn't expose.
+#
+# frenetic.App.update() always posts to /<client_id>/update_json using the app's own
+# client_id.  Frenetic unions the policies of every client id together, so an app can
+# split its policy into several client ids and update just the piece that changed.
+# These helpers post to the same verb under any client id.
+#
+# If the app has a policy_telemetry (see policy_telemetry.py), every policy posted here
+# is recorded there, along with any build and serialize times noted with timed().
+
+import json, time
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+def frenetic_url(app, path):
+  return "http://%s:%s/%s" % (app.frenetic_http_host, app.frenetic_http_port, path)
+
+# Runs fn(*args), and if the app keeps telemetry, notes how long it took as the given
+# stage - "build" or "serialize" - of the next update for client_id
+def timed(app, client_id, stage, fn, *args):
+  telemetry = getattr(app, "policy_telemetry", None)
+  if telemetry == None:
+    return fn(*args)
+  start = time.time()
+  result = fn(*args)
+  telemetry.note(client_id, stage, time.time() - start)
+  return result
+
+# Pass the policy, too, if you have it, so telemetry needn't parse policy_json again
+def update_json_for_client(app, client_id, policy_json, policy=None):
+  telemetry = getattr(app, "policy_telemetry", None)
+  if telemetry != None:
+    telemetry.record(client_id, policy_json, policy)
+  request = HTTPRequest(
+    frenetic_url(app, client_id + "/update_json"), method='POST', body=policy_json
+  )
+  return AsyncHTTPClient().fetch(request)
+
+def update_for_client(app, client_id, policy):
+  policy_json = timed(app, client_id, "serialize", lambda: json.dumps(policy.to_json()))
+  return update_json_for_client(app, client_id, policy_json, policy)
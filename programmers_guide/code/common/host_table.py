@@ -0,0 +1,71 @@
+# host_table
+# Where each learned host is attached, stored in columns rather than one object per host.
+#
+# A row holds a host's MAC, switch dpid and port as unsigned ints in array.array columns,
+# and row_for maps the MAC (as an int, see addresses.py) to its row.  At a million hosts
+# that's about a third of the memory of a dictionary of (dpid, port) tuples keyed by MAC
+# strings.  Rows freed by remove() are reused by the next add().
+#
+# Switches with no dpid, as in the single-switch NIBs, are stored as NO_DPID.
+
+from array import array
+
+NO_DPID = 0xffffffffffffffff
+
+class HostTable(object):
+
+  def __init__(self):
+    # "L" is 64 bits on the 64-bit Unix machines we run on
+    self.macs = array("L")
+    self.dpids = array(self.macs.typecode)
+    self.ports = array("I")
+    self.row_for = {}
+    self.free_rows = []
+
+  def add(self, mac, dpid, port_id):
+    dpid = NO_DPID if dpid == None else dpid
+    if mac in self.row_for:
+      row = self.row_for[mac]
+      self.dpids[row] = dpid
+      self.ports[row] = port_id
+    elif len(self.free_rows) > 0:
+      row = self.free_rows.pop()
+      self.macs[row] = mac
+      self.dpids[row] = dpid
+      self.ports[row] = port_id
+      self.row_for[mac] = row
+    else:
+      self.row_for[mac] = len(self.macs)
+      self.macs.append(mac)
+      self.dpids.append(dpid)
+      self.ports.append(port_id)
+
+  # Forget a host, returning where it was attached
+  def remove(self, mac):
+    row = self.row_for.pop(mac)
+    self.free_rows.append(row)
+    return self.location_in_row(row)
+
+  def location_in_row(self, row):
+    dpid = self.dpids[row]
+    return (None if dpid == NO_DPID else int(dpid), int(self.ports[row]))
+
+  def get(self, mac):
+    row = self.row_for.get(mac)
+    return None if row == None else self.location_in_row(row)
+
+  def port_on_switch(self, mac, dpid):
+    row = self.row_for.get(mac)
+    if row == None or self.dpids[row] != (NO_DPID if dpid == None else dpid):
+      return None
+    return int(self.ports[row])
+
+  def iteritems(self):
+    for (mac, row) in self.row_for.iteritems():
+      yield (mac, self.location_in_row(row))
+
+  def __contains__(self, mac):
+    return mac in self.row_for
+
+  def __len__(self):
+    return len(self.row_for)
@@ -0,0 +1,159 @@
+# hot_path_timer
+# Per-stage latency histograms for an app's packet_in path, switched on and off at runtime.
+#
+# RoutingApp2 and LoadBalancerApp run every packet through parsing, the switch handler,
+# the router or load balancer handler, a handful of NIB lookups and a pkt_out.  When the
+# tail latency goes up, HotPathTimer tells you which of those it was.  You give it the
+# stages as (stage name, object, method name).  enable() replaces each method with a
+# wrapper that times the call into that stage's Histogram, and disable() puts the
+# originals back, so a disabled timer costs nothing at all on the hot path.  Methods of
+# an instance are wrapped on that instance only.  Static and class methods of a class,
+# like LazyPacket.from_payload, are wrapped on the class, so every user in the process
+# is timed.
+#
+# Stages nest: a handler's time includes the NIB lookups and pkt_outs it makes.  While
+# enabled, a summary of each stage is logged every summary_interval seconds.  Send the
+# process signal (SIGUSR1 by default) to flip it on or off without restarting.
+#
+# Histograms are HDR-style: values are counted in buckets whose width grows with the
+# value, so each is kept to 7 significant bits - within 2% - in a fixed 4096 counters,
+# however wide the range.
+
+import time, signal, inspect
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+SIGNIFICANT_BITS = 7
+SUB_BUCKETS = 1 << SIGNIFICANT_BITS
+HALF_BUCKETS = SUB_BUCKETS >> 1
+
+class Histogram(object):
+
+  def __init__(self):
+    # Values are nanoseconds.  Buckets 0-127 hold one value each, then each run of 64
+    # buckets covers twice the range of the run before.
+    self.counts = [0] * (64 * HALF_BUCKETS)
+    self.count = 0
+    self.total = 0
+    self.max = 0
+
+  def record(self, secs):
+    v = int(secs * 1e9)
+    if v < SUB_BUCKETS:
+      i = v
+    else:
+      shift = v.bit_length() - SIGNIFICANT_BITS
+      i = (shift << 6) + (v >> shift)
+    self.counts[i] += 1
+    self.count += 1
+    self.total += v
+    if v > self.max:
+      self.max = v
+
+  # The smallest value that lands in bucket i
+  @staticmethod
+  def bucket_value(i):
+    if i < SUB_BUCKETS:
+      return i
+    shift = (i >> 6) - 1
+    return ((i & (HALF_BUCKETS - 1)) + HALF_BUCKETS) << shift
+
+  # In nanoseconds, to within a bucket
+  def percentile(self, pct):
+    if self.count == 0:
+      return 0
+    wanted = max(1, (self.count * pct + 99) // 100)
+    seen = 0
+    for (i, n) in enumerate(self.counts):
+      seen += n
+      if seen >= wanted:
+        return self.bucket_value(i)
+    return self.max
+
+  def stats(self):
+    return {
+      "count": self.count,
+      "mean_us": self.total / 1000.0 / self.count if self.count else 0,
+      "p50_us": self.percentile(50) / 1000.0,
+      "p99_us": self.percentile(99) / 1000.0,
+      "p999_us": self.percentile(99.9) / 1000.0,
+      "max_us": self.max / 1000.0,
+    }
+
+class HotPathTimer(object):
+
+  def __init__(self, logger, stages, summary_interval=60, toggle_signal=signal.SIGUSR1):
+    self.logger = logger
+    self.stages = stages
+    self.summary_interval = summary_interval
+    self.histograms = dict( (stage, Histogram()) for (stage, _, _) in stages )
+    self.enabled = False
+    # (object, method name, what it had before, if anything) for each wrapped method
+    self.originals = []
+    self.summaries = None
+    if toggle_signal != None:
+      signal.signal(toggle_signal,
+        lambda signum, frame: IOLoop.instance().add_callback_from_signal(self.toggle)
+      )
+
+  def wrap(self, stage, owner, name):
+    original = getattr(owner, name)
+    histogram = self.histograms[stage]
+    def timed(*args, **kwargs):
+      start = time.time()
+      try:
+        return original(*args, **kwargs)
+      finally:
+        histogram.record(time.time() - start)
+    self.originals.append( (owner, name, vars(owner).get(name)) )
+    setattr(owner, name, staticmethod(timed) if inspect.isclass(owner) else timed)
+
+  def enable(self):
+    if self.enabled:
+      return
+    self.enabled = True
+    for (stage, owner, name) in self.stages:
+      self.wrap(stage, owner, name)
+    if self.summary_interval != None:
+      self.summaries = PeriodicCallback(self.log_summary, self.summary_interval * 1000)
+      self.summaries.start()
+    self.logger.info("Hot path timing on")
+
+  def disable(self):
+    if not self.enabled:
+      return
+    self.enabled = False
+    # Unwrap in reverse, in case one method was wrapped twice
+    for (owner, name, saved) in reversed(self.originals):
+      if saved != None:
+        setattr(owner, name, saved)
+      else:
+        delattr(owner, name)
+    self.originals = []
+    if self.summaries != None:
+      self.summaries.stop()
+      self.summaries = None
+    self.logger.info("Hot path timing off")
+
+  def toggle(self):
+    if self.enabled:
+      self.disable()
+    else:
+      self.enable()
+
+  def stats(self):
+    return dict( (stage, h.stats()) for (stage, h) in self.histograms.items() )
+
+  def log_summary(self):
+    logged = set()
+    for (stage, _, _) in self.stages:
+      if stage in logged:
+        continue
+      logged.add(stage)
+      s = self.histograms[stage].stats()
+      if s["count"] == 0:
+        continue
+      s["stage"] = stage
+      self.logger.info(
+        ("Hot path %(stage)s: %(count)d calls, mean %(mean_us).1fus, p50 %(p50_us).1fus, " +
+        "p99 %(p99_us).1fus, p99.9 %(p999_us).1fus, max %(max_us).1fus") % s
+      )
@@ -0,0 +1,149 @@
+# indexed_nib
+# Base class for the NIBs that learn where hosts are attached.
+#
+# Alongside the host table we keep each host's location and two reverse indexes, so
+# questions like "which MACs are on this switch?" or "which MACs are behind this port?"
+# cost O(answer), not O(all hosts):
+#
+#   location        HostTable: 0x111111111111 => (1234867, 1), ...
+#   macs_on_switch  { 1234867: set([0x111111111111, ...]), ... }
+#   macs_on_port    { (1234867, 1): set([0x111111111111, ...]), ... }
+#
+# MACs are 48-bit ints (see addresses.py) and locations live in array columns (see
+# host_table.py), which takes about half the memory of string keys and tuples.  The
+# methods here take and return MACs as ints too, as LazyPacket's ethSrcInt and ethDstInt
+# give them, so the packet_in path never converts.  Apps turn them into strings with
+# int_to_mac only where they build NetKAT policies or log messages.
+#
+# NIBs that remember more about a host than where it is - a ConnectedDevice, say - pass
+# it to add_host, and find it in the hosts dictionary keyed by MAC.
+#
+# A port may have any number of MACs behind it, as when it's cabled to a hub or another
+# switch.  NIBs for a single switch just use None as the dpid.
+#
+# All of this is per instance.  Subclasses must call IndexedNIB.__init__.
+#
+# Hosts are kept until unlearned, unless a MacAger (see mac_aging.py) is attached with
+# set_aging, in which case it's told about every host learned and forgotten.
+#
+# Likewise, a NibJournal (see nib_journal.py) attached with set_journal records every
+# host learned and forgotten in its "hosts" table, and restore() puts them back.
+# Subclasses with more to remember add tables of their own.
+
+from host_table import HostTable, NO_DPID
+
+class IndexedNIB(object):
+
+  def __init__(self, logger):
+    self.logger = logger
+    self.hosts = {}
+    self.location = HostTable()
+    self.macs_on_switch = {}
+    self.macs_on_port = {}
+    self.aging = None
+    self.journal = None
+
+  def set_aging(self, aging):
+    self.aging = aging
+
+  # MAC => (dpid, port)
+  journal_tables = [ ("hosts", "Q", "QI") ]
+
+  def set_journal(self, journal):
+    self.journal = journal
+
+  def journal_records(self):
+    for (mac, (dpid, port_id)) in self.location.iteritems():
+      yield ("hosts", (mac,), (NO_DPID if dpid == None else dpid, port_id))
+
+  def restore(self, table, key, value):
+    if table == "hosts":
+      mac = key[0]
+      if value == None:
+        self.unlearn(mac)
+      else:
+        (dpid, port_id) = value
+        self.restore_host(mac, None if dpid == NO_DPID else dpid, port_id)
+
+  # Subclasses that keep an entry for each host make it here
+  def restore_host(self, mac, dpid, port_id):
+    self.add_host(mac, dpid, port_id)
+
+  def add_host(self, mac, dpid, port_id, entry=None):
+    # A MAC that moved is forgotten at its old location first
+    if mac in self.location:
+      self.remove_host(mac)
+    if entry != None:
+      self.hosts[mac] = entry
+    self.location.add(mac, dpid, port_id)
+    self.macs_on_switch.setdefault(dpid, set()).add(mac)
+    self.macs_on_port.setdefault((dpid, port_id), set()).add(mac)
+    if self.aging != None:
+      self.aging.learned(mac)
+    if self.journal != None:
+      self.journal.set("hosts", (mac,), (NO_DPID if dpid == None else dpid, port_id))
+
+  def remove_host(self, mac):
+    (dpid, port_id) = self.location.remove(mac)
+    self.hosts.pop(mac, None)
+    self.discard_from_index(self.macs_on_switch, dpid, mac)
+    self.discard_from_index(self.macs_on_port, (dpid, port_id), mac)
+    if self.aging != None:
+      self.aging.forgotten(mac)
+    if self.journal != None:
+      self.journal.delete("hosts", (mac,))
+
+  def discard_from_index(self, index, key, mac):
+    macs = index[key]
+    macs.discard(mac)
+    if len(macs) == 0:
+      del index[key]
+
+  # We've heard from a learned host, so it shouldn't age out yet
+  def touch(self, mac):
+    if self.aging != None:
+      self.aging.touch(mac)
+
+  def knows(self, mac):
+    return mac in self.location
+
+  def unlearn(self, mac):
+    if self.knows(mac):
+      self.remove_host(mac)
+
+  # Forget every MAC behind a port, returning the list of MACs forgotten
+  def unlearn_port_on_switch(self, dpid, port_id):
+    macs = self.macs_for_port_on_switch(dpid, port_id)
+    for mac in macs:
+      self.unlearn(mac)
+    return macs
+
+  def location_of(self, mac):
+    return self.location.get(mac)
+
+  def port_for_mac_on_switch(self, mac, dpid):
+    return self.location.port_on_switch(mac, dpid)
+
+  def macs_for_port_on_switch(self, dpid, port_id):
+    return list(self.macs_on_port.get((dpid, port_id), ()))
+
+  # Any one of the MACs behind a port, or None
+  def mac_for_port_on_switch(self, dpid, port_id):
+    for mac in self.macs_on_port.get((dpid, port_id), ()):
+      return mac
+    return None
+
+  def all_learned_macs_on_switch(self, dpid):
+    return list(self.macs_on_switch.get(dpid, ()))
+
+  def all_mac_port_pairs_on_switch(self, dpid):
+    return [
+      (mac, self.location.port_on_switch(mac, dpid))
+      for mac in self.macs_on_switch.get(dpid, ())
+    ]
+
+  def all_learned_macs(self):
+    return self.location.row_for.keys()
+
+  def all_mac_dpid_pairs(self):
+    return [ (mac, loc[0]) for (mac, loc) in self.location.iteritems() ]
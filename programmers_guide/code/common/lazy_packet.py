@@ -0,0 +1,158 @@
+# lazy_packet
+# A stand-in for frenetic.packet.Packet that only decodes the headers you read.
+#
+# Packet.from_payload parses the whole frame on every packet_in, but an L2 app only
+# looks at ethSrc, ethDst and maybe vlan.  LazyPacket keeps a memoryview of the payload
+# data and pulls each field out with struct.unpack_from the first time it's read, so
+# nothing is copied and unused headers are never touched.  Fields have the same names as
+# in Packet and come back in the same forms: MACs and IPs as strings, the rest as ints,
+# and None for headers the packet doesn't have.
+#
+# ethSrcInt and ethDstInt give the MACs as 48-bit ints instead, the form the NIBs keep
+# them in (see addresses.py), without making a string on the way.
+#
+# The payload itself is kept in pkt.payload, so you can hand it straight back to pkt_out
+# without reserializing.  LazyPacket is read-only; use Packet if you need to modify one.
+
+import struct
+from addresses import HEX_BYTES
+
+ETH_TYPE_VLAN = 0x8100
+ETH_TYPE_IP = 0x800
+ETH_TYPE_ARP = 0x806
+IP_PROTO_ICMP = 1
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+
+# Decode a field on first read, then cache it on the instance so the next read is a plain
+# attribute lookup
+class lazy_field(object):
+  def __init__(self, decode):
+    self.decode = decode
+    self.__name__ = decode.__name__
+
+  def __get__(self, pkt, cls):
+    if pkt == None:
+      return self
+    value = self.decode(pkt)
+    pkt.__dict__[self.__name__] = value
+    return value
+
+def payload_data(payload):
+  # NotBuffered payloads carry the frame in data, Buffered ones in buffer
+  data = getattr(payload, "data", None)
+  return payload.buffer if data == None else data
+
+class LazyPacket(object):
+
+  def __init__(self, dpid, port_id, payload):
+    self.switch = dpid
+    self.port = port_id
+    self.payload = payload
+    self.frame = memoryview(payload_data(payload))
+
+  @staticmethod
+  def from_payload(dpid, port_id, payload):
+    return LazyPacket(dpid, port_id, payload)
+
+  def mac_at(self, offset):
+    b = struct.unpack_from("!6B", self.frame, offset)
+    return HEX_BYTES[b[0]]+":"+HEX_BYTES[b[1]]+":"+HEX_BYTES[b[2]]+":"+ \
+      HEX_BYTES[b[3]]+":"+HEX_BYTES[b[4]]+":"+HEX_BYTES[b[5]]
+
+  def mac_int_at(self, offset):
+    (high, low) = struct.unpack_from("!HI", self.frame, offset)
+    return (high << 32) | low
+
+  def ip_at(self, offset):
+    return "%d.%d.%d.%d" % struct.unpack_from("!4B", self.frame, offset)
+
+  @lazy_field
+  def ethDst(self):
+    return self.mac_at(0)
+
+  @lazy_field
+  def ethSrc(self):
+    return self.mac_at(6)
+
+  @lazy_field
+  def ethDstInt(self):
+    return self.mac_int_at(0)
+
+  @lazy_field
+  def ethSrcInt(self):
+    return self.mac_int_at(6)
+
+  @lazy_field
+  def tpid(self):
+    return struct.unpack_from("!H", self.frame, 12)[0]
+
+  @lazy_field
+  def vlan(self):
+    if self.tpid != ETH_TYPE_VLAN:
+      return None
+    return struct.unpack_from("!H", self.frame, 14)[0] & 0xfff
+
+  @lazy_field
+  def vlanPcp(self):
+    if self.tpid != ETH_TYPE_VLAN:
+      return None
+    return struct.unpack_from("!H", self.frame, 14)[0] >> 13
+
+  # Where the Ethernet payload starts, past any VLAN tag
+  @lazy_field
+  def l3_offset(self):
+    return 18 if self.tpid == ETH_TYPE_VLAN else 14
+
+  @lazy_field
+  def ethType(self):
+    return struct.unpack_from("!H", self.frame, self.l3_offset - 2)[0]
+
+  # As in OpenFlow 1.0, ARP packets report their opcode as ipProto and their sender and
+  # target addresses as ip4Src and ip4Dst
+  @lazy_field
+  def ipProto(self):
+    if self.ethType == ETH_TYPE_IP:
+      return struct.unpack_from("!B", self.frame, self.l3_offset + 9)[0]
+    elif self.ethType == ETH_TYPE_ARP:
+      return struct.unpack_from("!H", self.frame, self.l3_offset + 6)[0]
+    return None
+
+  @lazy_field
+  def ip4Src(self):
+    if self.ethType == ETH_TYPE_IP:
+      return self.ip_at(self.l3_offset + 12)
+    elif self.ethType == ETH_TYPE_ARP:
+      return self.ip_at(self.l3_offset + 14)
+    return None
+
+  @lazy_field
+  def ip4Dst(self):
+    if self.ethType == ETH_TYPE_IP:
+      return self.ip_at(self.l3_offset + 16)
+    elif self.ethType == ETH_TYPE_ARP:
+      return self.ip_at(self.l3_offset + 24)
+    return None
+
+  @lazy_field
+  def l4_offset(self):
+    ihl = struct.unpack_from("!B", self.frame, self.l3_offset)[0] & 0xf
+    return self.l3_offset + ihl * 4
+
+  def transport_field(self, ports_format, icmp_format, index):
+    if self.ethType != ETH_TYPE_IP:
+      return None
+    if self.ipProto == IP_PROTO_TCP or self.ipProto == IP_PROTO_UDP:
+      return struct.unpack_from(ports_format, self.frame, self.l4_offset)[index]
+    # ICMP type and code stand in for the ports, again as in OpenFlow 1.0
+    elif self.ipProto == IP_PROTO_ICMP:
+      return struct.unpack_from(icmp_format, self.frame, self.l4_offset)[index]
+    return None
+
+  @lazy_field
+  def tcpSrcPort(self):
+    return self.transport_field("!HH", "!BB", 0)
+
+  @lazy_field
+  def tcpDstPort(self):
+    return self.transport_field("!HH", "!BB", 1)
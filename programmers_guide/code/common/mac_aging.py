@@ -0,0 +1,183 @@
+# mac_aging
+# Forgets learned hosts that haven't been heard from in max_age seconds.
+#
+# Deadlines live on a hashed timer wheel: a ring of slots, one per tick, with a host
+# filed in the slot its deadline falls in.  Each tick of the IOLoop empties exactly one
+# slot, so aging costs O(1) per host no matter how many hosts the NIB holds.  The ring
+# is long enough to cover max_age, so everything in a slot is due when it comes up.
+#
+# Seeing a host again doesn't move it on the wheel - we just note the tick.  When its
+# slot comes up we file it again for whatever time it has left.  That keeps touch() to
+# one dictionary write, which matters because it's called on every packet_in.
+#
+# Hosts whose traffic is forwarded by switch rules never reach the controller, so they'd
+# age out while busy.  Give MacAger a query_label function and it counts packets from
+# each host with SendToQuery (see query_policy), and checks the count before forgetting
+# the host.  Whatever expires in one tick is unlearned together and handed to the
+# expired callback in a single list, so the app sends one policy update for all of it.
+# MACs are ints, as the NIB keeps them, and query_label is handed the int.
+#
+# Each query gets query_timeout seconds to answer, since frenetic.App's query() never
+# answers at all if the HTTP request fails.  A host whose query fails or times out goes
+# back on the wheel for another max_age, rather than being forgotten or lost.
+
+import math
+from functools import partial
+from tornado import gen
+from tornado.ioloop import IOLoop, PeriodicCallback
+from frenetic.syntax import *
+from addresses import int_to_mac
+
+class TimerWheel(object):
+
+  def __init__(self, horizon, tick):
+    self.tick = tick
+    # One extra slot, so a deadline a full horizon away doesn't land on the current slot
+    self.slots = [ set() for i in range(int(math.ceil(float(horizon) / tick)) + 1) ]
+    self.now = 0
+
+    # key => tick the key is due on
+    self.deadline = {}
+
+  def schedule(self, key, delay):
+    self.cancel(key)
+    ticks = min(max(1, int(math.ceil(float(delay) / self.tick))), len(self.slots) - 1)
+    due = self.now + ticks
+    self.deadline[key] = due
+    self.slots[due % len(self.slots)].add(key)
+
+  def cancel(self, key):
+    due = self.deadline.pop(key, None)
+    if due != None:
+      self.slots[due % len(self.slots)].discard(key)
+
+  # Move the wheel one tick, returning the keys that just came due
+  def advance(self):
+    self.now += 1
+    i = self.now % len(self.slots)
+    due = self.slots[i]
+    self.slots[i] = set()
+    for key in due:
+      del self.deadline[key]
+    return due
+
+  def __len__(self):
+    return len(self.deadline)
+
+class MacAger(object):
+
+  def __init__(self, app, nib, logger, expired, max_age=300, tick=1.0, query_label=None,
+    query_timeout=10.0):
+    self.app = app
+    self.nib = nib
+    self.logger = logger
+    self.expired = expired
+    self.max_age = max_age
+    self.query_label = query_label
+    self.query_timeout = query_timeout
+    self.wheel = TimerWheel(max_age, tick)
+    self.timer = None
+
+    # MAC => wheel tick we last heard from it
+    self.last_seen = {}
+
+    # MAC => packet count from its query, the last time we looked
+    self.last_count = {}
+
+    nib.set_aging(self)
+
+  def start(self):
+    self.timer = PeriodicCallback(self.advance, self.wheel.tick * 1000)
+    self.timer.start()
+
+  def stop(self):
+    if self.timer != None:
+      self.timer.stop()
+      self.timer = None
+
+  # Called by the NIB when it learns a host
+  def learned(self, mac):
+    self.last_seen[mac] = self.wheel.now
+    self.wheel.schedule(mac, self.max_age)
+
+  # Called by the NIB when it forgets a host, for whatever reason
+  def forgotten(self, mac):
+    self.wheel.cancel(mac)
+    self.last_seen.pop(mac, None)
+    self.last_count.pop(mac, None)
+
+  def touch(self, mac):
+    if mac in self.last_seen:
+      self.last_seen[mac] = self.wheel.now
+
+  def seconds_left(self, mac):
+    return self.last_seen[mac] * self.wheel.tick + self.max_age - self.wheel.now * self.wheel.tick
+
+  def advance(self):
+    stale = []
+    for mac in self.wheel.advance():
+      left = self.seconds_left(mac)
+      if left > 0:
+        self.wheel.schedule(mac, left)
+      else:
+        stale.append(mac)
+    if len(stale) == 0:
+      return
+    if self.query_label == None:
+      self.expire(stale)
+    else:
+      self.check_counters(stale)
+
+  def query_policy(self):
+    macs = self.nib.all_learned_macs()
+    if self.query_label == None or len(macs) == 0:
+      return drop
+    return Union(
+      Filter(EthSrcEq(int_to_mac(mac))) >> SendToQuery(self.query_label(mac)) for mac in macs
+    )
+
+  # Each host's query is handled on its own, so one failing doesn't strand the rest.  The
+  # stale ones are expired together once every query has answered, failed or timed out.
+  def check_counters(self, macs):
+    deadline = IOLoop.instance().time() + self.query_timeout
+    check = { "waiting": len(macs), "stale": [] }
+    for mac in macs:
+      ftr = gen.with_timeout(deadline, self.app.query(self.query_label(mac)))
+      IOLoop.instance().add_future(ftr, partial(self.counter_read, check, mac))
+
+  def counter_read(self, check, mac, ftr):
+    if self.counter_is_stale(mac, ftr):
+      check["stale"].append(mac)
+    check["waiting"] -= 1
+    if check["waiting"] == 0 and len(check["stale"]) > 0:
+      self.expire(check["stale"])
+
+  # Puts mac back on the wheel, unless its count hasn't moved and it's out of time
+  def counter_is_stale(self, mac, ftr):
+    # The host may have been unlearned, or seen again, while we were waiting
+    if mac not in self.last_seen or self.wheel.deadline.get(mac) != None:
+      return False
+    if ftr.exception() != None:
+      # Better to keep a host a while longer than to forget it on a hiccup
+      self.logger.error("Query for "+int_to_mac(mac)+" failed: "+repr(ftr.exception()))
+      self.wheel.schedule(mac, self.max_age)
+      return False
+    packets = ftr.result()[0]
+    if packets > self.last_count.get(mac, 0):
+      self.last_count[mac] = packets
+      self.last_seen[mac] = self.wheel.now
+      self.wheel.schedule(mac, self.max_age)
+    elif self.seconds_left(mac) > 0:
+      self.wheel.schedule(mac, self.seconds_left(mac))
+    else:
+      return True
+    return False
+
+  def expire(self, macs):
+    self.logger.info("Aging out "+str(len(macs))+" hosts")
+    for mac in macs:
+      self.nib.unlearn(mac)
+    self.expired(macs)
+
+  def __len__(self):
+    return len(self.last_seen)
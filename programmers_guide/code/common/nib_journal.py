@@ -0,0 +1,144 @@
+# nib_journal
+# Keeps what a NIB has learned on disk, so a respawned app starts where it left off.
+#
+# Under upstart with respawn (see productionalizing/), every restart used to throw the
+# NIB away, and the network flooded and punted until each host was learned again.  With
+# a NibJournal, every change the NIB makes is appended to a change log, path + ".log".
+# Once compact_every changes have piled up, the NIB's whole state is written out as a
+# snapshot, path + ".snap", and the log starts over.  On restart, restore_into() replays
+# the snapshot and then the log into a fresh NIB, so the app can push its full policy
+# straight away.
+#
+# Both files hold the same fixed-size binary records: a table number, 1 for set or 0 for
+# delete, then the key and value packed with the table's struct formats.  Replaying is
+# one struct.unpack_from per record straight out of a memory-mapped file, with no
+# parsing and no copy of the file in memory, so restoring costs little more than
+# rebuilding the NIB itself: about ten seconds for a million hosts, where relearning
+# them would take a flood for each.  A record cut short by a crash is ignored.  Records
+# are flushed to the OS as they're written, so they survive the app dying, but not the
+# machine.
+#
+# A NIB that keeps a journal provides:
+#
+#   journal_tables       [ (table name, key struct format, value struct format), ... ]
+#   journal_records()    every (table, key, value) that makes up its current state
+#   restore(table, key, value)   applies one record, where value None is a delete
+#   set_journal(journal) starts (or with None, stops) recording changes with
+#                        journal.set and journal.delete
+#
+# Keys and values are tuples of numbers, so MACs and IPs go in as ints (see addresses.py).
+
+import os, mmap, struct, json
+from tornado.ioloop import IOLoop
+
+MAGIC = "NIBJRNL1"
+
+class NibJournal(object):
+
+  def __init__(self, path, logger, tables, compact_every=100000):
+    self.log_path = path + ".log"
+    self.snapshot_path = path + ".snap"
+    self.logger = logger
+    self.compact_every = compact_every
+    # Files start with the table layout, so we never replay records packed differently
+    spec = json.dumps(tables)
+    self.header = MAGIC + struct.pack("!I", len(spec)) + spec
+    self.tables = {}
+    self.table_for = []
+    for (i, (name, key_format, value_format)) in enumerate(tables):
+      record = struct.Struct("!BB" + key_format + value_format)
+      n_keys = len(struct.unpack("!" + key_format, "\0" * struct.calcsize("!" + key_format)))
+      n_values = len(record.unpack("\0" * record.size)) - 2 - n_keys
+      self.tables[name] = (i, record, (0,) * n_values)
+      self.table_for.append( (name, record, n_keys) )
+    self.log = None
+    self.logged = 0
+    self.compaction_pending = False
+    self.snapshot_source = None
+
+  def records_in(self, path):
+    if not os.path.exists(path) or os.path.getsize(path) <= len(self.header):
+      return
+    with open(path, "rb") as f:
+      m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      try:
+        if m[:len(self.header)] != self.header:
+          self.logger.warning("Ignoring "+path+", written for different NIB tables")
+          return
+        offset = len(self.header)
+        while offset < len(m):
+          (name, record, n_keys) = self.table_for[ord(m[offset])]
+          if offset + record.size > len(m):
+            self.logger.warning("Ignoring partial record at the end of "+path)
+            return
+          fields = record.unpack_from(m, offset)
+          offset += record.size
+          key = fields[2:2 + n_keys]
+          yield (name, key, fields[2 + n_keys:] if fields[1] else None)
+      finally:
+        m.close()
+
+  # Replays the journal into nib, then has it record changes here.  Returns the number of
+  # records replayed.
+  def restore_into(self, nib):
+    nib.set_journal(None)
+    counts = []
+    for path in [ self.snapshot_path, self.log_path ]:
+      n = 0
+      for (table, key, value) in self.records_in(path):
+        nib.restore(table, key, value)
+        n += 1
+      counts.append(n)
+    self.logger.info("Restored %d NIB records from %s and %d from %s" %
+      (counts[0], self.snapshot_path, counts[1], self.log_path))
+    self.snapshot_source = nib.journal_records
+    # Fold anything in the log into a fresh snapshot, so the next restart needn't
+    # replay it again
+    if os.path.exists(self.snapshot_path) and os.path.exists(self.log_path) and \
+      os.path.getsize(self.log_path) == len(self.header):
+      self.log = open(self.log_path, "ab")
+    else:
+      self.compact()
+    nib.set_journal(self)
+    return sum(counts)
+
+  def write(self, table, key, value, op):
+    (i, record, _) = self.tables[table]
+    self.log.write(record.pack(i, op, *(key + value)))
+    self.log.flush()
+    self.logged += 1
+    if self.logged >= self.compact_every and not self.compaction_pending:
+      # Wait until the NIB has finished the change it's making
+      self.compaction_pending = True
+      IOLoop.instance().add_callback(self.compact)
+
+  def set(self, table, key, value):
+    self.write(table, key, value, 1)
+
+  def delete(self, table, key):
+    self.write(table, key, self.tables[table][2], 0)
+
+  def compact(self):
+    self.compaction_pending = False
+    tmp_path = self.snapshot_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+      f.write(self.header)
+      for (table, key, value) in self.snapshot_source():
+        (i, record, _) = self.tables[table]
+        f.write(record.pack(i, 1, *(key + value)))
+      f.flush()
+      os.fsync(f.fileno())
+    # A crash before the log is emptied just replays it over the snapshot again, which
+    # ends in the same state
+    os.rename(tmp_path, self.snapshot_path)
+    if self.log != None:
+      self.log.close()
+    self.log = open(self.log_path, "wb")
+    self.log.write(self.header)
+    self.log.flush()
+    self.logged = 0
+
+  def close(self):
+    if self.log != None:
+      self.log.close()
+      self.log = None
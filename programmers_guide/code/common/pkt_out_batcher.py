@@ -0,0 +1,211 @@
+# pkt_out_batcher
+# Sends pkt_outs to Frenetic in batches, pipelined over one keep-alive connection.
+#
+# frenetic.App.pkt_out() makes one POST /pkt_out per packet, and during a flood or when
+# the router releases a queue of packets waiting on ARP, the HTTP round trips add up.
+# PktOutBatcher holds outgoing packets for up to window seconds, or max_packets packets,
+# then writes all their POSTs back to back on a single connection and reads the
+# responses as they come in.  Frenetic answers requests on a connection in order, so
+# each response goes with the oldest request still waiting.  The connection is kept
+# open between batches and reopened if Frenetic closes it.
+#
+# pkt_out() returns a future that resolves when Frenetic has answered that packet, as
+# with frenetic.App.pkt_out().  stats() reports batch sizes and latencies: how long
+# packets sat in the buffer, and how long from writing a batch to its last response.
+
+import json, time, collections
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from tornado.tcpclient import TCPClient
+from frenetic.syntax import PacketOut
+
+class Batch(object):
+  def __init__(self, requests, first_queued):
+    self.requests = requests
+    self.size = sum( len(body) for (body, _) in requests )
+    self.first_queued = first_queued
+    self.sent = None
+    self.unanswered = len(requests)
+
+class PktOutBatcher(object):
+
+  def __init__(self, app, logger, window=0.002, max_packets=100, recent_batches=1000):
+    self.host = app.frenetic_http_host
+    self.port = int(app.frenetic_http_port)
+    self.logger = logger
+    self.window = window
+    self.max_packets = max_packets
+
+    # (body, future) for each packet waiting for the window to close
+    self.buffered = []
+    self.first_queued = None
+    self.timeout = None
+
+    self.stream = None
+    # Batches waiting to be written, and (future, batch) for each request written but
+    # not yet answered, oldest first
+    self.to_send = collections.deque()
+    self.sending = False
+    self.unanswered = collections.deque()
+    self.reading = False
+
+    self.batches = 0
+    self.packets = 0
+    self.bytes = 0
+    self.errors = 0
+    # (packets, bytes, ms waiting in buffer, ms from write to last response) per batch
+    self.recent = collections.deque(maxlen=recent_batches)
+
+  # Takes the same arguments as frenetic.App.pkt_out, where policies, if given, stands
+  # in for actions
+  def pkt_out(self, switch_id, payload, actions, in_port=None, policies=None):
+    msg = PacketOut(switch=switch_id, payload=payload,
+      policies=policies if policies != None else actions, in_port=in_port)
+    ftr = Future()
+    if self.buffered == []:
+      self.first_queued = time.time()
+    self.buffered.append( (json.dumps(msg.to_json()), ftr) )
+    if len(self.buffered) >= self.max_packets:
+      self.flush()
+    elif self.timeout == None:
+      self.timeout = IOLoop.instance().add_timeout(self.first_queued + self.window, self.flush)
+    return ftr
+
+  def flush(self):
+    if self.timeout != None:
+      IOLoop.instance().remove_timeout(self.timeout)
+      self.timeout = None
+    if self.buffered == []:
+      return
+    self.to_send.append( Batch(self.buffered, self.first_queued) )
+    self.buffered = []
+    if not self.sending:
+      self.send_batches()
+
+  def request_for(self, body):
+    return "POST /pkt_out HTTP/1.1\r\nHost: %s:%d\r\nContent-Length: %d\r\n\r\n%s" % \
+      (self.host, self.port, len(body), body)
+
+  # Writes queued batches in order.  Only one of these runs at a time.
+  @gen.coroutine
+  def send_batches(self):
+    self.sending = True
+    try:
+      while len(self.to_send) > 0:
+        batch = self.to_send.popleft()
+        try:
+          if self.stream == None:
+            self.stream = yield TCPClient().connect(self.host, self.port)
+          batch.sent = time.time()
+          for (_, ftr) in batch.requests:
+            self.unanswered.append( (ftr, batch) )
+          self.stream.write( "".join( self.request_for(body) for (body, _) in batch.requests ) )
+          if not self.reading:
+            self.read_responses(self.stream)
+        except (StreamClosedError, IOError) as e:
+          self.fail_unanswered(e, batch)
+    finally:
+      self.sending = False
+
+  @gen.coroutine
+  def read_responses(self, stream):
+    self.reading = True
+    try:
+      while len(self.unanswered) > 0:
+        (status, keep_alive) = yield read_response(stream)
+        (ftr, batch) = self.unanswered.popleft()
+        if status == 200:
+          ftr.set_result(status)
+        else:
+          self.errors += 1
+          ftr.set_exception(IOError("pkt_out failed with HTTP status "+str(status)))
+        batch.unanswered -= 1
+        if batch.unanswered == 0:
+          self.batch_done(batch)
+        if not keep_alive:
+          stream.close()
+          self.stream = None
+          break
+    except (StreamClosedError, IOError, ValueError) as e:
+      self.stream = None
+      self.fail_unanswered(e)
+    finally:
+      self.reading = False
+    # Frenetic closed the connection with requests still unanswered.  They'll never be
+    # answered, so fail them rather than send the packets twice.
+    if len(self.unanswered) > 0:
+      self.fail_unanswered(StreamClosedError())
+
+  def fail_unanswered(self, e, batch=None):
+    self.logger.error("pkt_out connection to Frenetic failed: "+str(e))
+    if self.stream != None:
+      self.stream.close()
+      self.stream = None
+    failed = list(self.unanswered)
+    self.unanswered.clear()
+    if batch != None:
+      failed += [ (ftr, batch) for (_, ftr) in batch.requests if not ftr.done() ]
+    for (ftr, _) in failed:
+      if not ftr.done():
+        self.errors += 1
+        ftr.set_exception(e)
+
+  def batch_done(self, batch):
+    now = time.time()
+    self.batches += 1
+    self.packets += len(batch.requests)
+    self.bytes += batch.size
+    self.recent.append( (
+      len(batch.requests), batch.size,
+      (batch.sent - batch.first_queued) * 1000, (now - batch.sent) * 1000
+    ) )
+
+  def stats(self):
+    stats = {
+      "batches": self.batches, "packets": self.packets, "bytes": self.bytes,
+      "errors": self.errors, "buffered": len(self.buffered)
+    }
+    if len(self.recent) > 0:
+      latencies = sorted( r[3] for r in self.recent )
+      stats["mean_packets"] = sum( r[0] for r in self.recent ) / float(len(self.recent))
+      stats["mean_bytes"] = sum( r[1] for r in self.recent ) / float(len(self.recent))
+      stats["mean_wait_ms"] = sum( r[2] for r in self.recent ) / len(self.recent)
+      stats["p50_latency_ms"] = latencies[len(latencies) // 2]
+      stats["p99_latency_ms"] = latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+    return stats
+
+  def log_stats(self):
+    stats = self.stats()
+    if "mean_packets" not in stats:
+      return
+    self.logger.info(
+      "pkt_out: %(batches)d batches, %(packets)d packets, %(mean_packets).1f packets/batch, "
+      "%(mean_wait_ms).1fms buffered, %(p50_latency_ms).1fms p50 / %(p99_latency_ms).1fms p99" \
+      % stats
+    )
+
+# Reads one HTTP/1.1 response off the stream.  Returns (status, keep_alive).  We only need
+# the status, so the body is read and thrown away.
+@gen.coroutine
+def read_response(stream):
+  head = yield stream.read_until("\r\n\r\n")
+  lines = head.split("\r\n")
+  status = int(lines[0].split(" ")[1])
+  headers = {}
+  for line in lines[1:]:
+    if ":" in line:
+      (name, value) = line.split(":", 1)
+      headers[name.strip().lower()] = value.strip()
+  if headers.get("transfer-encoding", "").lower() == "chunked":
+    while True:
+      chunk_head = yield stream.read_until("\r\n")
+      chunk_size = int(chunk_head.split(";")[0], 16)
+      yield stream.read_bytes(chunk_size + 2)
+      if chunk_size == 0:
+        break
+  elif int(headers.get("content-length", "0")) > 0:
+    yield stream.read_bytes(int(headers["content-length"]))
+  keep_alive = headers.get("connection", "").lower() != "close" and lines[0].startswith("HTTP/1.1")
+  raise gen.Return( (status, keep_alive) )
@@ -0,0 +1,90 @@
+# policy_cache
+# Hash-consed NetKAT policies with memoized JSON.
+#
+# Apps rebuild their whole policy on every update, even though most of it - the
+# Filter(EthDstEq(mac)) >> SetPort(port) rule for each learned host, say - hasn't changed,
+# and frenetic.App.update() then walks the whole tree with to_json() and json.dumps().
+# PolicyCache builds policies through make(), which hands back the very same object for
+# the same constructor and arguments.  Each object remembers its JSON text the first time
+# it's serialized, so serializing a new policy only does real work for the nodes that
+# are new.  Unions, sequences, filters and the like are pasted together from their
+# children's text.
+#
+# Arguments are compared by value for strings, numbers and lists of them, and by
+# identity for everything else, so build children with make() too.  Nodes not used
+# since the last-but-one sweep() are dropped; update() sweeps after every push.
+
+import json
+from frenetic.syntax import Union, Seq, IfThenElse, Filter, And, Or, Not
+from frenetic_client import timed, update_json_for_client
+
+# Nodes whose JSON is just their children's, in a list: class => (type, list field)
+COMBINATORS = {
+  Union: ("union", "pols"), Seq: ("seq", "pols"), And: ("and", "preds"), Or: ("or", "preds")
+}
+
+class PolicyCache(object):
+
+  def __init__(self):
+    # (constructor, args...) => node, for nodes used since the last sweep, and before it
+    self.nodes = {}
+    self.old_nodes = {}
+
+    self.built = 0
+    self.reused = 0
+
+  def make(self, cls, *args):
+    key = (cls,) + args
+    try:
+      node = self.nodes.get(key)
+    except TypeError:
+      # Lists aren't hashable, so key them by their contents.  This is the slow path.
+      key = (cls,) + tuple( tuple(a) if type(a) == list else a for a in args )
+      node = self.nodes.get(key)
+    if node == None:
+      node = self.old_nodes.pop(key, None)
+      if node == None:
+        node = cls(*args)
+        self.built += 1
+      else:
+        self.reused += 1
+      self.nodes[key] = node
+    else:
+      self.reused += 1
+    return node
+
+  # Stand-ins for >> and |, which would build uncached Seq and Union nodes
+  def seq(self, *children):
+    return self.make(Seq, list(children))
+
+  def union(self, children):
+    return self.make(Union, list(children))
+
+  def to_json_text(self, policy):
+    text = getattr(policy, "json_text", None)
+    if text == None:
+      cls = type(policy)
+      if cls in COMBINATORS:
+        (typ, field) = COMBINATORS[cls]
+        text = '{"type": "' + typ + '", "' + field + '": [' + \
+          ", ".join( self.to_json_text(p) for p in policy.children ) + "]}"
+      elif cls == Filter or cls == Not:
+        text = '{"type": "' + ("filter" if cls == Filter else "neg") + '", "pred": ' + \
+          self.to_json_text(policy.pred) + "}"
+      elif cls == IfThenElse:
+        text = self.to_json_text(policy.policy)
+      else:
+        text = json.dumps(policy.to_json())
+      # Policies are never modified after they're built, so the text stays good
+      policy.json_text = text
+    return text
+
+  def sweep(self):
+    self.old_nodes = self.nodes
+    self.nodes = {}
+
+  def update(self, app, policy, client_id=None):
+    client_id = client_id or app.client_id
+    policy_json = timed(app, client_id, "serialize", self.to_json_text, policy)
+    self.sweep()
+    return update_json_for_client(app, client_id, policy_json, policy)
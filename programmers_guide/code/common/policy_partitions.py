@@ -0,0 +1,57 @@
+# policy_partitions
+# Keeps an application policy split into stable partitions, each pushed to Frenetic
+# under its own client id, so a change only re-sends the partition it touches.
+
+import json, zlib
+from frenetic_client import timed, update_json_for_client
+
+# Stable bucket number for a string key like a MAC address.  We use crc32 rather than 
+# hash() so the key lands in the same bucket (and therefore client id) on every run.
+def bucket_for(key, n_buckets):
+  return (zlib.crc32(key) & 0xffffffff) % n_buckets
+
+class PolicyPartitions(object):
+
+  def __init__(self, app, client_id_prefix, policy_for_partition, logger, to_json_text=None):
+    self.app = app
+    self.client_id_prefix = client_id_prefix
+    self.policy_for_partition = policy_for_partition
+    self.logger = logger
+    # Apps building policies with a PolicyCache pass its to_json_text here
+    self.to_json_text = to_json_text or (lambda policy: json.dumps(policy.to_json()))
+
+    # Partition keys whose policy has changed since the last push
+    self.dirty = set()
+
+    # Running totals, handy for benchmarks and log lines
+    self.updates_sent = 0
+    self.bytes_sent = 0
+
+  def client_id_for(self, key):
+    return self.client_id_prefix + "_" + str(key)
+
+  def mark_dirty(self, key):
+    self.dirty.add(key)
+
+  def is_dirty(self):
+    return len(self.dirty) > 0
+
+  def send(self, client_id, policy_json, policy=None):
+    return update_json_for_client(self.app, client_id, policy_json, policy)
+
+  # Returns the future of the update so callers can tell when Frenetic has accepted it
+  def push(self, key):
+    self.dirty.discard(key)
+    client_id = self.client_id_for(key)
+    policy = timed(self.app, client_id, "build", self.policy_for_partition, key)
+    policy_json = timed(self.app, client_id, "serialize", self.to_json_text, policy)
+    self.updates_sent += 1
+    self.bytes_sent += len(policy_json)
+    return self.send(client_id, policy_json, policy)
+
+  # Push every dirty partition.  Returns a dictionary of partition key => future
+  def push_dirty(self):
+    return dict( (key, self.push(key)) for key in list(self.dirty) )
+
+  def push_all(self, keys):
+    return dict( (key, self.push(key)) for key in keys )
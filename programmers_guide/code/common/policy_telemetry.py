@@ -0,0 +1,185 @@
+# policy_telemetry
+# Records how big, and how costly, every policy an app pushes to Frenetic is.
+#
+# Policies like MultiswitchApp3's or LoadBalancerHandler2's grow with the hosts and
+# clients they know about, and the first sign is usually Frenetic taking longer to
+# compile them.  A PolicyTelemetry attached to an app with instrument() records, for each
+# update, the client id, the number of policy and predicate nodes, how deeply they nest,
+# how many distinct tests they make, the JSON size, and how long building and serializing
+# the policy took.  The last window updates for each client id are kept, a summary line
+# is logged every summary_interval seconds, and if dump_port is given, GET
+# /policy_metrics on that port returns the summary and recent updates as JSON.
+#
+# Updates are measured where they are posted, in frenetic_client.  Build and serialize
+# times are only known where the code doing them wraps it in frenetic_client.timed(), as
+# UpdateScheduler, PolicyPartitions and PolicyCache do.  Otherwise they're left out.
+#
+# Where the policy object is handed over along with its JSON, the shape is worked out
+# from the object and remembered on each node, like PolicyCache remembers JSON text, so
+# measuring an update built with a PolicyCache only looks at its new nodes.  Otherwise
+# the JSON is parsed again and walked, which for a big policy costs more than building
+# it did.  Either way measuring isn't free, so apps leave it off unless asked.
+
+import json, time, collections
+import frenetic
+from frenetic.syntax import MultiPred, SinglePolicy, IfThenElse, SetPort, Test, Filter, Not
+from tornado import web
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import PeriodicCallback
+from frenetic_client import update_for_client
+
+# Fields of the JSON nodes that hold sub-policies or sub-predicates
+CHILD_FIELDS = [ "pols", "preds", "pred", "pol" ]
+
+# (nodes, depth, distinct tests) of a policy in Frenetic's JSON form
+def policy_shape(tree):
+  nodes = 0
+  depth = 0
+  tests = set()
+  stack = [ (tree, 1) ]
+  while stack != []:
+    (node, level) = stack.pop()
+    nodes += 1
+    depth = max(depth, level)
+    if node.get("type") == "test":
+      tests.add(json.dumps(node, sort_keys=True))
+    for field in CHILD_FIELDS:
+      children = node.get(field)
+      if isinstance(children, dict):
+        stack.append( (children, level + 1) )
+      elif isinstance(children, list):
+        stack.extend( (child, level + 1) for child in children )
+  return (nodes, depth, len(tests))
+
+# (nodes, depth, distinct tests) of a policy object, the same as policy_shape of its JSON,
+# except the tests are handed back as a frozenset so parents can merge them
+def tree_shape(policy):
+  shape = getattr(policy, "telemetry_shape", None)
+  if shape != None:
+    return shape
+  if isinstance(policy, (MultiPred, SinglePolicy)):
+    # These serialize as the node they wrap
+    shape = tree_shape(policy.hv)
+  elif isinstance(policy, IfThenElse):
+    shape = tree_shape(policy.policy)
+  elif isinstance(policy, SetPort):
+    # One mod, or a union of them
+    n = len(policy.port_list)
+    shape = (1, 1, frozenset()) if n == 1 else (n + 1, 2, frozenset())
+  elif isinstance(policy, Test):
+    value = policy.hv.value_to_json()
+    # Ports and masked IP addresses come as small dictionaries
+    if isinstance(value, dict):
+      value = tuple(sorted(value.items()))
+    shape = (1, 1, frozenset([ (policy.hv.header, value) ]))
+  else:
+    if isinstance(policy, (Filter, Not)):
+      children = [ policy.pred ]
+    else:
+      children = getattr(policy, "children", [])
+    shapes = [ tree_shape(child) for child in children ]
+    tests = [ t for (_, _, t) in shapes ]
+    shape = (
+      1 + sum( n for (n, _, _) in shapes ),
+      1 + max([ d for (_, d, _) in shapes ] or [ 0 ]),
+      tests[0] if len(tests) == 1 else frozenset().union(*tests)
+    )
+  # Policies are never modified after they're built, so the shape stays good
+  policy.telemetry_shape = shape
+  return shape
+
+def mean(values):
+  return sum(values) / float(len(values)) if values != [] else None
+
+class PolicyTelemetry(object):
+
+  def __init__(self, logger, window=100, summary_interval=60, dump_port=None):
+    self.logger = logger
+    self.window = window
+    self.summary_interval = summary_interval
+    self.dump_port = dump_port
+
+    # client id => the last window records, oldest first
+    self.recent = {}
+    # client id => total updates, and updates since the last summary line
+    self.updates = collections.Counter()
+    self.unlogged = collections.Counter()
+    # client id => { "build": secs, "serialize": secs } for the update on its way
+    self.pending = {}
+
+  def instrument(self, app):
+    app.policy_telemetry = self
+    # frenetic.App.update serializes the policy out of our sight, so updates for the
+    # app's own client id go through frenetic_client instead.  Apps that override
+    # update(), like BatchedApp, go through it already.
+    if getattr(type(app).update, "im_func", None) is frenetic.App.update.im_func:
+      app.update = lambda policy: update_for_client(app, app.client_id, policy)
+    if self.summary_interval != None:
+      PeriodicCallback(self.log_summary, self.summary_interval * 1000).start()
+    if self.dump_port != None:
+      self.listen(self.dump_port)
+    return self
+
+  def note(self, client_id, stage, secs):
+    self.pending.setdefault(client_id, {})[stage] = secs
+
+  # policy, if given, is the object policy_json was serialized from
+  def record(self, client_id, policy_json, policy=None):
+    times = self.pending.pop(client_id, {})
+    if policy != None:
+      (nodes, depth, tests) = tree_shape(policy)
+      tests = len(tests)
+    else:
+      (nodes, depth, tests) = policy_shape(json.loads(policy_json))
+    if client_id not in self.recent:
+      self.recent[client_id] = collections.deque(maxlen=self.window)
+    self.recent[client_id].append({
+      "time": time.time(), "nodes": nodes, "depth": depth, "tests": tests,
+      "bytes": len(policy_json),
+      "build_ms": times["build"] * 1000 if "build" in times else None,
+      "serialize_ms": times["serialize"] * 1000 if "serialize" in times else None,
+    })
+    self.updates[client_id] += 1
+    self.unlogged[client_id] += 1
+
+  def summary(self, client_id):
+    records = list(self.recent[client_id])
+    last = records[-1]
+    column = lambda field: [ r[field] for r in records if r[field] != None ]
+    return {
+      "updates": self.updates[client_id],
+      "nodes": last["nodes"], "depth": last["depth"], "tests": last["tests"],
+      "bytes": last["bytes"],
+      "max_nodes": max(column("nodes")), "max_bytes": max(column("bytes")),
+      "mean_build_ms": mean(column("build_ms")),
+      "mean_serialize_ms": mean(column("serialize_ms")),
+    }
+
+  def stats(self):
+    return dict( (client_id, self.summary(client_id)) for client_id in self.recent )
+
+  def log_summary(self):
+    for client_id in sorted(self.unlogged):
+      s = self.summary(client_id)
+      s["client_id"] = client_id
+      s["new"] = self.unlogged[client_id]
+      s["build"] = "-" if s["mean_build_ms"] == None else "%.1f ms" % s["mean_build_ms"]
+      s["serialize"] = \
+        "-" if s["mean_serialize_ms"] == None else "%.1f ms" % s["mean_serialize_ms"]
+      self.logger.info(
+        ("Policy %(client_id)s: %(new)d updates, now %(nodes)d nodes, depth %(depth)d, " +
+        "%(tests)d tests, %(bytes)d bytes.  Build %(build)s, serialize %(serialize)s") % s
+      )
+    self.unlogged.clear()
+
+  def listen(self, port):
+    telemetry = self
+
+    class Dump(web.RequestHandler):
+      def get(self):
+        self.write(json.dumps(dict(
+          (client_id, { "summary": telemetry.summary(client_id), "recent": list(records) })
+          for (client_id, records) in telemetry.recent.items()
+        )))
+
+    HTTPServer(web.Application([ (r"/policy_metrics", Dump) ])).listen(port, address="127.0.0.1")
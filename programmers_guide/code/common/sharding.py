@@ -0,0 +1,199 @@
+# sharding
+# Runs an app as several worker processes, each handling the events of its own switches.
+#
+# One Python process can only use one core, and in a big fabric packet_in handling - and
+# the policy recalculation it triggers - is what runs out first.  run_sharded() starts
+# n_shards copies of an app, each in its own process, and a ShardDispatcher in the
+# parent.  The dispatcher is the only one polling Frenetic for events.  It looks at each
+# event's switch_id and passes it to the worker owning that switch, so all events for a
+# switch are handled in order by one process.  Workers talk to Frenetic directly for
+# everything else: update, pkt_out, current_switches, queries.
+#
+# Each worker only computes policies for its own switches.  Frenetic unions the policies
+# of all client ids, so a worker pushes each switch's policy under its own client id,
+# <client_id>_<dpid>, with a PolicyPartitions.
+#
+# Some state is needed everywhere: a host learned on an edge switch needs rules on every
+# core switch.  Workers share host locations through HostLocations, a small replicated
+# store.  A worker changes its copy and tells the dispatcher, which relays the change to
+# every worker, the sender included.  Every worker applies the relayed changes in the
+# same order, so if two workers learn the same MAC in different places at once, they all
+# end up agreeing on whichever change the dispatcher saw last.
+#
+# Workers and the dispatcher exchange lines of JSON over socket pairs:
+#
+#   { "event": <a Frenetic event> }                     dispatcher to worker
+#   { "hosts": ["learn", mac, dpid, port_id, extra] }   both ways
+#   { "hosts": ["unlearn", mac] }                       both ways
+#   { "link": [dpid, port_id, up] }                     both ways
+#
+# An app takes part by mixing ShardWorker in ahead of its CoroutineApp base, then
+# overriding host_learned and host_unlearned to keep its NIB in step.  Apps that track
+# links between switches call publish_link and override link_changed, which every worker
+# gets, the sender included.
+
+import json, socket, logging, multiprocessing
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.iostream import IOStream, StreamClosedError
+from coroutine_app import CoroutineApp
+from policy_partitions import bucket_for
+
+# Which worker owns a switch.  Like bucket_for, this is the same on every run.
+def shard_for(dpid, n_shards):
+  return bucket_for(str(dpid), n_shards)
+
+def send_message(stream, message):
+  stream.write(json.dumps(message) + "\n")
+
+class HostLocations(object):
+
+  def __init__(self, publish, learned, unlearned):
+    self.publish = publish
+    self.learned = learned
+    self.unlearned = unlearned
+
+    # mac => [dpid, port_id, extra].  extra is anything else the app needs to share
+    # about a host, like its IP address.  Lists, since that's what comes back from JSON.
+    self.locations = {}
+
+  # Changes made by this worker.  The caller has already updated its own NIB.
+  def learn(self, mac, dpid, port_id, extra=None):
+    location = [dpid, port_id, extra]
+    if self.locations.get(mac) == location:
+      return
+    self.locations[mac] = location
+    self.publish(["learn", mac, dpid, port_id, extra])
+
+  def unlearn(self, mac):
+    if mac in self.locations:
+      del self.locations[mac]
+      self.publish(["unlearn", mac])
+
+  # Changes relayed by the dispatcher, including our own coming back
+  def apply(self, change):
+    mac = change[1]
+    if change[0] == "learn":
+      location = change[2:]
+      if self.locations.get(mac) == location:
+        return
+      self.locations[mac] = location
+      self.learned(mac, *location)
+    elif mac in self.locations:
+      del self.locations[mac]
+      self.unlearned(mac)
+
+  def __len__(self):
+    return len(self.locations)
+
+class ShardWorker(object):
+
+  def join_shards(self, shard, n_shards, sock):
+    self.shard = shard
+    self.n_shards = n_shards
+    self.dispatcher = IOStream(sock)
+    self.reading_dispatcher = False
+    self.host_locations = HostLocations(self.publish, self.host_learned, self.host_unlearned)
+
+  def owns(self, dpid):
+    return shard_for(dpid, self.n_shards) == self.shard
+
+  # CoroutineApp calls this once connected to Frenetic.  Our events come from the
+  # dispatcher instead.
+  def poll_event(self):
+    if not self.reading_dispatcher:
+      self.reading_dispatcher = True
+      self.read_dispatcher()
+
+  @gen.coroutine
+  def read_dispatcher(self):
+    try:
+      while True:
+        message = json.loads( (yield self.dispatcher.read_until("\n")) )
+        if "event" in message:
+          self.event_received(message["event"])
+        elif "link" in message:
+          self.link_changed(*message["link"])
+        else:
+          self.host_locations.apply(message["hosts"])
+    except StreamClosedError:
+      # The dispatcher is gone, and we can't do anything useful without it
+      logging.error("Shard "+str(self.shard)+" lost its dispatcher, exiting")
+      IOLoop.instance().stop()
+
+  def publish(self, change):
+    send_message(self.dispatcher, { "hosts": change })
+
+  def publish_link(self, dpid, port_id, up):
+    send_message(self.dispatcher, { "link": [dpid, port_id, up] })
+
+  # Apps override these to bring their NIB in line with another worker's change.  A
+  # learned host may already be known somewhere else, if it moved.
+  def host_learned(self, mac, dpid, port_id, extra):
+    pass
+
+  def host_unlearned(self, mac):
+    pass
+
+  def link_changed(self, dpid, port_id, up):
+    pass
+
+class ShardDispatcher(CoroutineApp):
+
+  def __init__(self, app_class, workers):
+    # Poll the Frenetic the app would have
+    self.client_id = app_class.client_id
+    for setting in [ "frenetic_http_host", "frenetic_http_port" ]:
+      if hasattr(app_class, setting):
+        setattr(self, setting, getattr(app_class, setting))
+    self.workers = workers
+    self.events_sent = [ 0 ] * len(workers)
+    self.changes_relayed = 0
+    CoroutineApp.__init__(self)
+    for worker in workers:
+      self.read_worker(worker)
+
+  def connected(self):
+    logging.info("Dispatching events to "+str(len(self.workers))+" shards")
+
+  def event_received(self, event):
+    # As in frenetic.App, anything without a switch can be dropped
+    if isinstance(event, list) or "switch_id" not in event:
+      return
+    shard = shard_for(event["switch_id"], len(self.workers))
+    self.events_sent[shard] += 1
+    send_message(self.workers[shard], { "event": event })
+
+  @gen.coroutine
+  def read_worker(self, worker):
+    try:
+      while True:
+        line = yield worker.read_until("\n")
+        self.changes_relayed += 1
+        for w in self.workers:
+          w.write(line)
+    except StreamClosedError:
+      logging.error("A shard exited, stopping")
+      IOLoop.instance().stop()
+
+def run_worker(app_class, shard, n_shards, socks):
+  # Close every socket but our own end, so we notice if the dispatcher goes away
+  for (i, (dispatcher_end, worker_end)) in enumerate(socks):
+    dispatcher_end.close()
+    if i != shard:
+      worker_end.close()
+  app = app_class()
+  app.join_shards(shard, n_shards, socks[shard][1])
+  app.start_event_loop()
+
+# Starts n_shards workers running app_class, then dispatches to them.  Doesn't return.
+def run_sharded(app_class, n_shards):
+  socks = [ socket.socketpair() for shard in range(n_shards) ]
+  for shard in range(n_shards):
+    multiprocessing.Process(
+      target=run_worker, args=(app_class, shard, n_shards, socks)
+    ).start()
+  for (_, worker_end) in socks:
+    worker_end.close()
+  dispatcher = ShardDispatcher(app_class, [ IOStream(s) for (s, _) in socks ])
+  dispatcher.start_event_loop()
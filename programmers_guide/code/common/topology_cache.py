@@ -0,0 +1,60 @@
+# topology_cache
+# Keeps what an app works out from a GraphViz topology file, so restarts needn't work it
+# out again.
+#
+# Reading a dot file takes pygraphviz, and the multiswitch NIB then builds a networkx
+# graph, its spanning tree and next hops between every pair of switches.  On a large
+# fabric that's most of an app's startup, and under upstart with respawn (see
+# productionalizing/) it's paid on every restart.  compiled_topology() calls the app's
+# compile function once and saves what it returns next to the topology file, as
+# topology_file + "." + name + ".cache".  The cache starts with a hash of the topology
+# file's contents, so editing the file recompiles it.  So does bumping version, which
+# you should do whenever compile changes what it returns.
+#
+# A warm start just unmarshals the saved value, so compile should import pygraphviz and
+# networkx itself, and they're never loaded at all.  Values are saved with marshal,
+# which is fast and compact but takes only numbers, strings, and tuples, lists, dicts and
+# sets of them.  marshal's format can change between Python versions, so the version
+# goes into the hash too.
+
+import os, sys, hashlib, marshal
+
+MAGIC = "NETKATTC"
+
+def topology_hash(topology_file, name, version):
+  h = hashlib.sha1()
+  h.update("%s %d %s\n" % (name, version, sys.version))
+  with open(topology_file, "rb") as f:
+    h.update(f.read())
+  return h.digest()
+
+def cache_path(topology_file, name):
+  return topology_file + "." + name + ".cache"
+
+# Returns compile_topology(topology_file), from the cache if it's up to date
+def compiled_topology(topology_file, name, compile_topology, logger, version=1):
+  path = cache_path(topology_file, name)
+  header = MAGIC + topology_hash(topology_file, name, version)
+  try:
+    with open(path, "rb") as f:
+      data = f.read()
+    if data.startswith(header):
+      logger.info("---> Reading compiled topology from "+path)
+      return marshal.loads(data[len(header):])
+  except (IOError, EOFError, ValueError, TypeError):
+    pass
+
+  compiled = compile_topology(topology_file)
+  # Sharded apps may all be compiling at once, so each writes its own file and the last
+  # rename wins
+  tmp_path = path + ".%d.tmp" % os.getpid()
+  try:
+    with open(tmp_path, "wb") as f:
+      f.write(header)
+      marshal.dump(compiled, f, 2)
+    os.rename(tmp_path, path)
+  except (IOError, OSError) as e:
+    logger.warning("Couldn't save compiled topology to "+path+": "+str(e))
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+  return compiled
@@ -0,0 +1,259 @@
+# topology_discovery
+# Finds the links between switches by sending LLDP probes out of every port, so apps
+# needn't depend on a hand-maintained topology file.
+#
+# Each probe is an LLDP frame naming the switch and port it was sent from, plus a nonce
+# for this TopologyDiscovery, so probes from another controller, or an earlier run of
+# this one, are ignored.  policy() sends every LLDP frame to the controller under its
+# own client id, and a probe coming back in on another switch's port means there's a
+# link between the two.  Apps have to keep LLDP frames out of their own policies, or
+# switches would flood probes onwards and we'd see links that aren't there.
+# without_probes() does that.  They also hand every packet_in to packet_in() first, and
+# skip the ones it says were probes.
+#
+# Probes go out at most rate a second, batch_size at a time, each batch pipelined on
+# one connection by a PktOutBatcher of our own.  Probes are sent port by port across all
+# the switches - port 1 everywhere, then port 2 - so no one switch's OpenFlow channel
+# takes a whole batch.  No more than max_in_flight probes wait for Frenetic to answer
+# at once, so a slow controller slows probing rather than queueing up behind it.  A
+# fabric with P ports is found in about P / rate seconds if Frenetic keeps up, and at
+# the pace Frenetic answers pkt_outs if it doesn't.  Against the stand-in Frenetic of
+# multiswitch_topologies/bench_discovery.py, which answers 1100 to 1500 a second, 500
+# switches with 48 ports each took 25 seconds at 1000 a second, and 17 to 21 seconds at
+# the default 2000, no faster than at 4000.  No switch got more than 5 probes a second.
+#
+# When the first round of probes is done, and settle seconds more for the last ones to
+# come back, changed(port_mappings) is called with the links found, in the form the
+# NIBs use: { dpid: { neighbor dpid: port to it, ... }, ... }.  A new round starts
+# every interval seconds, and links not seen for timeout seconds are dropped.  After the
+# first round, changed is called again whenever links come or go, at most once a tick.
+# port_down() drops a link at once, and port_up() and switch_up() probe the new ports in
+# the next batch.
+
+import struct, random, collections
+from tornado.ioloop import IOLoop, PeriodicCallback
+from frenetic.syntax import *
+from pkt_out_batcher import PktOutBatcher
+from lazy_packet import LazyPacket, payload_data
+from frenetic_client import update_for_client
+
+ETH_TYPE_LLDP = 0x88cc
+LLDP_MULTICAST = "\x01\x80\xc2\x00\x00\x0e"
+# Locally administered, so it can't clash with a real host
+PROBE_SRC = "\x02\x4e\x4b\x00\x00\x01"
+
+TLV_END = 0
+TLV_CHASSIS_ID = 1
+TLV_PORT_ID = 2
+TLV_TTL = 3
+TLV_ORGANIZATION = 127
+LOCALLY_ASSIGNED = 7
+ORGANIZATION = "\x02\x4e\x4b"
+
+def tlv(typ, value):
+  return struct.pack("!H", (typ << 9) | len(value)) + value
+
+def probe_frame(dpid, port_id, nonce):
+  return LLDP_MULTICAST + PROBE_SRC + struct.pack("!H", ETH_TYPE_LLDP) + \
+    tlv(TLV_CHASSIS_ID, chr(LOCALLY_ASSIGNED) + "dpid:%x" % dpid) + \
+    tlv(TLV_PORT_ID, chr(LOCALLY_ASSIGNED) + "%d" % port_id) + \
+    tlv(TLV_TTL, struct.pack("!H", 120)) + \
+    tlv(TLV_ORGANIZATION, ORGANIZATION + struct.pack("!BQ", 1, nonce)) + \
+    tlv(TLV_END, "")
+
+# (dpid, port_id) a probe was sent from, or None if it isn't one of ours
+def parse_probe(frame, nonce):
+  offset = 14
+  values = {}
+  while offset + 2 <= len(frame):
+    (header,) = struct.unpack_from("!H", frame, offset)
+    (typ, length) = (header >> 9, header & 0x1ff)
+    if typ == TLV_END:
+      break
+    values[typ] = frame[offset + 2:offset + 2 + length]
+    offset += 2 + length
+  try:
+    if values[TLV_ORGANIZATION] != ORGANIZATION + struct.pack("!BQ", 1, nonce):
+      return None
+    chassis = values[TLV_CHASSIS_ID]
+    port = values[TLV_PORT_ID]
+    if chassis[:6] != chr(LOCALLY_ASSIGNED) + "dpid:" or port[0] != chr(LOCALLY_ASSIGNED):
+      return None
+    return (int(chassis[6:], 16), int(port[1:]))
+  except (KeyError, IndexError, ValueError):
+    return None
+
+# Keeps LLDP frames out of an app's policy
+def without_probes(policy):
+  return Filter(EthTypeNotEq(ETH_TYPE_LLDP)) >> policy
+
+class TopologyDiscovery(object):
+
+  client_id = "discovery"
+
+  def __init__(self, app, logger, changed, rate=2000, batch_size=100, interval=30.0,
+    timeout=90.0, settle=1.0, max_in_flight=1000):
+    self.app = app
+    self.logger = logger
+    self.changed = changed
+    self.batch_size = batch_size
+    self.tick = float(batch_size) / rate
+    self.interval = interval
+    self.timeout = timeout
+    self.settle = settle
+    self.max_in_flight = max_in_flight
+    self.nonce = random.getrandbits(64)
+    self.pkt_outs = PktOutBatcher(app, logger, window=self.tick, max_packets=batch_size)
+    self.timer = None
+
+    # Ports on each switch: { dpid: [port_id, ...], ... }
+    self.switches = {}
+
+    # Both ends of every link, each way round: { (dpid, port_id): (dpid, port_id), ... }
+    self.links = {}
+    # When each link was last seen, by its lower end: { (dpid, port_id): time, ... }
+    self.last_seen = {}
+
+    # Ports still to probe this round, and when the round started
+    self.to_probe = collections.deque()
+    self.round_started = None
+    self.rounds = 0
+    self.in_flight = 0
+    self.sent = 0
+    self.errors = 0
+
+    # Set once the first round is in, and whenever links change after that
+    self.discovered = False
+    self.pending_change = False
+
+  def policy(self):
+    return Filter(EthTypeEq(ETH_TYPE_LLDP)) >> SendToController(self.client_id)
+
+  # switches is what current_switches() returns: { dpid: [port_id, ...], ... }
+  def start(self, switches):
+    # Frenetic may have restarted, so we start over
+    self.stop()
+    self.to_probe.clear()
+    self.switches = dict( (dpid, list(ports)) for (dpid, ports) in switches.items() )
+    update_for_client(self.app, self.client_id, self.policy())
+    self.start_round()
+    self.timer = PeriodicCallback(self.send_batch, self.tick * 1000)
+    self.timer.start()
+
+  def stop(self):
+    if self.timer != None:
+      self.timer.stop()
+      self.timer = None
+
+  def start_round(self):
+    now = IOLoop.instance().time()
+    self.round_started = now
+    self.rounds += 1
+    for (lower_end, seen) in self.last_seen.items():
+      if seen < now - self.timeout:
+        self.logger.info("Link from "+str(lower_end)+" timed out")
+        self.remove_link(lower_end)
+    max_ports = max([ len(ports) for ports in self.switches.values() ] + [ 0 ])
+    dpids = sorted(self.switches)
+    self.to_probe.extend(
+      (dpid, self.switches[dpid][i]) for i in range(max_ports) for dpid in dpids
+      if i < len(self.switches[dpid])
+    )
+
+  def send_batch(self):
+    room = min(self.batch_size, self.max_in_flight - self.in_flight)
+    for i in range(max(0, min(room, len(self.to_probe)))):
+      (dpid, port_id) = self.to_probe.popleft()
+      self.send_probe(dpid, port_id)
+    self.pkt_outs.flush()
+
+    if self.to_probe or self.round_started == None:
+      pass
+    elif not self.discovered:
+      # Give the last probes settle seconds to come back before reporting the first round
+      if self.in_flight == 0:
+        self.round_started = None
+        IOLoop.instance().call_later(self.settle, self.first_round_done)
+    elif IOLoop.instance().time() >= self.round_started + self.interval:
+      self.start_round()
+    if self.discovered and self.pending_change:
+      self.pending_change = False
+      self.changed(self.port_mappings())
+
+  def send_probe(self, dpid, port_id):
+    self.in_flight += 1
+    self.sent += 1
+    ftr = self.pkt_outs.pkt_out(dpid, NotBuffered(probe_frame(dpid, port_id, self.nonce)), SetPort(port_id))
+    IOLoop.instance().add_future(ftr, self.probe_answered)
+
+  def probe_answered(self, ftr):
+    self.in_flight -= 1
+    if ftr.exception() != None:
+      self.errors += 1
+
+  def first_round_done(self):
+    self.logger.info("Discovered %d links between %d switches in %d probes" % \
+      (len(self.links) / 2, len(self.switches), self.sent))
+    self.discovered = True
+    self.pending_change = False
+    self.round_started = IOLoop.instance().time()
+    self.changed(self.port_mappings())
+
+  # Returns True if the packet was an LLDP frame, which the app should then ignore
+  def packet_in(self, dpid, port_id, payload):
+    pkt = LazyPacket.from_payload(dpid, port_id, payload)
+    if pkt.ethType != ETH_TYPE_LLDP:
+      return False
+    sender = parse_probe(payload_data(payload), self.nonce)
+    if sender != None and sender != (dpid, port_id):
+      self.add_link(sender, (dpid, port_id))
+    return True
+
+  def add_link(self, end, other_end):
+    if self.links.get(end) != other_end:
+      for e in (end, other_end):
+        if e in self.links:
+          self.remove_link(e)
+      self.logger.info("Found link "+str(end)+" -- "+str(other_end))
+      self.links[end] = other_end
+      self.links[other_end] = end
+      self.pending_change = True
+    self.last_seen[min(end, other_end)] = IOLoop.instance().time()
+
+  def remove_link(self, end):
+    other_end = self.links.pop(end, None)
+    if other_end == None:
+      return
+    del self.links[other_end]
+    self.last_seen.pop(min(end, other_end), None)
+    self.pending_change = True
+
+  def port_down(self, dpid, port_id):
+    if (dpid, port_id) in self.links:
+      self.logger.info("Link from "+str((dpid, port_id))+" is down")
+      self.remove_link( (dpid, port_id) )
+
+  def port_up(self, dpid, port_id):
+    ports = self.switches.setdefault(dpid, [])
+    if port_id not in ports:
+      ports.append(port_id)
+    self.to_probe.appendleft( (dpid, port_id) )
+
+  def switch_up(self, dpid, ports):
+    self.switches[dpid] = list(ports)
+    self.to_probe.extendleft( (dpid, port_id) for port_id in ports )
+
+  def switch_down(self, dpid):
+    for port_id in self.switches.pop(dpid, []):
+      self.remove_link( (dpid, port_id) )
+
+  # { dpid: { neighbor dpid: port to it, ... }, ... }.  Where two switches have more than
+  # one link between them, the NIBs can only use one, so we keep the one with the lowest
+  # end, and use it both ways.
+  def port_mappings(self):
+    port_mappings = {}
+    for (end, other_end) in sorted(self.links.items(), reverse=True):
+      if end < other_end and end[0] != other_end[0]:
+        port_mappings.setdefault(end[0], {})[other_end[0]] = end[1]
+        port_mappings.setdefault(other_end[0], {})[end[0]] = other_end[1]
+    return port_mappings
@@ -0,0 +1,122 @@
+# update_scheduler
+# Coalesces policy updates so a burst of NIB changes produces one push to Frenetic.
+#
+# Apps hand the scheduler a function that builds the policy, rather than the policy
+# itself, so the policy is calculated once, from the latest NIB, when it's actually sent.
+# For each client id:
+#
+# - Pending requests are collapsed: the most recent policy function wins.
+# - An update waits until no new request has come in for min_interval seconds, but never
+#   more than max_staleness seconds after the first request it covers.
+# - Only one update is in flight at a time, so an older policy can never overwrite a
+#   newer one.  A request arriving mid-flight is sent once the first update returns.
+#
+# Counts of requests, sends and merges are logged as updates finish, at most once every
+# log_interval seconds.
+
+import time
+from tornado.ioloop import IOLoop
+from frenetic_client import timed, update_for_client
+
+class PendingUpdate(object):
+  def __init__(self, policy_fn, now):
+    self.policy_fn = policy_fn
+    self.first_requested = now
+    self.last_requested = now
+    self.timeout = None
+
+class UpdateScheduler(object):
+
+  def __init__(self, app, logger, min_interval=0.1, max_staleness=1.0, log_interval=60.0):
+    assert max_staleness >= min_interval
+    self.app = app
+    self.logger = logger
+    self.min_interval = min_interval
+    self.max_staleness = max_staleness
+    self.log_interval = log_interval
+    self.last_logged = time.time()
+
+    # client id => PendingUpdate
+    self.pending = {}
+
+    # client ids with an update on the way to Frenetic
+    self.in_flight = set()
+
+    self.requested = 0
+    self.sent = 0
+    self.merged = 0
+
+  def schedule(self, policy_fn, client_id=None):
+    client_id = client_id or self.app.client_id
+    # Deadlines go to add_timeout, so they're on the IOLoop's clock, not the wall clock
+    now = IOLoop.current().time()
+    self.requested += 1
+    if client_id in self.pending:
+      self.merged += 1
+      pu = self.pending[client_id]
+      pu.policy_fn = policy_fn
+      pu.last_requested = now
+    else:
+      self.pending[client_id] = PendingUpdate(policy_fn, now)
+    self.arm(client_id)
+
+  # Send any pending update for client_id right away, e.g. when a port goes down
+  def flush(self, client_id=None):
+    client_id = client_id or self.app.client_id
+    if client_id in self.pending:
+      # Pretend it's been waiting forever, so it goes out as soon as nothing is in flight
+      self.pending[client_id].first_requested = 0
+      self.arm(client_id)
+
+  def due_time(self, pu):
+    return min(pu.last_requested + self.min_interval, pu.first_requested + self.max_staleness)
+
+  def arm(self, client_id):
+    # While an update is in flight, its completion re-arms us
+    if client_id in self.in_flight:
+      return
+    pu = self.pending[client_id]
+    if pu.timeout != None:
+      IOLoop.instance().remove_timeout(pu.timeout)
+    pu.timeout = IOLoop.instance().add_timeout(
+      self.due_time(pu), lambda: self.send(client_id)
+    )
+
+  def send(self, client_id):
+    pu = self.pending.pop(client_id)
+    policy = timed(self.app, client_id, "build", pu.policy_fn)
+    if client_id == self.app.client_id:
+      ftr = self.app.update(policy)
+    else:
+      ftr = update_for_client(self.app, client_id, policy)
+    self.sent += 1
+    if ftr == None:
+      self.log_stats_if_due()
+      return
+    self.in_flight.add(client_id)
+    IOLoop.instance().add_future(ftr, lambda f: self.update_done(client_id, f))
+
+  def update_done(self, client_id, ftr):
+    self.in_flight.discard(client_id)
+    if ftr.exception() != None:
+      self.logger.error("Update for "+client_id+" failed: "+str(ftr.exception()))
+    if client_id in self.pending:
+      self.arm(client_id)
+    self.log_stats_if_due()
+
+  def stats(self):
+    return {
+      "requested": self.requested, "sent": self.sent, "merged": self.merged,
+      "pending": len(self.pending)
+    }
+
+  def log_stats_if_due(self):
+    if time.time() >= self.last_logged + self.log_interval:
+      self.log_stats()
+
+  def log_stats(self):
+    self.last_logged = time.time()
+    self.logger.info(
+      "Updates: %(requested)d requested, %(sent)d sent, %(merged)d merged, %(pending)d pending" \
+      % self.stats()
+    )
@@ -1,39 +1,38 @@
 import sys, logging
-import frenetic
 from frenetic.syntax import *
 from network_information_base import *
-from tornado.ioloop import PeriodicCallback, IOLoop
-from functools import partial
+from tornado import gen
+sys.path.append("../common")
+from coroutine_app import CoroutineApp
 
-class StatsApp1(frenetic.App):
+class StatsApp1(CoroutineApp):
 
   client_id = "stats"
 
   def __init__(self):
-    frenetic.App.__init__(self)   
+    CoroutineApp.__init__(self)
     self.nib = NetworkInformationBase(logging)  
 
+  @gen.coroutine
   def connected(self):
-    def handle_current_switches(switches):
-      logging.info("Connected to Frenetic - Switches: "+str(switches))
-      dpid = switches.keys()[0]
-      self.nib.set_dpid(dpid)
-      self.nib.set_ports( switches[dpid] )
-      PeriodicCallback(self.count_ports, 5000).start()
-    self.current_switches(callback=handle_current_switches)
-
-  def print_count(self, future, switch):
-    data = future.result()
-    logging.info("Count %s@%s: {rx_bytes = %s, tx_bytes = %s}" % \
-      (switch, data['port_no'], data['rx_bytes'], data['tx_bytes']) \
-    )
+    switches = yield self.current_switches()
+    logging.info("Connected to Frenetic - Switches: "+str(switches))
+    dpid = switches.keys()[0]
+    self.nib.set_dpid(dpid)
+    self.nib.set_ports( switches[dpid] )
+    while True:
+      yield gen.sleep(5)
+      yield self.count_ports()
 
+  @gen.coroutine
   def count_ports(self):
     switch_id = self.nib.get_dpid()
-    for port in self.nib.all_ports():
-      ftr = self.port_stats(switch_id, str(port))
-      f = partial(self.print_count, switch = switch_id)
-      IOLoop.instance().add_future(ftr, f)
+    # Ask for every port at once, then wait for all the answers
+    counts = yield [ self.port_stats(switch_id, str(port)) for port in self.nib.all_ports() ]
+    for data in counts:
+      logging.info("Count %s@%s: {rx_bytes = %s, tx_bytes = %s}" % \
+        (switch_id, data['port_no'], data['rx_bytes'], data['tx_bytes']) \
+      )
 
 if __name__ == '__main__':
   logging.basicConfig(\
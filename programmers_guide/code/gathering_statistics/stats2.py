@@ -1,16 +1,16 @@
 import sys, logging
-import frenetic
 from frenetic.syntax import *
 from network_information_base import *
-from tornado.ioloop import PeriodicCallback, IOLoop
-from functools import partial
+from tornado import gen
+sys.path.append("../common")
+from coroutine_app import CoroutineApp
 
-class StatsApp2(frenetic.App):
+class StatsApp2(CoroutineApp):
 
   client_id = "stats"
 
   def __init__(self):
-    frenetic.App.__init__(self)  
+    CoroutineApp.__init__(self)  
 
   def repeater_policy(self):
     return Filter(PortEq(1)) >> SetPort(2) | Filter(PortEq(2)) >> SetPort(1) 
@@ -25,22 +25,17 @@ class StatsApp2(frenetic.App):
       self.repeater_policy()
     )
 
+  @gen.coroutine
   def connected(self):
-    def handle_current_switches(switches):
-      logging.info("Connected to Frenetic - Switches: "+str(switches))
-      self.update( self.policy() )
-      PeriodicCallback(self.query_http, 5000).start()
-    self.current_switches(callback=handle_current_switches)
-
-  def print_count(self, future):
-    data = future.result()
-    logging.info("Count: {packets = %s, bytes = %s}" % \
-      (data[0], data[1]) \
-    )
-
-  def query_http(self):
-    ftr = self.query("http")
-    IOLoop.instance().add_future(ftr, self.print_count)
+    switches = yield self.current_switches()
+    logging.info("Connected to Frenetic - Switches: "+str(switches))
+    yield self.update( self.policy() )
+    while True:
+      yield gen.sleep(5)
+      data = yield self.query("http")
+      logging.info("Count: {packets = %s, bytes = %s}" % \
+        (data[0], data[1]) \
+      )
 
 if __name__ == '__main__':
   logging.basicConfig(\
@@ -1,60 +1,64 @@
-class NetworkInformationBaseDynamic(object):
+import sys
+sys.path.append("../common")
+from indexed_nib import IndexedNIB
+from addresses import int_to_mac
+from flood_cache import FloodCache
 
-  # hosts is a dictionary of MAC addresses to ports
-  #  { "11:11:11:11:11:11": 2, ...}
-  hosts = {}
+class NetworkInformationBaseDynamic(IndexedNIB):
 
-  # ports on switch
-  ports = []
+  # IndexedNIB remembers which port each MAC address is on
 
   def __init__(self, logger):
-    self.logger = logger
+    IndexedNIB.__init__(self, logger)
+    # ports on switch
+    self.ports = []
+    # vlans is a dictionary of VLANs to lists of ports
+    #  { "1001": [1,3], "1002": [2,4] ...}
+    self.vlans = {}
+    # SetPort actions for flooding, keyed by VLAN and ingress port
+    self.flood_cache = FloodCache(self.all_vlan_ports_except)
 
   def learn(self, mac, port_id, vlan):
     # Do not learn a mac twice
-    if mac in self.hosts:
+    if self.knows(mac):
       return
 
-    self.hosts[mac] = port_id
+    self.add_host(mac, None, port_id)
     if vlan not in self.vlans:
       self.vlans[vlan] = []
-    self.vlans[vlan].append(port_id)
+    # Flooding only changes when the port is new to the VLAN
+    if port_id not in self.vlans[vlan]:
+      self.vlans[vlan].append(port_id)
+      self.flood_cache.invalidate()
     self.logger.info(
-      "Learning: "+mac+" attached to ( "+str(port_id)+" ), VLAN "+str(vlan)
+      "Learning: "+int_to_mac(mac)+" attached to ( "+str(port_id)+" ), VLAN "+str(vlan)
     )
 
-  def unlearn(self, mac):
-    if mac in self.hosts:
-      del self.hosts[mac]
-
   def port_for_mac(self, mac):
-    if mac in self.hosts:
-      return self.hosts[mac]
-    else:
-      return None
+    return self.port_for_mac_on_switch(mac, None)
 
   def mac_for_port(self, port_id):
-    for mac in self.hosts:
-      if self.hosts[mac] == port_id:
-        return mac
-    return None
+    return self.mac_for_port_on_switch(None, port_id)
 
-  def all_mac_port_pairs(self):
-    return [ (mac, self.hosts[mac]) for mac in self.hosts.keys() ]
+  def unlearn_port(self, port_id):
+    return self.unlearn_port_on_switch(None, port_id)
 
-  def all_learned_macs(self):
-    return self.hosts.keys()
+  def all_mac_port_pairs(self):
+    return self.all_mac_port_pairs_on_switch(None)
 
   def set_ports(self, list_p):
     self.ports = list_p
+    self.flood_cache.invalidate()
 
   def add_port(self, port_id):
-    if port_id not in ports:
+    if port_id not in self.ports:
       self.ports.append(port_id)
+      self.flood_cache.invalidate()
 
   def delete_port(self, port_id):
-    if port_id in ports:
+    if port_id in self.ports:
       self.ports.remove(port_id)
+      self.flood_cache.invalidate()
       for vl in self.vlans:
         if port_id in self.vlans[vl]:
           self.vlans[vl].remove(port_id)
@@ -63,11 +67,6 @@ class NetworkInformationBaseDynamic(object):
     return self.ports == [] 
 
 # VLAN Handling, dynamic version
-  # vlans is a dictionary of VLANs to lists of ports
-  #  { "1001": [1,3], "1002": [2,4] ...}
-
-  vlans = {} 
-
   def vlan_of_port(self, port_id):
     for vl in self.vlans:
       if port_id in self.vlans[vl]:
@@ -79,3 +78,7 @@ class NetworkInformationBaseDynamic(object):
 
   def all_vlan_ports_except(self, vlan, in_port_id):
     return [ p for p in self.ports_in_vlan(vlan) if p != in_port_id ]
+
+  def flood_actions(self, vlan, in_port_id):
+    return self.flood_cache.get(vlan, in_port_id)
+
@@ -1,57 +1,55 @@
-class NetworkInformationBaseStatic(object):
+import sys
+sys.path.append("../common")
+from indexed_nib import IndexedNIB
+from addresses import int_to_mac
+from flood_cache import FloodCache
 
-  # hosts is a dictionary of MAC addresses to ports
-  #  { "11:11:11:11:11:11": 2, ...}
-  hosts = {}
+class NetworkInformationBaseStatic(IndexedNIB):
 
-  # ports on switch
-  ports = []
+  # IndexedNIB remembers which port each MAC address is on
 
   def __init__(self, logger):
-    self.logger = logger
+    IndexedNIB.__init__(self, logger)
+    # ports on switch
+    self.ports = []
+    # SetPort actions for flooding, keyed by VLAN and ingress port
+    self.flood_cache = FloodCache(self.all_vlan_ports_except)
 
   def learn(self, mac, port_id):
     # Do not learn a mac twice
-    if mac in self.hosts:
+    if self.knows(mac):
       return
 
-    self.hosts[mac] = port_id
+    self.add_host(mac, None, port_id)
     self.logger.info(
-      "Learning: "+mac+" attached to ( "+str(port_id)+" )"
+      "Learning: "+int_to_mac(mac)+" attached to ( "+str(port_id)+" )"
     )
 
   def port_for_mac(self, mac):
-    if mac in self.hosts:
-      return self.hosts[mac]
-    else:
-      return None
+    return self.port_for_mac_on_switch(mac, None)
 
   def mac_for_port(self, port_id):
-    for mac in self.hosts:
-      if self.hosts[mac] == port_id:
-        return mac
-    return None
+    return self.mac_for_port_on_switch(None, port_id)
 
-  def unlearn(self, mac):
-    if mac in self.hosts:
-      del self.hosts[mac]
+  def unlearn_port(self, port_id):
+    return self.unlearn_port_on_switch(None, port_id)
 
   def all_mac_port_pairs(self):
-    return [ (mac, self.hosts[mac]) for mac in self.hosts.keys() ]
-
-  def all_learned_macs(self):
-    return self.hosts.keys()
+    return self.all_mac_port_pairs_on_switch(None)
 
   def set_ports(self, list_p):
     self.ports = list_p
+    self.flood_cache.invalidate()
 
   def add_port(self, port_id):
-    if port_id not in ports:
+    if port_id not in self.ports:
       self.ports.append(port_id)
+      self.flood_cache.invalidate()
 
   def delete_port(self, port_id):
-    if port_id in ports:
+    if port_id in self.ports:
       self.ports.remove(port_id)
+      self.flood_cache.invalidate()
 
 # VLAN Handling, 
   def switch_not_yet_connected(self):
@@ -66,3 +64,7 @@ class NetworkInformationBaseStatic(object):
 
   def all_vlan_ports_except(self, vlan, in_port_id):
     return [ p for p in self.ports_in_vlan(vlan) if p != in_port_id ]
+
+  def flood_actions(self, vlan, in_port_id):
+    return self.flood_cache.get(vlan, in_port_id)
+
@@ -3,6 +3,7 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base_static import *
+from addresses import mac_to_int, int_to_mac, ints_to_macs
 
 class VlanApp1(frenetic.App):
 
@@ -26,7 +27,7 @@ class VlanApp1(frenetic.App):
     ports_in_vlan = self.nib.ports_in_vlan(mac_vlan)
     return \
       Filter(PortEq(ports_in_vlan)) >> \
-      Filter(EthDstEq(mac)) >> \
+      Filter(EthDstEq(int_to_mac(mac))) >> \
       SetPort(port)
 
   def policies_for_dest(self, all_mac_ports):
@@ -35,7 +36,7 @@ class VlanApp1(frenetic.App):
   def policy(self):
     return \
       IfThenElse(
-        EthDstNotEq( self.nib.all_learned_macs() ),
+        EthDstNotEq( ints_to_macs(self.nib.all_learned_macs()) ),
         SendToController("vlan_app"),
         Union( self.policies_for_dest(self.nib.all_mac_port_pairs()) )
       )
@@ -48,8 +49,8 @@ class VlanApp1(frenetic.App):
       return
 
     pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = mac_to_int(pkt.ethSrc)
+    dst_mac = mac_to_int(pkt.ethDst)
     src_vlan = self.nib.vlan_of_port(port_id)
 
     # If we haven't learned the source mac, do so
@@ -68,17 +69,17 @@ class VlanApp1(frenetic.App):
       else:
         actions = [ ]   # This is equivalent to dropping the packet
     else:
-      actions = SetPort( nib.all_vlan_ports_except(src_vlan, port_id) )
+      actions = nib.flood_actions(src_vlan, port_id)
     self.pkt_out(dpid, payload, actions )
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port(port_id) )
+    self.nib.unlearn_port(port_id)
     self.nib.delete_port(port_id)
     self.update(self.policy())
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port(port_id) )
+    self.nib.unlearn_port(port_id)
     self.nib.add_port(port_id)
     self.update(self.policy())
 
@@ -1,8 +1,10 @@
 import sys,logging
 import frenetic
 from frenetic.syntax import *
-from frenetic.packet import *
 from network_information_base_dynamic import *
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+from addresses import int_to_mac, ints_to_macs
 
 class VlanApp2(frenetic.App):
 
@@ -25,7 +27,7 @@ class VlanApp2(frenetic.App):
     mac_vlan = self.nib.vlan_of_port(port)
     return \
       Filter(VlanEq(mac_vlan)) >> \
-      Filter(EthDstEq(mac)) >> \
+      Filter(EthDstEq(int_to_mac(mac))) >> \
       SetPort(port)
 
   def policies_for_dest(self, all_mac_ports):
@@ -34,7 +36,7 @@ class VlanApp2(frenetic.App):
   def policy(self):
     return \
       IfThenElse(
-        EthDstNotEq( self.nib.all_learned_macs() ),
+        EthDstNotEq( ints_to_macs(self.nib.all_learned_macs()) ),
         SendToController("vlan_app"),
         Union( self.policies_for_dest(self.nib.all_mac_port_pairs()) )
       )
@@ -46,9 +48,9 @@ class VlanApp2(frenetic.App):
     if nib.switch_not_yet_connected():
       return
 
-    pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    pkt = LazyPacket.from_payload(dpid, port_id, payload)
+    src_mac = pkt.ethSrcInt
+    dst_mac = pkt.ethDstInt
     src_vlan = pkt.vlan
 
     # If we haven't learned the source mac, do so
@@ -67,17 +69,17 @@ class VlanApp2(frenetic.App):
       else:
         actions = [ ]
     else:
-      actions = SetPort( nib.all_vlan_ports_except(src_vlan, port_id) )
+      actions = nib.flood_actions(src_vlan, port_id)
     self.pkt_out(dpid, payload, actions )
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port(port_id) )
+    self.nib.unlearn_port(port_id)
     self.nib.delete_port(port_id)
     self.update(self.policy())
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port(port_id) )
+    self.nib.unlearn_port(port_id)
     self.nib.add_port(port_id)
     self.update(self.policy())
 
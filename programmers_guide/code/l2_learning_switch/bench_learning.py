@@ -0,0 +1,86 @@
+# Benchmark: what does learning H hosts cost LearningApp4 vs. LearningApp5?
+#
+# We feed each app one ARP broadcast from each of H new hosts, as after a rack power
+# cycle, and record every policy the app hands to Frenetic.  Nothing is sent over
+# the wire, so this runs without a Frenetic controller.  The ARP frames are packed by
+# hand, so it doesn't need ryu either.
+#
+#   python bench_learning.py [hosts ...]
+
+import sys, time, json, struct, socket, logging
+from tornado.concurrent import Future
+from frenetic.syntax import NotBuffered
+from learning4 import LearningApp4
+from learning5 import LearningApp5
+
+# How many hosts boot per second, which sets how often LearningApp5 pushes its
+# controller policy (once per miss_policy_interval, the scheduler's max staleness)
+HOSTS_PER_SECOND = 200
+
+def mac_for(i):
+  return "02:00:%02x:%02x:%02x:%02x" % ((i >> 24) & 255, (i >> 16) & 255, (i >> 8) & 255, i & 255)
+
+# An ARP request from host i for 10.255.255.254, as Packet(...).to_payload() builds it
+def arp_payload(i):
+  src = mac_for(i).replace(":", "").decode("hex")
+  broadcast = "\xff" * 6
+  ip_src = socket.inet_aton("10.%d.%d.%d" % ((i >> 16) & 255, (i >> 8) & 255, i & 255))
+  arp = struct.pack("!HHBBH", 1, 0x800, 6, 4, 1) + \
+    src + ip_src + broadcast + socket.inet_aton("10.255.255.254")
+  return NotBuffered(broadcast + src + struct.pack("!H", 0x806) + arp)
+
+class Recorder(object):
+  def __init__(self):
+    self.updates = 0
+    self.bytes = 0
+
+  def record_policy(self, policy):
+    self.record_json(None, json.dumps(policy.to_json()))
+
+  # Stands in for PolicyPartitions.send, too
+  def record_json(self, client_id, policy_json, policy=None):
+    self.updates += 1
+    self.bytes += len(policy_json)
+    done = Future()
+    done.set_result(None)
+    return done
+
+def new_app(app_class, recorder, n_ports):
+  app = app_class()
+  app.nib.set_ports(range(1, n_ports + 1))
+  app.update = recorder.record_policy
+  app.pkt_out = lambda *args: None
+  if hasattr(app, "partitions"):
+    app.partitions.send = recorder.record_json
+  return app
+
+def run(app_class, n_hosts, n_ports=48):
+  recorder = Recorder()
+  app = new_app(app_class, recorder, n_ports)
+  payloads = [ arp_payload(i) for i in range(n_hosts) ]
+
+  start = time.time()
+  for (i, payload) in enumerate(payloads):
+    app.packet_in(1, (i % n_ports) + 1, payload)
+    # LearningApp5 pushes from IOLoop callbacks, which we run by hand here
+    if app_class == LearningApp5:
+      app.flush_buckets()
+      scheduler = app.update_scheduler
+      if (i + 1) % HOSTS_PER_SECOND == 0 or i == n_hosts - 1:
+        if app.client_id in scheduler.pending:
+          scheduler.send(app.client_id)
+  elapsed = time.time() - start
+  return (recorder, elapsed)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  sizes = [ int(h) for h in sys.argv[1:] ] or [ 250, 500, 1000, 2000 ]
+  print "%-13s %6s %8s %14s %12s %10s" % \
+    ("app", "hosts", "updates", "update bytes", "bytes/host", "ms/host")
+  for n_hosts in sizes:
+    for app_class in [ LearningApp4, LearningApp5 ]:
+      (recorder, elapsed) = run(app_class, n_hosts)
+      print "%-13s %6d %8d %14d %12d %10.3f" % (
+        app_class.__name__, n_hosts, recorder.updates, recorder.bytes,
+        recorder.bytes / n_hosts, elapsed * 1000.0 / n_hosts
+      )
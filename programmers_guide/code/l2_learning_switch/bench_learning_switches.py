@@ -0,0 +1,65 @@
+# Benchmark: what does learning hosts on many switches cost LearningApp6, with a policy
+# partition per switch, vs. the same app pushing one policy for all switches?
+#
+# Every switch has hosts_per_switch hosts, and each sends one ARP broadcast, taking turns
+# across switches, as after a power cut.  Packets are handed over in batches of
+# BatchedApp.max_batch, as BatchedApp would under load.  We record every policy the apps
+# hand to Frenetic, but nothing is sent over the wire, so this runs without a Frenetic
+# controller.
+#
+#   python bench_learning_switches.py [switches [hosts_per_switch]]
+
+import sys, time, logging
+from frenetic.syntax import *
+from learning6 import LearningApp6
+from bench_learning import arp_payload, Recorder
+
+PORTS_PER_SWITCH = 48
+
+# What one process for all switches looks like without partitions: every change re-sends
+# every switch's policy
+class WholePolicyLearningApp(LearningApp6):
+
+  def packet_in_batch(self, events):
+    for (dpid, port_id, payload) in events:
+      self.packet_in(dpid, port_id, payload)
+    if self.partitions.is_dirty():
+      self.partitions.dirty.clear()
+      self.update( Union( self.policy_for_switch(dpid) for dpid in self.nibs ) )
+
+def run(app_class, n_switches, hosts_per_switch):
+  recorder = Recorder()
+  app = app_class()
+  app.update = recorder.record_policy
+  app.partitions.send = recorder.record_json
+  app.pkt_out = lambda *args: None
+  for dpid in range(1, n_switches + 1):
+    app.add_switch(dpid, range(1, PORTS_PER_SWITCH + 1))
+  app.partitions.dirty.clear()
+
+  events = []
+  for i in range(n_switches * hosts_per_switch):
+    dpid = i % n_switches + 1
+    port_id = (i / n_switches) % PORTS_PER_SWITCH + 1
+    events.append( (dpid, port_id, arp_payload(i)) )
+
+  start = time.time()
+  for b in range(0, len(events), app.max_batch):
+    app.packet_in_batch(events[b:b + app.max_batch])
+  elapsed = time.time() - start
+  return (recorder, elapsed)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  args = [ int(a) for a in sys.argv[1:] ]
+  n_switches = args[0] if len(args) > 0 else 500
+  hosts_per_switch = args[1] if len(args) > 1 else 4
+  n_hosts = n_switches * hosts_per_switch
+  print "%d switches, %d hosts each" % (n_switches, hosts_per_switch)
+  print "%-24s %8s %14s %14s %10s" % ("app", "updates", "update bytes", "bytes/update", "ms/host")
+  for app_class in [ WholePolicyLearningApp, LearningApp6 ]:
+    (recorder, elapsed) = run(app_class, n_switches, hosts_per_switch)
+    print "%-24s %8d %14d %14d %10.3f" % (
+      app_class.__name__, recorder.updates, recorder.bytes,
+      recorder.bytes / max(recorder.updates, 1), elapsed * 1000.0 / n_hosts
+    )
@@ -3,6 +3,8 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base import *
+sys.path.append("../common")
+from addresses import mac_to_int
 
 class LearningApp1(frenetic.App):
 
@@ -24,8 +26,8 @@ class LearningApp1(frenetic.App):
     nib = self.nib
 
     pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = mac_to_int(pkt.ethSrc)
+    dst_mac = mac_to_int(pkt.ethDst)
 
     # If we haven't learned the source mac, do so
     if nib.port_for_mac( src_mac ) == None:
@@ -3,6 +3,8 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base import *
+sys.path.append("../common")
+from addresses import mac_to_int, int_to_mac
 
 class LearningApp2(frenetic.App):
 
@@ -22,7 +24,7 @@ class LearningApp2(frenetic.App):
 
   def policy_for_dest(self, mac_port):
     (mac, port) = mac_port
-    return Filter(EthDstEq(mac)) >> SetPort(port)
+    return Filter(EthDstEq(int_to_mac(mac))) >> SetPort(port)
 
   def policies_for_dest(self, all_mac_ports):
     return [ self.policy_for_dest(mp) for mp in all_mac_ports ]
@@ -34,8 +36,8 @@ class LearningApp2(frenetic.App):
     nib = self.nib
 
     pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = mac_to_int(pkt.ethSrc)
+    dst_mac = mac_to_int(pkt.ethDst)
 
     # If we haven't learned the source mac, do so
     if nib.port_for_mac( src_mac ) == None:
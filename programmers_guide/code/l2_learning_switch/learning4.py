@@ -1,15 +1,23 @@
 import sys,logging
-import frenetic
 from frenetic.syntax import *
-from frenetic.packet import *
 from network_information_base import *
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+from addresses import int_to_mac, ints_to_macs
+from batched_app import BatchedApp
+from nib_journal import NibJournal
 
-class LearningApp4(frenetic.App):
+# BatchedApp's default packet_in_batch calls packet_in for each packet, and sends only
+# the last of their updates
+class LearningApp4(BatchedApp):
 
   client_id = "l2_learning"
 
+  # Set this to a path to keep learned hosts across restarts (see nib_journal.py)
+  nib_journal_path = None
+
   def __init__(self):
-    frenetic.App.__init__(self)     
+    BatchedApp.__init__(self)
     self.nib = NetworkInformationBase(logging)
 
   def connected(self):
@@ -17,12 +25,18 @@ class LearningApp4(frenetic.App):
       logging.info("Connected to Frenetic - Switches: "+str(switches))
       dpid = switches.keys()[0]
       self.nib.set_ports( switches[dpid] )
-      self.update( id >> SendToController("learning_app") )
+      if self.nib_journal_path != None and self.nib.journal == None:
+        NibJournal(self.nib_journal_path, logging, self.nib.journal_tables).restore_into(self.nib)
+      # Hosts we knew before a restart are switched straight away
+      if self.nib.all_learned_macs() != []:
+        self.update(self.policy())
+      else:
+        self.update( id >> SendToController("learning_app") )
     self.current_switches(callback=handle_current_switches)
 
   def policy_for_dest(self, mac_port):
     (mac, port) = mac_port
-    return Filter(EthDstEq(mac)) >> SetPort(port)
+    return Filter(EthDstEq(int_to_mac(mac))) >> SetPort(port)
 
   def policies_for_dest(self, all_mac_ports):
     return [ self.policy_for_dest(mp) for mp in all_mac_ports ]
@@ -30,8 +44,8 @@ class LearningApp4(frenetic.App):
   def policy(self):
     return \
       IfThenElse(
-        EthSrcNotEq( self.nib.all_learned_macs() ) | 
-          EthDstNotEq( self.nib.all_learned_macs() ),
+        EthSrcNotEq( ints_to_macs(self.nib.all_learned_macs()) ) | 
+          EthDstNotEq( ints_to_macs(self.nib.all_learned_macs()) ),
         SendToController("learning_app"),
         Union( self.policies_for_dest(self.nib.all_mac_port_pairs()) )
       )
@@ -39,9 +53,9 @@ class LearningApp4(frenetic.App):
   def packet_in(self, dpid, port_id, payload):
     nib = self.nib
 
-    pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    pkt = LazyPacket.from_payload(dpid, port_id, payload)
+    src_mac = pkt.ethSrcInt
+    dst_mac = pkt.ethDstInt
 
     # If we haven't learned the source mac, do so
     if nib.port_for_mac( src_mac ) == None:
@@ -54,17 +68,17 @@ class LearningApp4(frenetic.App):
     if  dst_port != None:
       actions = SetPort(dst_port)
     else:
-      actions = SetPort( nib.all_ports_except(port_id) )
+      actions = nib.flood_actions(port_id)
     self.pkt_out(dpid, payload, actions )
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port(port_id) )
+    self.nib.unlearn_port(port_id)
     self.nib.delete_port(port_id)
     self.update(self.policy())
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port(port_id) )
+    self.nib.unlearn_port(port_id)
     self.nib.add_port(port_id)
     self.update(self.policy())
 
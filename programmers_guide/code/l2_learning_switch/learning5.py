@@ -0,0 +1,188 @@
+import sys,logging
+from frenetic.syntax import *
+from tornado import gen
+from tornado.ioloop import IOLoop
+from network_information_base import *
+sys.path.append("../common")
+from policy_partitions import PolicyPartitions
+from update_scheduler import UpdateScheduler
+from mac_aging import MacAger
+from lazy_packet import LazyPacket
+from addresses import int_to_mac, ints_to_macs
+from coroutine_app import CoroutineApp
+
+# LearningApp5 splits the forwarding policy of LearningApp4 into hashed MAC buckets, each
+# pushed under its own client id.  Learning a MAC only rebuilds and re-sends the one bucket
+# it falls into, rather than the whole policy.
+#
+# The "send to controller" policy still needs every learned MAC, so it stays under the
+# app's own client id.  It's just two flat MAC lists, and we let it lag behind the buckets
+# by up to miss_policy_interval so a burst of new hosts costs one push instead of one each.
+# Note the two overlap on packets from an unknown source to a known destination: the switch
+# forwards those AND sends us a copy to learn from, so we must not send them out again.
+#
+# Hosts are forgotten after max_mac_age seconds.  Since the switch forwards traffic to
+# learned hosts itself, each bucket also counts packets from its hosts, and a host whose
+# count has gone up is kept.
+
+class LearningApp5(CoroutineApp):
+
+  client_id = "l2_learning"
+
+  n_buckets = 64
+
+  # Seconds the controller policy may lag behind newly learned MACs
+  miss_policy_interval = 1
+
+  # Seconds a host may stay quiet before we forget it.  None keeps hosts forever.
+  max_mac_age = 300
+
+  def __init__(self):
+    CoroutineApp.__init__(self)
+    self.nib = NetworkInformationBase(logging)
+    self.partitions = PolicyPartitions(self, self.client_id, self.policy_for_bucket, logging)
+    self.update_scheduler = UpdateScheduler(
+      self, logging, max_staleness=self.miss_policy_interval
+    )
+
+    # MACs in each bucket.  { 17: set(["11:11:11:11:11:11", ...]), ... }
+    self.buckets = dict( (b, set()) for b in range(self.n_buckets) )
+
+    # MACs whose bucket policy Frenetic has accepted, so the switch forwards them itself
+    self.installed = set()
+
+    self.bucket_flush_pending = False
+
+    self.mac_ager = None
+    if self.max_mac_age != None:
+      self.mac_ager = MacAger(
+        self, self.nib, logging, self.macs_expired, self.max_mac_age,
+        query_label=self.query_label
+      )
+
+  @gen.coroutine
+  def connected(self):
+    switches = yield self.current_switches()
+    logging.info("Connected to Frenetic - Switches: "+str(switches))
+    dpid = switches.keys()[0]
+    self.nib.set_ports( switches[dpid] )
+    # Pushing every bucket clears out partitions left over from a previous run
+    self.push_buckets( self.partitions.push_all(range(self.n_buckets)) )
+    yield self.update( self.miss_policy() )
+    if self.mac_ager != None:
+      self.mac_ager.start()
+
+  # The low bits of a MAC are spread evenly enough, and the same on every run
+  def bucket_for_mac(self, mac):
+    return mac % self.n_buckets
+
+  def policy_for_dest(self, mac_port):
+    (mac, port) = mac_port
+    return Filter(EthDstEq(int_to_mac(mac))) >> SetPort(port)
+
+  def query_label(self, mac):
+    return "age_"+int_to_mac(mac)
+
+  def policy_for_bucket(self, bucket):
+    macs = self.buckets[bucket]
+    if len(macs) == 0:
+      return drop
+    forwarding = Union(
+      self.policy_for_dest( (mac, self.nib.port_for_mac(mac)) ) for mac in macs
+    )
+    if self.mac_ager == None:
+      return forwarding
+    return forwarding | Union(
+      Filter(EthSrcEq(int_to_mac(mac))) >> SendToQuery(self.query_label(mac)) for mac in macs
+    )
+
+  def miss_policy(self):
+    learned = ints_to_macs(self.nib.all_learned_macs())
+    if len(learned) == 0:
+      return id >> SendToController("learning_app")
+    return \
+      Filter( EthSrcNotEq(learned) | EthDstNotEq(learned) ) >> \
+      SendToController("learning_app")
+
+  def mac_learned(self, mac):
+    self.buckets[self.bucket_for_mac(mac)].add(mac)
+    self.partitions.mark_dirty(self.bucket_for_mac(mac))
+    self.schedule_flush()
+
+  def mac_unlearned(self, mac):
+    self.buckets[self.bucket_for_mac(mac)].discard(mac)
+    self.installed.discard(mac)
+    self.partitions.mark_dirty(self.bucket_for_mac(mac))
+    self.schedule_flush()
+
+  def macs_expired(self, macs):
+    for mac in macs:
+      self.mac_unlearned(mac)
+
+  def schedule_flush(self):
+    # Buckets go out at the end of this IOLoop pass, so all packet_ins from one event
+    # poll share a push.  The controller policy waits a little longer.
+    if not self.bucket_flush_pending:
+      self.bucket_flush_pending = True
+      IOLoop.instance().add_callback(self.flush_buckets)
+    self.update_scheduler.schedule(self.miss_policy)
+
+  def flush_buckets(self):
+    self.bucket_flush_pending = False
+    self.push_buckets( self.partitions.push_dirty() )
+
+  def push_buckets(self, futures):
+    for (bucket, ftr) in futures.iteritems():
+      macs = set(self.buckets[bucket])
+      IOLoop.instance().add_future(
+        ftr, lambda f, macs=macs: self.bucket_installed(macs)
+      )
+
+  def bucket_installed(self, macs):
+    # Skip anything unlearned while the update was in flight
+    self.installed.update( mac for mac in macs if self.nib.port_for_mac(mac) != None )
+
+  def packet_in(self, dpid, port_id, payload):
+    nib = self.nib
+
+    pkt = LazyPacket.from_payload(dpid, port_id, payload)
+    src_mac = pkt.ethSrcInt
+    dst_mac = pkt.ethDstInt
+
+    # If we haven't learned the source mac, do so
+    if nib.port_for_mac( src_mac ) == None:
+      nib.learn( src_mac, port_id)
+      self.mac_learned(src_mac)
+    else:
+      nib.touch( src_mac )
+
+    # If the destination's rule is installed, the switch has already forwarded this
+    # packet and we only got a copy.  Otherwise output it through the learned port, or
+    # flood if we haven't seen it yet.
+    if dst_mac in self.installed:
+      return
+    dst_port = nib.port_for_mac( dst_mac )
+    if  dst_port != None:
+      actions = SetPort(dst_port)
+    else:
+      actions = nib.flood_actions(port_id)
+    self.pkt_out(dpid, payload, actions )
+
+  def port_down(self, dpid, port_id):
+    for mac in self.nib.unlearn_port(port_id):
+      self.mac_unlearned(mac)
+    self.nib.delete_port(port_id)
+
+  def port_up(self, dpid, port_id):
+    # Just to be safe, in case we have old MACs mapped to this port
+    for mac in self.nib.unlearn_port(port_id):
+      self.mac_unlearned(mac)
+    self.nib.add_port(port_id)
+
+if __name__ == '__main__':
+  logging.basicConfig(\
+    stream = sys.stderr, \
+    format='%(asctime)s [%(levelname)s] %(message)s', level=logging.INFO \
+  )
+  app = LearningApp5()
+  app.start_event_loop()
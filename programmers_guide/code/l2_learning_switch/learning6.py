@@ -0,0 +1,122 @@
+import sys,logging
+from frenetic.syntax import *
+from network_information_base import *
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+from addresses import int_to_mac, ints_to_macs
+from batched_app import BatchedApp
+from policy_partitions import PolicyPartitions
+
+# LearningApp6 is LearningApp4 for every switch Frenetic knows about, so one process
+# replaces one per switch.  Each switch learns on its own, with its own
+# NetworkInformationBase, and its policy - LearningApp4's, behind a Filter(SwitchEq) - is
+# pushed under its own client id by PolicyPartitions.  Learning a MAC on one switch only
+# rebuilds and re-sends that switch's policy, however many switches there are, and a
+# batch of packet_ins pushes each switch that learned something once, at the end.
+#
+# Switches aren't assumed to be connected to each other: a MAC seen on two switches is
+# learned on both, each with its own port.
+
+class LearningApp6(BatchedApp):
+
+  client_id = "l2_learning"
+
+  def __init__(self):
+    BatchedApp.__init__(self)
+    # { dpid: NetworkInformationBase(), ... }
+    self.nibs = {}
+    self.partitions = PolicyPartitions(self, self.client_id, self.policy_for_switch, logging)
+
+  def connected(self):
+    def handle_current_switches(switches):
+      logging.info("Connected to Frenetic - Switches: "+str(switches))
+      for (dpid, ports) in switches.items():
+        self.add_switch(dpid, ports)
+      self.partitions.push_all(self.nibs.keys())
+    self.current_switches(callback=handle_current_switches)
+
+  def add_switch(self, dpid, ports):
+    nib = NetworkInformationBase(logging)
+    nib.set_ports(ports)
+    self.nibs[dpid] = nib
+    self.partitions.mark_dirty(dpid)
+
+  def switch_up(self, dpid, ports):
+    self.add_switch(dpid, ports)
+    self.partitions.push_dirty()
+
+  def switch_down(self, dpid):
+    self.nibs.pop(dpid, None)
+    self.partitions.push(dpid)
+
+  def policy_for_dest(self, mac_port):
+    (mac, port) = mac_port
+    return Filter(EthDstEq(int_to_mac(mac))) >> SetPort(port)
+
+  def policies_for_dest(self, all_mac_ports):
+    return [ self.policy_for_dest(mp) for mp in all_mac_ports ]
+
+  def policy_for_switch(self, dpid):
+    nib = self.nibs.get(dpid)
+    if nib == None:
+      return drop
+    learned = ints_to_macs(nib.all_learned_macs())
+    if learned == []:
+      return Filter(SwitchEq(dpid)) >> SendToController("learning_app")
+    return \
+      Filter(SwitchEq(dpid)) >> \
+      IfThenElse(
+        EthSrcNotEq(learned) | EthDstNotEq(learned),
+        SendToController("learning_app"),
+        Union( self.policies_for_dest(nib.all_mac_port_pairs()) )
+      )
+
+  def packet_in_batch(self, events):
+    for (dpid, port_id, payload) in events:
+      self.packet_in(dpid, port_id, payload)
+    self.partitions.push_dirty()
+
+  def packet_in(self, dpid, port_id, payload):
+    nib = self.nibs.get(dpid)
+    # A switch we haven't heard about yet
+    if nib == None:
+      return
+
+    pkt = LazyPacket.from_payload(dpid, port_id, payload)
+    src_mac = pkt.ethSrcInt
+    dst_mac = pkt.ethDstInt
+
+    # If we haven't learned the source mac on this switch, do so
+    if nib.port_for_mac( src_mac ) == None:
+      nib.learn( src_mac, port_id)
+      self.partitions.mark_dirty(dpid)
+
+    # Look up the destination mac and output it through the
+    # learned port, or flood if we haven't seen it yet.
+    dst_port = nib.port_for_mac( dst_mac )
+    if  dst_port != None:
+      actions = SetPort(dst_port)
+    else:
+      actions = nib.flood_actions(port_id)
+    self.pkt_out(dpid, payload, actions )
+
+  def port_down(self, dpid, port_id):
+    nib = self.nibs[dpid]
+    nib.unlearn_port(port_id)
+    nib.delete_port(port_id)
+    self.partitions.push(dpid)
+
+  def port_up(self, dpid, port_id):
+    # Just to be safe, in case we have old MACs mapped to this port
+    nib = self.nibs[dpid]
+    nib.unlearn_port(port_id)
+    nib.add_port(port_id)
+    self.partitions.push(dpid)
+
+if __name__ == '__main__':
+  logging.basicConfig(\
+    stream = sys.stderr, \
+    format='%(asctime)s [%(levelname)s] %(message)s', level=logging.INFO \
+  )
+  app = LearningApp6()
+  app.start_event_loop()
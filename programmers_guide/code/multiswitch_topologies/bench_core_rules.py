@@ -0,0 +1,64 @@
+# Benchmark: how big are the core switch policies of multiswitch_topo.dot with H hosts
+# learned, with one rule per host vs. one per next hop port?
+#
+# We learn H hosts spread over the edge switches, as bench_policy_cache.py does, then
+# count the Filter(EthDstEq(...)) >> SetPort(...) rules in each core switch's policy, and
+# time building and serializing the whole policy from scratch.  These are NetKAT rules,
+# as handed to Frenetic.  Frenetic compiles a filter on n MACs to n flow table entries,
+# so we also count those with flow_entries from test/policy_model.py.  Grouping by next
+# hop shrinks the policy the app builds and sends, not the switches' flow tables.
+# Nothing is sent over the wire, so this runs without a Frenetic controller.
+#
+#   python bench_core_rules.py [hosts ...]
+
+import sys, time, json, logging
+from frenetic.syntax import *
+from multiswitch3 import MultiswitchApp3
+from bench_policy_cache import new_app, learn_host
+sys.path.append("../common")
+from policy_cache import PolicyCache
+from addresses import int_to_mac
+sys.path.append("../test")
+from policy_model import flow_entries
+
+# What MultiswitchApp3 did before grouping MACs by next hop
+class PerHostCoreApp(MultiswitchApp3):
+
+  def policies_for_dest_on_core(self, core_dpid):
+    pc = self.policies
+    return pc.union(
+      pc.seq(
+        pc.make(Filter, pc.make(EthDstEq, int_to_mac(mac))),
+        pc.make(SetPort, self.nib.next_hop_port(mac, core_dpid))
+      )
+      for mac in self.nib.all_learned_macs()
+    )
+
+def run(app_class, n_hosts):
+  app = new_app(app_class)
+  for i in range(n_hosts):
+    learn_host(app, i)
+  rules = {}
+  entries = {}
+  for core_dpid in app.nib.core_switch_dpids():
+    policy = app.policies_for_dest_on_core(core_dpid)
+    rules[core_dpid] = len(policy.children)
+    entries[core_dpid] = flow_entries(json.loads(app.policies.to_json_text(policy)))
+  app.policies = PolicyCache()
+  start = time.time()
+  policy_json = app.policies.to_json_text(app.policy())
+  elapsed = time.time() - start
+  return (rules, entries, len(policy_json), elapsed)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.WARNING)
+  host_counts = [ int(h) for h in sys.argv[1:] ] or [ 100, 1000, 10000 ]
+  print "%8s %-16s %12s %12s %12s %12s %10s" % \
+    ("hosts", "app", "core rules", "max/switch", "flow entries", "JSON bytes", "build ms")
+  for n_hosts in host_counts:
+    for app_class in [ PerHostCoreApp, MultiswitchApp3 ]:
+      (rules, entries, size, elapsed) = run(app_class, n_hosts)
+      print "%8d %-16s %12d %12d %12d %12d %10.1f" % (
+        n_hosts, app_class.__name__, sum(rules.values()), max(rules.values()),
+        sum(entries.values()), size, elapsed * 1000
+      )
@@ -0,0 +1,144 @@
+# Benchmark: how long does MultiswitchApp3 with discover_topology take to find every link
+# in a large fabric, and how hard does probing lean on the controller and the switches?
+#
+# We generate a fabric as bench_path_engine.py does and give every switch the same
+# number of ports, most of them for hosts, since every port gets probed whether or not
+# there's a switch on the other end.  A StandInFrenetic carries each probe's pkt_out
+# across its link and hands it back as a packet_in.  It and the app each get a process
+# of their own.
+#
+# For each probing rate we report how long the first round took, from the app's first
+# look at the switches to the NIB having every link, against ports / rate, the time
+# probing at that rate should take.  Both include settle, the second the app waits for
+# the last probes.  If the stand-in can't keep up, probes wait for it rather than
+# queueing up, and discovery takes longer.  Also the most probes any one switch got in a
+# second, which is what its OpenFlow channel has to carry, and the most waiting for an
+# answer from Frenetic at once.
+#
+#   python bench_discovery.py [switches [ports per switch [rate,rate,...]]]
+
+import sys, time, logging, multiprocessing
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop, PeriodicCallback
+from multiswitch3 import MultiswitchApp3
+from bench_path_engine import fabric
+sys.path.append("../common")
+from topology_discovery import TopologyDiscovery
+sys.path.append("../test")
+from stand_in_frenetic import StandInFrenetic
+
+PORT = 9132
+
+class CountingFrenetic(StandInFrenetic):
+
+  def __init__(self, switches, links):
+    StandInFrenetic.__init__(self, switches, [], settle=0.1, links=links)
+    # (second, dpid) => probes sent out of that switch in that second
+    self.per_switch = {}
+
+  def pkt_out(self, body):
+    key = (int(time.time()), body["switch"])
+    self.per_switch[key] = self.per_switch.get(key, 0) + 1
+    StandInFrenetic.pkt_out(self, body)
+
+def switch_ports(switches, edges, ports_per_switch):
+  links = dict( (sw, 0) for sw in switches )
+  for (a, b, a_port, b_port) in edges:
+    links[a] = max(links[a], a_port)
+    links[b] = max(links[b], b_port)
+  return dict( (sw, range(1, max(ports_per_switch, links[sw]) + 1)) for sw in switches )
+
+def port_mappings_of(edges):
+  port_mappings = {}
+  for (a, b, a_port, b_port) in edges:
+    port_mappings.setdefault(a, {})[b] = a_port
+    port_mappings.setdefault(b, {})[a] = b_port
+  return port_mappings
+
+# Runs until stop is set, then hands back the busiest switch's probes in a second
+def run_stand_in(ports, edges, port, stop, results):
+  controller = CountingFrenetic(ports, edges)
+  controller.listen(port)
+  def check_stop():
+    if stop.is_set():
+      results.put(max(controller.per_switch.values()))
+      IOLoop.instance().stop()
+  PeriodicCallback(check_stop, 100).start()
+  IOLoop.instance().start()
+
+@gen.coroutine
+def discover(edges, rate, port):
+  done = Future()
+  started = []
+  peak = [ 0 ]
+
+  class App(MultiswitchApp3):
+    frenetic_http_port = str(port)
+    discover_topology = True
+
+    def connected(self):
+      started.append(time.time())
+      MultiswitchApp3.connected(self)
+
+    # Timed before the policy for the new topology is built and sent
+    def topology_discovered(self, port_mappings):
+      self.nib.set_port_mappings(port_mappings)
+      if not done.done():
+        done.set_result(time.time())
+
+  app = App()
+  app.discovery = TopologyDiscovery(app, logging, app.topology_discovered, rate=rate)
+  probe_answered = app.discovery.probe_answered
+  def watch_in_flight(ftr):
+    peak[0] = max(peak[0], app.discovery.in_flight)
+    probe_answered(ftr)
+  app.discovery.probe_answered = watch_in_flight
+  try:
+    finished = yield done
+  finally:
+    app.discovery.stop()
+  raise gen.Return({
+    "seconds": finished - started[0],
+    "found": app.nib.port_mappings == port_mappings_of(edges),
+    "probes": app.discovery.sent,
+    "in_flight": peak[0],
+  })
+
+def run_app(edges, rate, port, results):
+  logging.basicConfig(stream = sys.stderr, level=logging.ERROR)
+  results.put(IOLoop.instance().run_sync(lambda: discover(edges, rate, port)))
+
+def run(edges, ports, rate, port):
+  stop = multiprocessing.Event()
+  results = multiprocessing.Queue()
+  controller = multiprocessing.Process(target=run_stand_in, args=(ports, edges, port, stop, results))
+  controller.start()
+  time.sleep(1)
+  app = multiprocessing.Process(target=run_app, args=(edges, rate, port, results))
+  app.start()
+  r = results.get()
+  stop.set()
+  r["per_switch"] = results.get()
+  app.join()
+  controller.join()
+  return r
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.ERROR)
+  args = sys.argv[1:]
+  n_switches = int(args[0]) if len(args) > 0 else 500
+  ports_per_switch = int(args[1]) if len(args) > 1 else 48
+  rates = [ int(r) for r in args[2].split(",") ] if len(args) > 2 else [ 1000, 2000 ]
+  (switches, edges) = fabric(n_switches)
+  ports = switch_ports(switches, edges, ports_per_switch)
+  n_ports = sum( len(p) for p in ports.values() )
+  print "%d switches, %d ports, %d links" % (n_switches, n_ports, len(edges))
+  print "%8s %10s %10s %8s %10s %18s %12s" % \
+    ("rate", "seconds", "ports/rate", "probes", "all found", "max/switch/sec", "max waiting")
+  for (i, rate) in enumerate(rates):
+    r = run(edges, ports, rate, PORT + i)
+    print "%8d %10.2f %10.2f %8d %10s %18d %12d" % (
+      rate, r["seconds"], n_ports / float(rate), r["probes"], "yes" if r["found"] else "NO",
+      r["per_switch"], r["in_flight"]
+    )
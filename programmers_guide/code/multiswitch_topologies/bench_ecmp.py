@@ -0,0 +1,156 @@
+# Benchmark: how much traffic can a fat-tree carry with MultiswitchApp3 forwarding over
+# the spanning tree vs. every shortest path (use_ecmp)?
+#
+# We generate a k-ary fat-tree - (k/2)^2 spines, and k pods of k/2 aggregation and k/2
+# top-of-rack switches - and hang an edge switch with H hosts off each top-of-rack port,
+# as a hypervisor's virtual switch would be.  Once the app has learned every host, we
+# build its policy and follow each flow through it, hop by hop, with the evaluator from
+# test/policy_model.py, so nothing needs Frenetic or Mininet.  Then every link, host
+# links included, gets a capacity of 1 and the flows share them max-min fairly.
+# Throughput is the total of the flows' rates over the number of flows, so 1.0 means
+# every host sends at line rate.  We also count the flow entries the core switches'
+# policies compile to, with flow_entries from test/policy_model.py, since spreading
+# traffic mustn't cost a flow entry per pair of hosts.
+#
+# "permutation" has every host send to another at random, and "stride" has host i send
+# to host i + hosts / 2, which is always in another pod.
+#
+#   python bench_ecmp.py [k [hosts per edge switch]]
+
+import sys, os, json, random, tempfile, logging
+from multiswitch3 import MultiswitchApp3
+from bench_path_engine import fat_tree, write_dot
+from bench_policy_cache import new_app, mac_for
+sys.path.append("../common")
+from topology_cache import cache_path
+from addresses import int_to_mac
+sys.path.append("../test")
+from policy_model import evaluate, flow_entries, mac_int, ip_int
+
+def ip_for(i):
+  n = i + 1
+  return "10.%d.%d.%d" % ((n >> 16) & 255, (n >> 8) & 255, n & 255)
+
+# Every host is on an edge switch's port 2 and up, since port 1 is its uplink.  Hosts
+# carry their MACs as strings, as packets do, and the NIB learns them as ints.
+def learn_hosts(app, hosts_per_edge):
+  hosts = []
+  for dpid in sorted(app.nib.edge_switch_dpids()):
+    for p in range(hosts_per_edge):
+      i = len(hosts)
+      hosts.append( (dpid, 2 + p, int_to_mac(mac_for(i)), ip_for(i)) )
+      app.nib.learn(mac_for(i), dpid, 2 + p)
+  return hosts
+
+def permutation(n_hosts):
+  rng = random.Random(1)
+  dests = range(n_hosts)
+  rng.shuffle(dests)
+  return [ (i, d) for (i, d) in enumerate(dests) if i != d ]
+
+def stride(n_hosts):
+  return [ (i, (i + n_hosts / 2) % n_hosts) for i in range(n_hosts) ]
+
+# The links a flow crosses from host src to host dst, following the policy.  Host links
+# are ("from", mac) and ("to", mac), and links between switches are (dpid, dpid).
+def trace(policy, peers, src, dst, tcp_src):
+  (dpid, port_id, src_mac, src_ip) = src
+  (dst_dpid, dst_port_id, dst_mac, dst_ip) = dst
+  pkt = {
+    "switch": dpid, "location": ("physical", port_id),
+    "ethsrc": mac_int(src_mac), "ethdst": mac_int(dst_mac), "vlan": None, "vlanpcp": None,
+    "ethtype": 0x800, "ipproto": 6, "ip4src": ip_int(src_ip), "ip4dst": ip_int(dst_ip),
+    "tcpsrcport": tcp_src, "tcpdstport": 80
+  }
+  links = [ ("from", src_mac) ]
+  for hop in range(len(peers)):
+    out_ports = [ out["location"][1] for out in evaluate(policy, pkt) if out["location"][0] == "physical" ]
+    if dpid == dst_dpid and dst_port_id in out_ports:
+      return links + [ ("to", dst_mac) ]
+    # Edge switches flood packets for hosts elsewhere, so copies go out of their host
+    # ports too.  We only follow the one that goes to another switch.
+    onward = [ p for p in out_ports if (dpid, p) in peers ]
+    if len(onward) != 1:
+      raise ValueError("%s to %s: %d packets from switch %d to others" % (src_mac, dst_mac, len(onward), dpid))
+    (next_dpid, in_port) = peers[(dpid, onward[0])]
+    links.append( (dpid, next_dpid) )
+    dpid = next_dpid
+    pkt = dict(pkt, switch=dpid, location=("physical", in_port))
+  raise ValueError("%s to %s: loops" % (src_mac, dst_mac))
+
+# Max-min fair rates for flows over links of capacity 1: raise every flow's rate together
+# until some link fills up, then freeze the flows on it, and carry on with the rest
+def max_min_rates(paths):
+  rates = [ 0.0 ] * len(paths)
+  remaining = dict( (l, 1.0) for path in paths for l in path )
+  active = set(range(len(paths)))
+  while active:
+    users = {}
+    for f in active:
+      for l in paths[f]:
+        users[l] = users.get(l, 0) + 1
+    step = min( remaining[l] / n for (l, n) in users.items() )
+    for (l, n) in users.items():
+      remaining[l] -= step * n
+    for f in active:
+      rates[f] += step
+    full = set( l for l in users if remaining[l] < 1e-9 )
+    active = set( f for f in active if full.isdisjoint(paths[f]) )
+  return rates
+
+def run(path, use_ecmp, hosts_per_edge, patterns):
+  class App(MultiswitchApp3):
+    topology_file = path
+  App.use_ecmp = use_ecmp
+  app = new_app(App)
+  hosts = learn_hosts(app, hosts_per_edge)
+  policy_json = app.policies.to_json_text(app.policy())
+  policy = json.loads(policy_json)
+  core_entries = sum(
+    flow_entries(json.loads(app.policies.to_json_text(app.policies_for_dest_on_core(core_dpid))))
+    for core_dpid in app.nib.core_switch_dpids()
+  )
+  peers = {}
+  for (dpid, neighbors) in app.nib.port_mappings.items():
+    for (neighbor, port) in neighbors.items():
+      peers[(dpid, port)] = (neighbor, app.nib.port_mappings[neighbor][dpid])
+  results = []
+  for pattern in patterns:
+    rng = random.Random(2)
+    paths = [
+      trace(policy, peers, hosts[s], hosts[d], rng.randint(1024, 65535))
+      for (s, d) in pattern(len(hosts))
+    ]
+    rates = max_min_rates(paths)
+    per_link = {}
+    for path in paths:
+      for l in path[1:-1]:
+        per_link[l] = per_link.get(l, 0) + 1
+    results.append( (pattern.__name__, sum(rates) / len(rates), min(rates), max(per_link.values()),
+      len(per_link)) )
+  return (len(hosts), core_entries, len(policy_json), results)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.WARNING)
+  args = [ int(a) for a in sys.argv[1:] ]
+  k = args[0] if len(args) > 0 else 8
+  hosts_per_edge = args[1] if len(args) > 1 else 4
+  (switches, edges) = fat_tree(k)
+  (fd, path) = tempfile.mkstemp(suffix=".dot")
+  os.close(fd)
+  try:
+    write_dot(path, switches, edges)
+    print "%d-ary fat-tree, %d switches, %d hosts per edge switch" % (k, len(switches), hosts_per_edge)
+    print "%-12s %-12s %10s %10s %12s %12s %12s %12s" % ("forwarding", "traffic", "throughput",
+      "worst flow", "max flows", "links used", "core entries", "JSON bytes")
+    for use_ecmp in [ False, True ]:
+      (n_hosts, core_entries, size, results) = run(path, use_ecmp, hosts_per_edge, [ permutation, stride ])
+      for (name, throughput, worst, max_flows, links_used) in results:
+        print "%-12s %-12s %10.3f %10.3f %12d %12d %12d %12d" % (
+          "ECMP" if use_ecmp else "tree", name, throughput, worst, max_flows, links_used,
+          core_entries, size
+        )
+  finally:
+    for p in [ path, cache_path(path, "multiswitch") ]:
+      if os.path.exists(p):
+        os.remove(p)
@@ -0,0 +1,84 @@
+# Benchmark: how long does NetworkInformationBaseFromFile take to converge when a
+# spanning tree link between switches goes down, repairing the tree in place vs.
+# recomputing every next hop?
+#
+# We generate a fabric as bench_path_engine.py does, learn hosts on its edge switches,
+# then take random spanning tree links down one at a time, bringing each back up before
+# the next.  Convergence is the time from the port going down to the NIB being ready for
+# the new policy, with the number of switches whose policies changed.  To compare, we
+# also repair the tree and then work out every next hop again, and run the PathEngine
+# backend, which always recomputes.
+#
+#   python bench_link_repair.py [switches [hosts [failures]]]
+
+import sys, os, imp, time, random, tempfile, logging
+from network_information_base_from_file import NetworkInformationBaseFromFile
+from bench_path_engine import fabric, write_dot
+sys.path.append("../common")
+from topology_cache import cache_path
+
+# As a 48-bit int, the way the NIB keeps it: 02:00:00:00:00:01 and so on
+def mac_for(i):
+  return 0x020000000000 | (i & 0xffffffff)
+
+def new_nib(path, n_hosts, use_path_engine):
+  nib = NetworkInformationBaseFromFile(logging, path, use_path_engine)
+  edges = sorted(nib.edge_switches)
+  for i in range(n_hosts):
+    nib.learn(mac_for(i), edges[i % len(edges)], 10 + (i / len(edges)) % 38)
+  return nib
+
+def repair(nib, dpid, port_id):
+  return nib.link_down(dpid, port_id)
+
+def recompute(nib, dpid, port_id):
+  nib.link_down(dpid, port_id)
+  nib.compute_next_hops()
+  return set(nib.port_mappings)
+
+def tree_edges(nib):
+  return nib.path_engine.tree_edges() if nib.path_engine != None else nib.tree_edges
+
+def run(nib, n_failures, converge):
+  rng = random.Random(1)
+  times = []
+  changed = []
+  for i in range(n_failures):
+    (dpid, neighbor) = rng.choice(sorted(tree_edges(nib)))
+    port_id = nib.port_mappings[dpid][neighbor]
+    start = time.time()
+    changed.append(len(converge(nib, dpid, port_id)))
+    times.append(time.time() - start)
+    nib.link_up(dpid, port_id)
+  return (times, changed)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.ERROR)
+  args = [ int(a) for a in sys.argv[1:] ]
+  n_switches = args[0] if len(args) > 0 else 1000
+  n_hosts = args[1] if len(args) > 1 else 10000
+  n_failures = args[2] if len(args) > 2 else 50
+  (switches, edges) = fabric(n_switches)
+  (fd, path) = tempfile.mkstemp(suffix=".dot")
+  os.close(fd)
+  try:
+    write_dot(path, switches, edges)
+    print "%d switches, %d hosts, %d spanning tree links failed one at a time" % \
+      (n_switches, n_hosts, n_failures)
+    print "%-24s %10s %10s %18s" % ("", "mean ms", "max ms", "switches changed")
+    runs = [ ("repair", False, repair), ("recompute", False, recompute) ]
+    # The path engine needs NumPy, so it only runs if that's installed
+    try:
+      imp.find_module("numpy")
+      runs.append( ("path engine", True, repair) )
+    except ImportError:
+      pass
+    for (name, use_path_engine, converge) in runs:
+      (times, changed) = run(new_nib(path, n_hosts, use_path_engine), n_failures, converge)
+      print "%-24s %10.2f %10.2f %18.1f" % (
+        name, sum(times) * 1000 / len(times), max(times) * 1000, sum(changed) / float(len(changed))
+      )
+  finally:
+    for p in [ path, cache_path(path, "multiswitch") ]:
+      if os.path.exists(p):
+        os.remove(p)
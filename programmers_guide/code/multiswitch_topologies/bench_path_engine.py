@@ -0,0 +1,138 @@
+# Benchmark: how long does NetworkInformationBaseFromFile take to load a fabric with
+# thousands of switches, with pygraphviz and networkx vs. a PathEngine?
+#
+# We generate a three-tier fabric: a ring of core switches, aggregation switches each
+# homed on two cores, and edge switches each hanging off one aggregation switch.  It's
+# written out as a dot file like multiswitch_topo.dot, then loaded both ways.  After
+# loading we time next hop lookups between random pairs of switches.  The pygraphviz
+# and networkx load keeps a dictionary entry for every pair of switches, so it's only
+# run up to --baseline-max switches, and always cold, without a compiled topology cache
+# (see bench_topology_cache.py).
+#
+#   python bench_path_engine.py [--baseline-max N] [switches ...]
+
+import sys, os, time, random, tempfile, logging
+from path_engine import from_dot
+sys.path.append("../common")
+from topology_cache import cache_path
+
+LOOKUPS = 100000
+
+# Returns ([dpid, ...], [(dpid, dpid, src_port, dport), ...])
+def fabric(n_switches):
+  n_cores = max(4, n_switches / 50)
+  n_aggs = max(2, n_switches / 10)
+  switches = range(1, n_switches + 1)
+  cores = switches[:n_cores]
+  aggs = switches[n_cores:n_cores + n_aggs]
+  next_port = dict( (sw, 1) for sw in switches )
+  edges = []
+  def link(a, b):
+    edges.append( (a, b, next_port[a], next_port[b]) )
+    next_port[a] += 1
+    next_port[b] += 1
+  for (i, sw) in enumerate(cores):
+    link(sw, cores[(i + 1) % n_cores])
+  for (i, sw) in enumerate(aggs):
+    link(sw, cores[i % n_cores])
+    link(sw, cores[(i + 1) % n_cores])
+  for (i, sw) in enumerate(switches[n_cores + n_aggs:]):
+    link(sw, aggs[i % n_aggs])
+  return (switches, edges)
+
+# A k-ary fat-tree: (k/2)^2 spines, and k pods of k/2 aggregation and k/2 top-of-rack
+# switches, with an edge switch on every top-of-rack port.  For bench_ecmp.py.
+def fat_tree(k):
+  half = k / 2
+  switches = []
+  def new_switches(n):
+    first = len(switches) + 1
+    switches.extend(range(first, first + n))
+    return range(first, first + n)
+  spines = new_switches(half * half)
+  next_port = {}
+  edges = []
+  def link(a, b):
+    for sw in (a, b):
+      next_port.setdefault(sw, 1)
+    edges.append( (a, b, next_port[a], next_port[b]) )
+    next_port[a] += 1
+    next_port[b] += 1
+  for pod in range(k):
+    aggs = new_switches(half)
+    tors = new_switches(half)
+    for (i, agg) in enumerate(aggs):
+      for spine in spines[i * half:(i + 1) * half]:
+        link(agg, spine)
+      for tor in tors:
+        link(agg, tor)
+    for tor in tors:
+      for edge in new_switches(half):
+        link(edge, tor)
+  return (switches, edges)
+
+def write_dot(path, switches, edges):
+  with open(path, "w") as f:
+    f.write("strict graph fabric {\n")
+    for sw in switches:
+      f.write('  %d [ id = %d ];\n' % (sw, sw))
+    for (a, b, a_port, b_port) in edges:
+      f.write('  %d -- %d [ src_port = %d, dport = %d ];\n' % (a, b, a_port, b_port))
+    f.write("}\n")
+
+def time_lookups(next_hop, switches):
+  rng = random.Random(1)
+  pairs = [ (rng.choice(switches), rng.choice(switches)) for _ in xrange(LOOKUPS) ]
+  start = time.time()
+  for (from_dpid, to_dpid) in pairs:
+    next_hop(from_dpid, to_dpid)
+  return (time.time() - start) * 1000000.0 / LOOKUPS
+
+def run_engine(path, switches):
+  start = time.time()
+  engine = from_dot(path)
+  load = time.time() - start
+  start = time.time()
+  engine.compute()
+  recompute = time.time() - start
+  lookup_us = time_lookups(engine.next_hop, switches)
+  mb = engine.next_hop_matrix.nbytes / 1048576.0
+  return (load, recompute, lookup_us, mb)
+
+def run_networkx(path, switches):
+  from network_information_base_from_file import NetworkInformationBaseFromFile
+  start = time.time()
+  nib = NetworkInformationBaseFromFile(logging, path)
+  load = time.time() - start
+  start = time.time()
+  nib.compute_next_hops()
+  recompute = time.time() - start
+  def next_hop(from_dpid, to_dpid):
+    return nib.next_hops_to[to_dpid].get(from_dpid)
+  lookup_us = time_lookups(next_hop, switches)
+  return (load, recompute, lookup_us)
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.WARNING)
+  args = sys.argv[1:]
+  baseline_max = 5000
+  if len(args) > 1 and args[0] == "--baseline-max":
+    baseline_max = int(args[1])
+    args = args[2:]
+  sizes = [ int(a) for a in args ] or [ 1000, 5000, 10000 ]
+  print "%-9s %-10s %9s %12s %10s %10s" % ("switches", "backend", "load s", "recompute s", "lookup us", "matrix MB")
+  for n_switches in sizes:
+    (switches, edges) = fabric(n_switches)
+    (fd, path) = tempfile.mkstemp(suffix=".dot")
+    os.close(fd)
+    try:
+      write_dot(path, switches, edges)
+      (load, recompute, lookup_us, mb) = run_engine(path, switches)
+      print "%-9d %-10s %9.2f %12.2f %10.2f %10.1f" % (n_switches, "numpy", load, recompute, lookup_us, mb)
+      if n_switches <= baseline_max:
+        (load, recompute, lookup_us) = run_networkx(path, switches)
+        print "%-9d %-10s %9.2f %12.2f %10.2f %10s" % (n_switches, "networkx", load, recompute, lookup_us, "-")
+    finally:
+      for p in [ path, cache_path(path, "multiswitch") ]:
+        if os.path.exists(p):
+          os.remove(p)
@@ -0,0 +1,92 @@
+# Benchmark: what does one more host cost MultiswitchApp3.policy() with H hosts learned?
+#
+# We learn H hosts spread over the edge switches of multiswitch_topo.dot, then learn a
+# few more one at a time.  After each one we build the policy and serialize it, either
+# from scratch as frenetic.App.update() would, or through the app's PolicyCache.  Nothing
+# is sent over the wire, so this runs without a Frenetic controller.
+#
+#   python bench_policy_cache.py [hosts ...]
+
+import sys, time, json, logging
+from multiswitch3 import MultiswitchApp3
+sys.path.append("../common")
+from policy_cache import PolicyCache
+
+# Host ports on each edge switch.  Several hosts can sit behind one port, as behind a
+# hypervisor or an unmanaged switch.
+HOST_PORTS = 48
+
+# Hosts learned one at a time after the first H, to average over
+STEPS = 10
+
+# As a 48-bit int, the way the NIB keeps it: 02:00:00:00:00:01 and so on
+def mac_for(i):
+  return 0x020000000000 | (i & 0xffffffff)
+
+def new_app(app_class=MultiswitchApp3):
+  app = app_class()
+  nib = app.nib
+  ports = {}
+  for sw in nib.core_switch_dpids():
+    ports[sw] = sorted(nib.port_mappings[sw].values())
+  for sw in nib.edge_switch_dpids():
+    uplink = nib.uplink_port_for_dpid(sw)
+    ports[sw] = [uplink] + [ p for p in range(1, HOST_PORTS + 2) if p != uplink ][:HOST_PORTS]
+  nib.set_all_ports(ports)
+  return app
+
+def learn_host(app, i):
+  nib = app.nib
+  edge_switches = sorted(nib.edge_switch_dpids())
+  sw = edge_switches[i % len(edge_switches)]
+  host_ports = nib.ports[sw][1:]
+  nib.learn(mac_for(i), sw, host_ports[(i // len(edge_switches)) % len(host_ports)])
+
+def step_uncached(app):
+  app.policies = PolicyCache()
+  start = time.time()
+  policy = app.policy()
+  built = time.time()
+  policy_json = json.dumps(policy.to_json())
+  return (built - start, time.time() - built, len(policy_json), app.policies.built)
+
+def step_cached(app):
+  built_before = app.policies.built
+  start = time.time()
+  policy = app.policy()
+  built = time.time()
+  policy_json = app.policies.to_json_text(policy)
+  app.policies.sweep()
+  return (built - start, time.time() - built, len(policy_json), app.policies.built - built_before)
+
+def run(n_hosts):
+  app = new_app()
+  for i in range(n_hosts):
+    learn_host(app, i)
+
+  # Warm the cache and check it gives the same policy frenetic.App.update() would send
+  policy = app.policy()
+  assert json.loads(app.policies.to_json_text(policy)) == policy.to_json()
+  app.policies.sweep()
+
+  results = {}
+  for (name, step) in [ ("uncached", step_uncached), ("cached", step_cached) ]:
+    totals = [0, 0, 0, 0]
+    for i in range(STEPS):
+      learn_host(app, n_hosts + len(results) * STEPS + i)
+      totals = [ t + r for (t, r) in zip(totals, step(app)) ]
+    results[name] = [ t / float(STEPS) for t in totals ]
+  return results
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.WARNING)
+  host_counts = [ int(h) for h in sys.argv[1:] ] or [ 1000, 10000 ]
+  print "Per update, averaged over %d newly learned hosts" % STEPS
+  print "%8s %-10s %10s %13s %12s %12s" % \
+    ("hosts", "policy", "build ms", "serialize ms", "JSON bytes", "nodes built")
+  for n_hosts in host_counts:
+    results = run(n_hosts)
+    for name in [ "uncached", "cached" ]:
+      (build, serialize, size, nodes) = results[name]
+      print "%8d %-10s %10.1f %13.1f %12d %12d" % \
+        (n_hosts, name, build * 1000, serialize * 1000, size, nodes)
@@ -0,0 +1,187 @@
+# Benchmark: MultiswitchApp3 in one process vs. sharded across worker processes
+#
+# Builds a fabric of core switches in a chain, each with a fan of edge switches, and
+# replays a storm of new hosts: one packet_in from every host, each to be learned and
+# forwarded.  A stand-in Frenetic in its own process hands out the events and counts
+# the pkt_outs and policy updates that come back.
+#
+# Throughput is packet_ins answered per second of wall time.  That can only scale if
+# there are cores to spare, so we also read each app process's CPU time from /proc
+# (Linux only).  The busiest process is the bottleneck: with a core for each process,
+# packet_ins / its CPU seconds is the rate the deployment could keep up.
+#
+#   python bench_sharding.py [switches] [hosts_per_edge] [shards,shards,...]
+
+import sys, os, json, time, base64, struct, tempfile, logging, multiprocessing
+from tornado import gen, web
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+from multiswitch3 import MultiswitchApp3
+from multiswitch3_sharded import ShardedMultiswitchApp3
+sys.path.append("../common")
+from sharding import run_sharded
+
+PORT = 9126
+
+def write_topology(n_switches, hosts_per_edge):
+  n_core = max(2, n_switches // 20)
+  lines = [ "strict graph bench {" ]
+  edges_of = dict( (core, []) for core in range(1, n_core + 1) )
+  for core in range(1, n_core):
+    lines.append("  %d -- %d [ src_port = 2, dport = 1 ];" % (core, core + 1))
+  for edge in range(n_core + 1, n_switches + 1):
+    core = (edge - n_core - 1) % n_core + 1
+    edges_of[core].append(edge)
+    lines.append("  %d -- %d [ src_port = %d, dport = 1 ];" % (core, edge, len(edges_of[core]) + 2))
+  lines.append("}")
+  f = tempfile.NamedTemporaryFile(suffix=".dot", delete=False)
+  f.write("\n".join(lines))
+  f.close()
+  ports = {}
+  for core in edges_of:
+    ports[core] = range(1, len(edges_of[core]) + 3)
+  for edge in range(n_core + 1, n_switches + 1):
+    ports[edge] = range(1, hosts_per_edge + 2)
+  return (f.name, n_core, ports)
+
+def host_mac(i):
+  return struct.pack("!HI", 0x0200, i)
+
+def host_events(n_core, n_switches, hosts_per_edge):
+  events = []
+  n_hosts = (n_switches - n_core) * hosts_per_edge
+  for i in range(n_hosts):
+    edge = n_core + 1 + i // hosts_per_edge
+    port = 2 + i % hosts_per_edge
+    data = host_mac((i + 1) % n_hosts) + host_mac(i) + "\x08\x00" + "%08d" % i + "\x00" * 38
+    events.append(json.dumps({
+      "type": "packet_in", "switch_id": edge, "port_id": port,
+      "payload": { "id": None, "buffer": base64.b64encode(data) }
+    }))
+  return events
+
+def run_controller(events, ports, n_clients, results):
+  stats = { "started": None, "pkt_outs": 0, "updates": 0, "update_bytes": 0 }
+  waiting = []
+  connected = []
+
+  # We keep running until the app has been stopped, so it doesn't see us go away
+  def finish():
+    if "finished" in stats:
+      return
+    stats["finished"] = time.time()
+    results.put(stats)
+
+  def start():
+    stats["started"] = time.time()
+    results.put("started")
+    while waiting != [] and events != []:
+      waiting.pop(0).set_result(events.pop(0))
+
+  class Version(web.RequestHandler):
+    def get(self):
+      self.write("4.1")
+
+  class Event(web.RequestHandler):
+    @gen.coroutine
+    def get(self, client_id):
+      ftr = Future()
+      if stats["started"] != None and events != []:
+        ftr.set_result(events.pop(0))
+      else:
+        waiting.append(ftr)
+      self.write((yield ftr))
+
+  class Switches(web.RequestHandler):
+    def get(self):
+      self.write(json.dumps([ { "switch_id": dpid, "ports": p } for (dpid, p) in ports.iteritems() ]))
+      connected.append(True)
+      # Give the last app a moment to take the list in before the storm starts
+      if len(connected) == n_clients:
+        IOLoop.instance().call_later(1, start)
+        # Stop anyway if some packets never make it
+        IOLoop.instance().call_later(300, finish)
+
+  class Update(web.RequestHandler):
+    def post(self, client_id):
+      stats["updates"] += 1
+      stats["update_bytes"] += len(self.request.body)
+
+  class PktOut(web.RequestHandler):
+    def post(self):
+      stats["pkt_outs"] += 1
+      if stats["pkt_outs"] == n_events:
+        finish()
+
+  n_events = len(events)
+  web.Application([
+    (r"/version", Version), (r"/(\w+)/event", Event), (r"/current_switches", Switches),
+    (r"/(\w+)/update_json", Update), (r"/pkt_out", PktOut)
+  ]).listen(PORT, address="127.0.0.1")
+  IOLoop.instance().start()
+
+def run_app(n_shards):
+  # The NIB prints the spanning tree, and the apps log every host
+  sys.stdout = open(os.devnull, "w")
+  logging.basicConfig(level=logging.WARNING)
+  if n_shards == 0:
+    MultiswitchApp3().start_event_loop()
+  else:
+    run_sharded(ShardedMultiswitchApp3, n_shards)
+
+def cpu_seconds(pid):
+  fields = open("/proc/%d/stat" % pid).read().rsplit(")", 1)[1].split()
+  return (int(fields[11]) + int(fields[12])) / float(os.sysconf("SC_CLK_TCK"))
+
+def children_of(pid):
+  kids = []
+  for entry in os.listdir("/proc"):
+    if entry.isdigit():
+      try:
+        if int(open("/proc/%s/stat" % entry).read().rsplit(")", 1)[1].split()[1]) == pid:
+          kids.append(int(entry))
+      except IOError:
+        pass
+  return kids
+
+def measure(n_shards, events, ports):
+  results = multiprocessing.Queue()
+  controller = multiprocessing.Process(
+    target=run_controller, args=(list(events), ports, max(1, n_shards), results)
+  )
+  controller.start()
+  time.sleep(0.5)
+  app = multiprocessing.Process(target=run_app, args=(n_shards,))
+  app.start()
+  # Only count CPU time spent on the storm, not reading the topology
+  results.get()
+  pids = [ app.pid ] + children_of(app.pid)
+  cpu_before = [ cpu_seconds(pid) for pid in pids ]
+  stats = results.get()
+  cpu = [ cpu_seconds(pid) - before for (pid, before) in zip(pids, cpu_before) ]
+  for pid in pids[1:]:
+    os.kill(pid, 15)
+  app.terminate()
+  app.join()
+  controller.terminate()
+  controller.join()
+  elapsed = stats["finished"] - stats["started"]
+  return (len(events) / elapsed, len(events) / max(cpu), sum(cpu), stats["updates"], stats["update_bytes"])
+
+if __name__ == '__main__':
+  n_switches = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+  hosts_per_edge = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+  shard_counts = [ int(n) for n in sys.argv[3].split(",") ] if len(sys.argv) > 3 else [ 1, 2, 4 ]
+  (topology_file, n_core, ports) = write_topology(n_switches, hosts_per_edge)
+  events = host_events(n_core, n_switches, hosts_per_edge)
+  MultiswitchApp3.topology_file = topology_file
+  MultiswitchApp3.frenetic_http_port = str(PORT)
+  print "%d switches (%d core), %d new hosts, %d cores here" % \
+    (n_switches, n_core, len(events), multiprocessing.cpu_count())
+  print "%-12s%12s%16s%12s%10s%12s" % \
+    ("shards", "packets/s", "1 core each/s", "CPU secs", "updates", "update MB")
+  for n_shards in [ 0 ] + shard_counts:
+    (rate, projected, cpu, updates, update_bytes) = measure(n_shards, events, ports)
+    print "%-12s%12.0f%16.0f%12.1f%10d%12.1f" % \
+      ("unsharded" if n_shards == 0 else n_shards, rate, projected, cpu, updates, update_bytes / 1e6)
+  os.unlink(topology_file)
@@ -0,0 +1,46 @@
+# Benchmark: how long does NetworkInformationBaseFromFile take to start, with and without
+# a compiled topology cache?
+#
+# For each size we generate a fabric as bench_path_engine.py does and start a fresh
+# Python process that builds the NIB from it, as a restart under upstart would.  The
+# first start finds no cache, so it reads the file with pygraphviz, works out the
+# spanning tree with networkx and saves the result.  The next starts read the cache.
+# Times are for the whole process, imports included.
+#
+#   python bench_topology_cache.py [switches ...]
+
+import sys, os, time, tempfile, subprocess, logging
+from bench_path_engine import fabric, write_dot
+sys.path.append("../common")
+from topology_cache import cache_path
+
+WARM_STARTS = 3
+
+def start(path):
+  started = time.time()
+  subprocess.check_call([ sys.executable, __file__, "--start", path ])
+  return time.time() - started
+
+if __name__ == '__main__':
+  if sys.argv[1:2] == [ "--start" ]:
+    from network_information_base_from_file import NetworkInformationBaseFromFile
+    NetworkInformationBaseFromFile(logging, sys.argv[2])
+    sys.exit(0)
+
+  sizes = [ int(a) for a in sys.argv[1:] ] or [ 100, 1000, 2000 ]
+  print "%-9s %8s %8s %10s" % ("switches", "cold s", "warm s", "cache MB")
+  for n_switches in sizes:
+    (switches, edges) = fabric(n_switches)
+    (fd, path) = tempfile.mkstemp(suffix=".dot")
+    os.close(fd)
+    cache = cache_path(path, "multiswitch")
+    try:
+      write_dot(path, switches, edges)
+      cold = start(path)
+      warm = min( start(path) for _ in range(WARM_STARTS) )
+      mb = os.path.getsize(cache) / 1048576.0
+      print "%-9d %8.2f %8.2f %10.1f" % (n_switches, cold, warm, mb)
+    finally:
+      for p in [ path, cache ]:
+        if os.path.exists(p):
+          os.remove(p)
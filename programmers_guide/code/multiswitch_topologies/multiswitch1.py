@@ -3,6 +3,7 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base import *
+from addresses import mac_to_int, int_to_mac, ints_to_macs
 
 class MultiswitchApp1(frenetic.App):
 
@@ -21,7 +22,7 @@ class MultiswitchApp1(frenetic.App):
 
   def policy_for_dest(self, dpid, mac_port):
     (mac, port) = mac_port
-    return Filter(EthDstEq(mac)) >> SetPort(port)
+    return Filter(EthDstEq(int_to_mac(mac))) >> SetPort(port)
 
   def policies_for_dest(self, dpid, all_mac_ports):
     return [ self.policy_for_dest(dpid, mp) for mp in all_mac_ports ]
@@ -30,8 +31,8 @@ class MultiswitchApp1(frenetic.App):
     return \
       Filter(SwitchEq(dpid)) >> \
       IfThenElse(
-        (EthSrcNotEq( self.nib.all_learned_macs_on_switch(dpid) ) | 
-        EthDstNotEq( self.nib.all_learned_macs_on_switch(dpid) )),
+        (EthSrcNotEq( ints_to_macs(self.nib.all_learned_macs_on_switch(dpid)) ) | 
+        EthDstNotEq( ints_to_macs(self.nib.all_learned_macs_on_switch(dpid)) )),
         SendToController("multiswitch"),
         Union( self.policies_for_dest(dpid, self.nib.all_mac_port_pairs_on_switch(dpid)) )
       )
@@ -59,8 +60,8 @@ class MultiswitchApp1(frenetic.App):
       return
 
     pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = mac_to_int(pkt.ethSrc)
+    dst_mac = mac_to_int(pkt.ethDst)
 
     # If we haven't learned the source mac, do so
     if nib.port_for_mac_on_switch( src_mac, dpid ) == None: 
@@ -81,13 +82,13 @@ class MultiswitchApp1(frenetic.App):
     self.pkt_out(dpid, payload, actions )
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid,port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.delete_port(dpid, port_id)
     self.update(self.policy())
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid,port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.add_port(dpid, port_id)
     self.update(self.policy())
 
@@ -3,6 +3,7 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base import *
+from addresses import mac_to_int, int_to_mac, ints_to_macs
 
 class MultiswitchApp2(frenetic.App):
 
@@ -31,7 +32,7 @@ class MultiswitchApp2(frenetic.App):
 
   def policy_for_dest(self, dpid, mac_port):
     (mac, port) = mac_port
-    return Filter(EthDstEq(mac)) >> SetPort(port)
+    return Filter(EthDstEq(int_to_mac(mac))) >> SetPort(port)
 
   def policies_for_dest(self, dpid, all_mac_ports):
     return [ self.policy_for_dest(dpid, mp) for mp in all_mac_ports ]
@@ -41,11 +42,11 @@ class MultiswitchApp2(frenetic.App):
     return \
       Filter(SwitchEq(dpid)) >> \
       IfThenElse(
-        EthSrcNotEq( nib.all_learned_macs_on_switch(dpid) ) &
+        EthSrcNotEq( ints_to_macs(nib.all_learned_macs_on_switch(dpid)) ) &
           PortNotEq(nib.uplink_port_for_dpid(dpid)),
         SendToController("multiswitch"),
         IfThenElse( 
-          EthDstEq( nib.all_learned_macs_on_switch(dpid) ),
+          EthDstEq( ints_to_macs(nib.all_learned_macs_on_switch(dpid)) ),
           Union( self.policies_for_dest(dpid, nib.all_mac_port_pairs_on_switch(dpid)) ),
           self.policy_flood(dpid)
         )
@@ -58,7 +59,7 @@ class MultiswitchApp2(frenetic.App):
     )
 
   def policy_for_dest_on_core(self, mac, dpid, core_dpid):
-    return Filter(EthDstEq(mac)) >> \
+    return Filter(EthDstEq(int_to_mac(mac))) >> \
       SetPort( self.nib.core_port_for_edge_dpid(dpid) ) 
 
   def policies_for_dest_on_core(self, core_dpid):
@@ -72,7 +73,7 @@ class MultiswitchApp2(frenetic.App):
     return \
       Filter(SwitchEq(core_dpid)) >> \
       IfThenElse(
-        EthDstEq(self.nib.all_learned_macs()),
+        EthDstEq(ints_to_macs(self.nib.all_learned_macs())),
         self.policies_for_dest_on_core(core_dpid),
         self.policy_flood(core_dpid)
       )
@@ -88,8 +89,8 @@ class MultiswitchApp2(frenetic.App):
       return
 
     pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = mac_to_int(pkt.ethSrc)
+    dst_mac = mac_to_int(pkt.ethDst)
 
     # If we haven't learned the source mac, do so
     if nib.port_for_mac_on_switch( src_mac, dpid ) == None: 
@@ -110,13 +111,13 @@ class MultiswitchApp2(frenetic.App):
     self.pkt_out(dpid, payload, actions )
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid,port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.delete_port(dpid, port_id)
     self.update(self.policy())
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid,port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.add_port(dpid, port_id)
     self.update(self.policy())
 
@@ -1,129 +1,275 @@
 import sys,logging
-import frenetic
 from frenetic.syntax import *
-from frenetic.packet import *
 from network_information_base_from_file import *
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+from addresses import int_to_mac, ints_to_macs
+from policy_cache import PolicyCache
+from policy_telemetry import PolicyTelemetry
+from frenetic_client import timed
+from batched_app import BatchedApp
+from topology_discovery import TopologyDiscovery, ETH_TYPE_LLDP
 
-class MultiswitchApp3(frenetic.App):
+class MultiswitchApp3(BatchedApp):
 
   client_id = "multiswitch"
 
+  topology_file = "multiswitch_topo.dot"
+
+  # Set this to record the size and build time of every policy pushed, and log them
+  # every minute.  Measuring costs time on every update, so it's off by default.
+  policy_metrics = False
+
+  # Set this as well to serve the metrics at /policy_metrics
+  policy_metrics_port = None
+
+  # Set this for fabrics with thousands of switches.  Needs NumPy.
+  use_path_engine = False
+
+  # Set this to spread traffic over every shortest path between switches, as in a
+  # fat-tree, rather than just the spanning tree
+  use_ecmp = False
+
+  # Set this to find the links between switches with LLDP probes rather than read them
+  # from topology_file (see topology_discovery.py)
+  discover_topology = False
+
   def __init__(self):
-    frenetic.App.__init__(self)     
-    self.nib = NetworkInformationBaseFromFile(logging)
+    BatchedApp.__init__(self)
+    self.nib = NetworkInformationBaseFromFile(logging,
+      None if self.discover_topology else self.topology_file, self.use_path_engine, self.use_ecmp)
+    self.discovery = None
+    if self.discover_topology:
+      self.discovery = TopologyDiscovery(self, logging, self.topology_discovered)
+    # Rules for hosts that haven't moved are reused, JSON and all, from update to update
+    self.policies = PolicyCache()
+    # Each switch's part of the policy as last built, and the switches whose parts need
+    # building again, as for the sharded app's partitions
+    self.switch_policies = {}
+    self.dirty_switches = set()
+    if self.policy_metrics:
+      PolicyTelemetry(logging, dump_port=self.policy_metrics_port).instrument(self)
 
   def connected(self):
     def handle_current_switches(switches):
       logging.info("Connected to Frenetic - Switches: "+str(switches))
       self.nib.set_all_ports( switches )
-      self.update( self.policy() )
+      if self.discovery != None:
+        # The policy waits until we know which switches are which
+        self.discovery.start( switches )
+      else:
+        self.update_policy()
     self.current_switches(callback=handle_current_switches)
 
+  def topology_discovered(self, port_mappings):
+    self.nib.set_port_mappings(port_mappings)
+    self.update_policy()
+
   def policy_flood_one_port(self, dpid, port_id):
-    outputs = SetPort( self.nib.all_enabled_ports_except(dpid, port_id) )
-    return Filter(PortEq(port_id)) >> outputs
+    pc = self.policies
+    ports = self.nib.all_enabled_ports_except(dpid, port_id)
+    # A core switch at a leaf of the spanning tree has nowhere to flood what comes in on
+    # its one tree link
+    outputs = pc.make(SetPort, ports) if ports != [] else drop
+    return pc.seq( pc.make(Filter, pc.make(PortEq, port_id)), outputs )
 
   def policy_flood(self, dpid):
-    return Union(
+    return self.policies.union(
       self.policy_flood_one_port(dpid, p) 
       for p in self.nib.ports[dpid]
     )
 
   def policy_for_dest(self, dpid, mac_port):
     (mac, port) = mac_port
-    return Filter(EthDstEq(mac)) >> SetPort(port)
+    pc = self.policies
+    return pc.seq( pc.make(Filter, pc.make(EthDstEq, int_to_mac(mac))), pc.make(SetPort, port) )
 
   def policies_for_dest(self, dpid, all_mac_ports):
     return [ self.policy_for_dest(dpid, mp) for mp in all_mac_ports ]
 
   def policy_for_edge_switch(self, dpid):
     nib = self.nib
-    return \
-      Filter(SwitchEq(dpid)) >> \
-      IfThenElse(
-        EthSrcNotEq( nib.all_learned_macs_on_switch(dpid) ) &
-          PortNotEq(nib.uplink_port_for_dpid(dpid)),
-        SendToController("multiswitch"),
-        IfThenElse( 
-          EthDstEq( nib.all_learned_macs_on_switch(dpid) ),
-          Union( self.policies_for_dest(dpid, nib.all_mac_port_pairs_on_switch(dpid)) ),
+    pc = self.policies
+    learned_macs = ints_to_macs(nib.all_learned_macs_on_switch(dpid))
+    return pc.seq(
+      pc.make(Filter, pc.make(SwitchEq, dpid)),
+      pc.make(IfThenElse,
+        pc.make(And, [
+          pc.make(EthSrcNotEq, learned_macs), pc.make(PortNotEq, nib.uplink_port_for_dpid(dpid))
+        ]),
+        pc.make(SendToController, "multiswitch"),
+        pc.make(IfThenElse,
+          pc.make(EthDstEq, learned_macs),
+          pc.union( self.policies_for_dest(dpid, nib.all_mac_port_pairs_on_switch(dpid)) ),
           self.policy_flood(dpid)
         )
       )
+    )
 
   def policy_for_edge_switches(self):
-    return Union(
-      self.policy_for_edge_switch(dpid) 
-      for dpid in self.nib.edge_switch_dpids()
-    )
+    edges = self.nib.edge_switch_dpids()
+    for dpid in edges:
+      if self.needs_build(dpid):
+        self.switch_policies[dpid] = self.policy_for_edge_switch(dpid)
+    return self.policies.union( self.switch_policies[dpid] for dpid in edges )
 
-  def policy_for_dest_on_core(self, mac, core_dpid):
-    return Filter(EthDstEq(mac)) >> \
-      SetPort( self.nib.next_hop_port(mac, core_dpid) ) 
+  # One rule for all the MACs a core switch sends out of the same port
+  def policy_for_dests_on_core(self, port, macs):
+    pc = self.policies
+    return pc.seq( 
+      pc.make(Filter, pc.make(EthDstEq, ints_to_macs(macs))),
+      pc.make(SetPort, port)
+    )
 
+  # With use_ecmp, the NIB spreads the hosts a core switch has several ports towards over
+  # those ports, so the groups still come one port each
   def policies_for_dest_on_core(self, core_dpid):
-    return Union( 
-      self.policy_for_dest_on_core(mac, core_dpid) 
-      for mac in self.nib.all_learned_macs()
+    return self.policies.union( 
+      self.policy_for_dests_on_core(port, macs) 
+      for (port, macs) in self.nib.next_hop_groups(core_dpid)
     )
 
-  def policy_for_core_switch(self, core_dpid):
-    return \
-      Filter(SwitchEq(core_dpid)) >> \
-      IfThenElse(
-        EthDstEq(self.nib.all_learned_macs()),
+  def policy_for_core_switch(self, core_dpid, learned_macs):
+    pc = self.policies
+    return pc.seq(
+      pc.make(Filter, pc.make(SwitchEq, core_dpid)),
+      pc.make(IfThenElse,
+        pc.make(EthDstEq, learned_macs),
         self.policies_for_dest_on_core(core_dpid),
         self.policy_flood(core_dpid)
       )
+    )
 
   def policy_for_core_switches(self):
-    return Union(
-      self.policy_for_core_switch(dpid) 
-      for dpid in self.nib.core_switch_dpids()
-    )
+    cores = self.nib.core_switch_dpids()
+    stale = [ dpid for dpid in cores if self.needs_build(dpid) ]
+    if stale != []:
+      learned_macs = ints_to_macs(self.nib.all_learned_macs())
+      for dpid in stale:
+        self.switch_policies[dpid] = self.policy_for_core_switch(dpid, learned_macs)
+    return self.policies.union( self.switch_policies[dpid] for dpid in cores )
+
+  def needs_build(self, dpid):
+    return dpid in self.dirty_switches or dpid not in self.switch_policies
 
+  # Builds every switch's part of the policy again
   def policy(self):
-    return self.policy_for_core_switches() | self.policy_for_edge_switches()
+    self.switch_policies = {}
+    return self.policy_from_switches()
 
-  def packet_in(self, dpid, port_id, payload):
-    nib = self.nib
+  # Builds only the switches marked dirty, and pastes in the rest as they were
+  def policy_from_switches(self):
+    pc = self.policies
+    policy = pc.union([ self.policy_for_core_switches(), self.policy_for_edge_switches() ])
+    self.dirty_switches.clear()
+    if self.discovery == None:
+      return policy
+    # Probes are the discovery client's, and mustn't be flooded
+    return pc.seq( pc.make(Filter, pc.make(EthTypeNotEq, ETH_TYPE_LLDP)), policy )
+
+  # Pushes the policy with the switches in dpids built again, or every switch
+  def update_policy(self, dpids=None):
+    if dpids == None:
+      build = self.policy
+    else:
+      self.dirty_switches.update(dpids)
+      build = self.policy_from_switches
+    return self.policies.update(self, timed(self, self.client_id, "build", build))
 
+  # Learn every new source MAC in the batch first, so the whole batch costs one update
+  def packet_in_batch(self, events):
     # If we haven't learned the ports yet, just exit prematurely
-    if nib.switch_not_yet_connected():
+    if self.nib.switch_not_yet_connected():
       return
+    if self.discovery != None:
+      events = [ (dpid, port_id, payload) for (dpid, port_id, payload) in events
+        if not self.discovery.packet_in(dpid, port_id, payload) ]
+      # Nor which switches are which
+      if not self.discovery.discovered:
+        return
 
-    pkt = Packet.from_payload(dpid, port_id, payload)
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    pkts = [ LazyPacket.from_payload(dpid, port_id, payload) for (dpid, port_id, payload) in events ]
+    learned = False
+    for pkt in pkts:
+      learned = self.learn_source(pkt) or learned
+    if learned:
+      self.update_policy()
+    for pkt in pkts:
+      self.forward(pkt)
+
+  def packet_in(self, dpid, port_id, payload):
+    self.packet_in_batch([ (dpid, port_id, payload) ])
+
+  def learn_source(self, pkt):
+    nib = self.nib
+    src_mac = pkt.ethSrcInt
 
     # If we haven't learned the source mac, do so
-    if nib.port_for_mac_on_switch( src_mac, dpid ) == None: 
+    if nib.port_for_mac_on_switch( src_mac, pkt.switch ) == None: 
       # Don't learn the mac for packets coming in from internal ports
-      if nib.is_internal_port(dpid, port_id):
+      if nib.is_internal_port(pkt.switch, pkt.port):
         pass
       else:
-        nib.learn( src_mac, dpid, port_id )
-        self.update(self.policy())
+        nib.learn( src_mac, pkt.switch, pkt.port )
+        return True
+    return False
+
+  def forward(self, pkt):
+    nib = self.nib
+    dst_mac = pkt.ethDstInt
 
     # Look up the destination mac and output it through the
     # learned port, or flood if we haven't seen it yet.
-    dst_port = nib.port_for_mac_on_switch( dst_mac, dpid )
+    dst_port = nib.port_for_mac_on_switch( dst_mac, pkt.switch )
     if  dst_port != None:
       actions = SetPort(dst_port)
     else:
-      actions = SetPort( nib.all_enabled_ports_except(dpid, port_id) )
-    self.pkt_out(dpid, payload, actions )
+      actions = nib.flood_actions(pkt.switch, pkt.port)
+    self.pkt_out(pkt.switch, pkt.payload, actions )
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid,port_id) )
+    if self.discovery != None:
+      self.discovery.port_down(dpid, port_id)
+    changed = self.forget_port(dpid, port_id)
     self.nib.delete_port(dpid, port_id)
-    self.update(self.policy())
+    # If it's on the spanning tree, traffic moves to another link
+    changed.update(self.nib.link_down(dpid, port_id))
+    self.update_policy(changed)
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid,port_id) )
+    changed = self.forget_port(dpid, port_id)
     self.nib.add_port(dpid, port_id)
-    self.update(self.policy())
+    changed.update(self.nib.link_up(dpid, port_id))
+    if self.discovery != None:
+      self.discovery.port_up(dpid, port_id)
+    self.update_policy(changed)
+
+  # Forgets the hosts behind a port.  Returns the switches whose policies change: this
+  # one, since it floods to different ports, and every core switch if there were hosts.
+  def forget_port(self, dpid, port_id):
+    changed = set([ dpid ])
+    if self.nib.unlearn_port_on_switch(dpid, port_id) != []:
+      changed.update(self.nib.core_switch_dpids())
+    return changed
+
+  # Only discovery cares about switches coming and going.  Their links come and go with
+  # them, and it reports those.
+  def switch_up(self, dpid, ports):
+    if self.discovery == None:
+      return BatchedApp.switch_up(self, dpid, ports)
+    all_ports = dict(self.nib.ports)
+    all_ports[dpid] = list(ports)
+    self.nib.set_all_ports(all_ports)
+    self.discovery.switch_up(dpid, ports)
+
+  def switch_down(self, dpid):
+    if self.discovery == None:
+      return BatchedApp.switch_down(self, dpid)
+    all_ports = dict(self.nib.ports)
+    all_ports.pop(dpid, None)
+    self.nib.set_all_ports(all_ports)
+    self.discovery.switch_down(dpid)
 
 if __name__ == '__main__':
   logging.basicConfig(\
@@ -0,0 +1,170 @@
+import sys,logging
+from tornado import gen
+from tornado.ioloop import IOLoop
+from multiswitch3 import MultiswitchApp3
+sys.path.append("../common")
+from policy_partitions import PolicyPartitions
+from sharding import ShardWorker, run_sharded
+from addresses import ints_to_macs
+
+# The worker that builds every core switch's policy
+CORE_SHARD = 0
+
+# MultiswitchApp3 split across processes by switch (see common/sharding.py).  Each worker
+# handles packet_ins from its own switches and pushes one policy per switch.  A host
+# learned on an edge switch is shared with the other workers, since every core switch
+# needs a rule for it.  Links going down and up are shared too, since every worker
+# needs to repair the spanning tree, and then push the policies of its own switches
+# whose next hops changed.
+#
+# Every core switch's policy lists every learned host, so building one costs the same
+# whichever worker does it.  Shard 0 builds them all, rather than every worker
+# rebuilding its share of them for every host learned anywhere.  The other workers only
+# rebuild edge switches, and only for their own hosts.
+#
+#   python multiswitch3_sharded.py [shards]
+
+class ShardedMultiswitchApp3(ShardWorker, MultiswitchApp3):
+
+  # Core switch changes are gathered for this many seconds and pushed together
+  push_interval = 0.1
+
+  def join_shards(self, shard, n_shards, sock):
+    ShardWorker.join_shards(self, shard, n_shards, sock)
+    self.partitions = PolicyPartitions(
+      self, self.client_id, self.policy_for_switch, logging,
+      to_json_text=self.policies.to_json_text
+    )
+    self.push_pending = False
+
+  @gen.coroutine
+  def connected(self):
+    switches = yield self.current_switches()
+    logging.info("Shard "+str(self.shard)+" connected to Frenetic - Switches: "+str(switches))
+    self.nib.set_all_ports( switches )
+    for dpid in self.owned_switches():
+      self.partitions.mark_dirty(dpid)
+    self.update_policy()
+
+  def owned_switches(self):
+    return [ dpid for dpid in self.nib.edge_switch_dpids() + self.nib.core_switch_dpids()
+      if self.owns_policy(dpid) ]
+
+  # Events still go to the worker owning the switch, but core switch policies are shard 0's
+  def owns_policy(self, dpid):
+    if dpid in self.nib.core_switches:
+      return self.shard == CORE_SHARD
+    return self.owns(dpid)
+
+  def policy_for_switch(self, dpid):
+    if dpid in self.nib.edge_switches:
+      return self.policy_for_edge_switch(dpid)
+    return self.policy_for_core_switch(dpid, ints_to_macs(self.nib.all_learned_macs()))
+
+  # A host coming or going changes the policy on its own switch and every core switch
+  def host_changed(self, dpid):
+    if self.owns_policy(dpid):
+      self.partitions.mark_dirty(dpid)
+    if self.shard == CORE_SHARD:
+      for core_dpid in self.nib.core_switch_dpids():
+        self.partitions.mark_dirty(core_dpid)
+
+  # Edge switches are pushed at once, since the hosts behind them are waiting.  Core
+  # switches wait for schedule_update, which gathers their changes.
+  def update_policy(self):
+    pushed = self.push_dirty(self.nib.edge_switches)
+    self.schedule_update()
+    return pushed
+
+  # Changes from other workers come in one by one.  Pushing after each would rebuild the
+  # core switches for every host, so we wait a little and push them together.
+  def schedule_update(self):
+    if not self.push_pending and self.partitions.is_dirty():
+      self.push_pending = True
+      IOLoop.instance().call_later(self.push_interval, self.push_gathered)
+
+  def push_gathered(self):
+    self.push_pending = False
+    self.push_dirty()
+    # Everything built since the last sweep has been pushed, core switches included
+    self.policies.sweep()
+
+  # Pushes the dirty switches in dpids, or all of them
+  def push_dirty(self, dpids=None):
+    if self.nib.switch_not_yet_connected():
+      return {}
+    return self.partitions.push_all(
+      [ dpid for dpid in list(self.partitions.dirty) if dpids == None or dpid in dpids ]
+    )
+
+  def learn_source(self, pkt):
+    if not MultiswitchApp3.learn_source(self, pkt):
+      return False
+    # The NIB keeps the first place it saw a MAC, so share that rather than this packet's
+    (dpid, port_id) = self.nib.location_of(pkt.ethSrcInt)
+    self.host_locations.learn(pkt.ethSrcInt, dpid, port_id)
+    self.host_changed(dpid)
+    return True
+
+  def host_learned(self, mac, dpid, port_id, extra):
+    location = self.nib.location_of(mac)
+    if location == (dpid, port_id):
+      return
+    if location != None:
+      self.host_unlearned(mac)
+    self.nib.learn(mac, dpid, port_id)
+    self.host_changed(dpid)
+    self.schedule_update()
+
+  def host_unlearned(self, mac):
+    location = self.nib.location_of(mac)
+    if location == None:
+      return
+    self.nib.unlearn(mac)
+    self.host_changed(location[0])
+    self.schedule_update()
+
+  def port_down(self, dpid, port_id):
+    self.unlearn_port(dpid, port_id)
+    self.nib.delete_port(dpid, port_id)
+    self.publish_link(dpid, port_id, False)
+    self.update_policy()
+
+  def port_up(self, dpid, port_id):
+    # Just to be safe, in case we have old MACs mapped to this port
+    self.unlearn_port(dpid, port_id)
+    self.nib.add_port(dpid, port_id)
+    self.publish_link(dpid, port_id, True)
+    self.update_policy()
+
+  # Every worker, this one included, hears about it here, in the same order
+  def link_changed(self, dpid, port_id, up):
+    # A core switch's port events go to the worker owning it, but shard 0 floods for it
+    if self.owns_policy(dpid) and not self.owns(dpid):
+      if up:
+        self.nib.add_port(dpid, port_id)
+      else:
+        self.nib.delete_port(dpid, port_id)
+      self.partitions.mark_dirty(dpid)
+    changed = self.nib.link_up(dpid, port_id) if up else self.nib.link_down(dpid, port_id)
+    for sw in changed:
+      if self.owns_policy(sw):
+        self.partitions.mark_dirty(sw)
+    self.schedule_update()
+
+  def unlearn_port(self, dpid, port_id):
+    macs = self.nib.unlearn_port_on_switch(dpid, port_id)
+    for mac in macs:
+      self.host_locations.unlearn(mac)
+    if macs != []:
+      self.host_changed(dpid)
+    # Flooding changes with the ports, even if no hosts were behind this one
+    if self.owns_policy(dpid):
+      self.partitions.mark_dirty(dpid)
+
+if __name__ == '__main__':
+  logging.basicConfig(\
+    stream = sys.stderr, \
+    format='%(asctime)s [%(levelname)s] %(message)s', level=logging.INFO \
+  )
+  run_sharded(ShardedMultiswitchApp3, int(sys.argv[1]) if len(sys.argv) > 1 else 4)
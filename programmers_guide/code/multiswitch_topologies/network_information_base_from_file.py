@@ -1,52 +1,123 @@
 import sys
-import pygraphviz as pgv
-import networkx as nx
 
-class NetworkInformationBaseFromFile(object):
-
-  # hosts is a dictionary of MAC addresses to (dpid, port) tuples
-  #  { "11:11:11:11:11:11": (1234867, 1) ...}
-  hosts = {}
-
-  # dictionary of live ports on each switch
-  # { 18237640987: [1,2], ...}
-  ports = {}
-
-  core_switches = set()
-  edge_switches = set()
-
-  # Uplink port from each edge switch to the nearest core switch
-  uplink_port = {}
-
-  # For each switch, returns a dictionary of destination switches to ports.  
-  # So in the following, a packet in 18237640987 can get to switch 9287354
-  # by going out port 7.  This effectively turns the undirected edges of the
-  # topo graph into bidirectional edges.  Later we'll add learned MAC addresses
-  # to this dictionary as well.
-  #  { 18237640987: { 9287354: 7, 09843509: 5, ... }}
-  port_mappings = {}
-
-  # On core switches, we pretend that edges not living on the spanning 
-  # tree are disabled - we don't send or flood traffic to it, and we drop
-  # all incoming traffic from it.  So this structure keeps track of all
-  # ports that are enabled - each enabled_ports[sw] is a subset of ports[sw]
-  enabled_ports = {}
+sys.path.append("../common")
+from indexed_nib import IndexedNIB
+from flood_cache import FloodCache
+from topology_cache import compiled_topology
+from addresses import int_to_mac
+
+class NetworkInformationBaseFromFile(IndexedNIB):
+
+  # IndexedNIB remembers which switch and port each MAC is on.  The way to a MAC from any
+  # other switch is the way to its switch, which comes from next_hops_to below, so
+  # learning a host stores nothing more.
+
+  def __init__(self, logger, topology_file="multiswitch_topo.dot", use_path_engine=False,
+    use_ecmp=False):
+    IndexedNIB.__init__(self, logger)
+
+    # dictionary of live ports on each switch
+    # { 18237640987: [1,2], ...}
+    self.ports = {}
+
+    self.core_switches = set()
+    self.edge_switches = set()
+
+    # Uplink port from each edge switch to the nearest core switch
+    self.uplink_port = {}
+
+    # For each switch, returns a dictionary of destination switches to ports.  
+    # So in the following, a packet in 18237640987 can get to switch 9287354
+    # by going out port 7.  This effectively turns the undirected edges of the
+    # topo graph into bidirectional edges.
+    #  { 18237640987: { 9287354: 7, 09843509: 5, ... }}
+    self.port_mappings = {}
+
+    # On core switches, we pretend that edges not living on the spanning 
+    # tree are disabled - we don't send or flood traffic to it, and we drop
+    # all incoming traffic from it.  So this structure keeps track of all
+    # ports that are enabled - each enabled_ports[sw] is a subset of ports[sw]
+    self.enabled_ports = {}
+
+    # SetPort actions for flooding, keyed by switch and ingress port
+    self.flood_cache = FloodCache(self.all_enabled_ports_except)
+
+    # Links on the spanning tree, as (dpid, dpid) pairs, and each switch's neighbors on it
+    #  { 18237640987: set([9287354, ...]), ... }
+    self.tree_edges = []
+    self.tree = {}
+
+    # Links between switches that are down, both ways round.  A spanning tree link going
+    # down is swapped for one that's up, if there is one (see link_down).
+    #  set([ (18237640987, 9287354), (9287354, 18237640987), ... ])
+    self.down_links = set()
+
+    # For each switch, the port on every other switch that leads towards it along the
+    # spanning tree.  So in the following, a packet in 18237640987 headed for a host on
+    # 9287354 goes out port 7.  Computed once per topology, and shared by all the hosts
+    # on a switch.
+    #  { 9287354: { 18237640987: 7, ... }}
+    self.next_hops_to = {}
+
+    # For each core switch, the learned MACs it sends out of each port.  Core switches get
+    # one NetKAT rule per port, though still a flow entry per host, and learning or
+    # forgetting a host just adds it to or takes it from one set per core switch.
+    #  { 1: { 3: set([0x111111111111, ...]), ... }, ... }
+    self.macs_by_next_hop = {}
+
+    # With use_ecmp, core switches send traffic over every shortest path, not just the
+    # spanning tree, which still carries flooding.  For each switch with hosts, the ports
+    # on every other switch that lead towards it along a shortest path.  macs_by_next_hop
+    # then files each host under the one of these ports that path_choice picks for it.
+    #  { 9287354: { 18237640987: (7, 8), ... }}
+    self.use_ecmp = use_ecmp
+    self.ecmp_next_hops_to = {}
+
+    # With use_path_engine, a PathEngine (see path_engine.py) reads the topology and
+    # answers next hops instead, for fabrics with thousands of switches.  It needs NumPy.
+    # With no topology_file, the NIB starts out empty, and the links between switches
+    # come from set_port_mappings, say from topology_discovery.py.
+    self.path_engine = None
+    self.use_path_engine = use_path_engine
+    if use_path_engine and topology_file != None:
+      self.load_topology_into_engine(topology_file)
+    elif topology_file != None:
+      self.load_topology(topology_file)
+    if use_ecmp:
+      self.recompute_ecmp()
 
   def add_port_mapping(self, from_node, to_node, on_port):
     if from_node not in self.port_mappings:
       self.port_mappings[from_node] = {}
     self.port_mappings[from_node][to_node] = on_port
 
-  def __init__(self, logger, topology_file="multiswitch_topo.dot"):
-    self.logger = logger
-
+  # Everything worked out from the topology file is cached, and only worked out again
+  # when the file changes, so restarts skip pygraphviz and networkx (see
+  # topology_cache.py)
+  def load_topology(self, topology_file):
+    (self.port_mappings, edge_switches, core_switches, self.uplink_port,
+      self.enabled_ports, self.tree_edges, self.next_hops_to) = \
+      compiled_topology(topology_file, "multiswitch", self.compile_topology, self.logger)
+    self.edge_switches = set(edge_switches)
+    self.core_switches = set(core_switches)
+    self.tree = self.tree_from_edges()
+
+  def tree_from_edges(self):
+    tree = dict( (sw, set()) for sw in self.port_mappings )
+    for (from_dpid, to_dpid) in self.tree_edges:
+      tree[from_dpid].add(to_dpid)
+      tree[to_dpid].add(from_dpid)
+    return tree
+
+  def compile_topology(self, topology_file):
+    import pygraphviz as pgv
+    import networkx as nx
     self.logger.info("---> Reading Topology from "+topology_file)
-    self.agraph = pgv.AGraph(topology_file)
+    agraph = pgv.AGraph(topology_file)
 
     # It's faster to denormalize this now
     self.logger.info("---> Remembering internal ports")
-    switches = [ int(sw) for sw in self.agraph.nodes()]
-    for e in self.agraph.edges():
+    for e in agraph.edges():
       # Parse the source and destination switches
       source_dpid = int(e[0])
       dest_dpid = int(e[1])
@@ -59,8 +130,24 @@ class NetworkInformationBaseFromFile(object):
       # Add a mapping for the reverse direction dest->source
       self.add_port_mapping(dest_dpid, source_dpid, dest_port)
 
-    # Calculate the core/edge attribute.  Edge switches have only one 
-    # connection to another switch
+    self.classify_switches()
+
+    self.logger.info("---> Calculating spanning tree")
+    nxgraph = nx.from_agraph(agraph)
+    nx_topo = nx.minimum_spanning_tree(nxgraph)
+    self.tree_edges = [ (int(from_dpid), int(to_dpid)) for (from_dpid, to_dpid) in nx_topo.edges() ]
+    self.enable_tree_ports()
+
+    self.compute_next_hops()
+    return (self.port_mappings, list(self.edge_switches), list(self.core_switches),
+      self.uplink_port, self.enabled_ports, self.tree_edges, self.next_hops_to)
+
+  # Calculate the core/edge attribute.  Edge switches have only one 
+  # connection to another switch
+  def classify_switches(self):
+    self.edge_switches = set()
+    self.core_switches = set()
+    self.uplink_port = {}
     for sw in self.port_mappings:
       if len(self.port_mappings[sw]) == 1:
         self.edge_switches.add(sw)
@@ -70,27 +157,358 @@ class NetworkInformationBaseFromFile(object):
       else:
         self.core_switches.add(sw)
 
-    self.logger.info("---> Calculating spanning tree")
-    nxgraph = nx.from_agraph(self.agraph)
-    self.nx_topo = nx.minimum_spanning_tree(nxgraph)    
-    nx.write_edgelist(self.nx_topo, sys.stdout)
+  def enable_tree_ports(self):
+    for (from_dpid, to_dpid) in self.tree_edges:
+      self.logger.debug("Spanning tree link "+str(from_dpid)+" -- "+str(to_dpid))
 
     self.logger.info("---> Enabling only those ports on the spanning tree")
-    for (from_dpid, to_dpid) in self.nx_topo.edges():
+    self.enabled_ports = {}
+    for (from_dpid, to_dpid) in self.tree_edges:
       # We look up the port mapping from the port-mapping dictionary instead of 
       # from the graph attributes because NetworkX flips the src and dest node
       # arbitrarily in an undirected graph
-      from_dpid_int = int(from_dpid)
-      to_dpid_int = int(to_dpid)
-      from_port = self.port_mappings[from_dpid_int][to_dpid_int]
-      if from_dpid_int not in self.enabled_ports:
-        self.enabled_ports[from_dpid_int] = []
-      self.enabled_ports[from_dpid_int].append(from_port)
-
-      to_port = self.port_mappings[to_dpid_int][from_dpid_int]
-      if to_dpid_int not in self.enabled_ports:
-        self.enabled_ports[to_dpid_int] = []
-      self.enabled_ports[to_dpid_int].append(to_port)
+      from_port = self.port_mappings[from_dpid][to_dpid]
+      if from_dpid not in self.enabled_ports:
+        self.enabled_ports[from_dpid] = []
+      self.enabled_ports[from_dpid].append(from_port)
+
+      to_port = self.port_mappings[to_dpid][from_dpid]
+      if to_dpid not in self.enabled_ports:
+        self.enabled_ports[to_dpid] = []
+      self.enabled_ports[to_dpid].append(to_port)
+
+  def load_topology_into_engine(self, topology_file):
+    import path_engine
+    self.logger.info("---> Reading Topology from "+topology_file+" into a path engine")
+    self.use_engine(path_engine.from_dot(topology_file))
+
+  def use_engine(self, engine):
+    self.path_engine = engine
+    self.port_mappings = self.path_engine.port_mappings()
+    self.edge_switches = set(self.path_engine.edge_switches())
+    self.core_switches = set(self.path_engine.core_switches())
+    self.uplink_port = self.path_engine.uplink_ports()
+    self.enabled_ports = self.path_engine.enabled_ports()
+
+  # Takes the links between switches as they are now - { dpid: { neighbor dpid: port to
+  # it, ... }, ... }, both ways round - and works everything out again, as for a new
+  # topology file.  Links that were down are forgotten, since these are all up.  Hosts
+  # learned on ports that turn out to lead to other switches are unlearned.
+  def set_port_mappings(self, port_mappings):
+    self.logger.info("---> Taking in "+str(len(port_mappings))+" switches with links")
+    self.down_links = set()
+    if self.use_path_engine:
+      import path_engine
+      edges = [ (sw, neighbor, port, port_mappings[neighbor][sw])
+        for (sw, neighbors) in port_mappings.items() for (neighbor, port) in neighbors.items()
+        if sw < neighbor ]
+      self.use_engine(path_engine.PathEngine(port_mappings.keys(), edges))
+    else:
+      self.port_mappings = dict( (sw, dict(neighbors)) for (sw, neighbors) in port_mappings.items() )
+      self.classify_switches()
+      self.tree_edges = self.spanning_tree()
+      self.enable_tree_ports()
+    self.flood_cache.invalidate()
+    self.compute_next_hops()
+    for (sw, neighbors) in self.port_mappings.items():
+      for port_id in neighbors.values():
+        self.unlearn_port_on_switch(sw, port_id)
+
+  # Any spanning tree will do, since every link costs the same.  This walks outwards from
+  # the lowest dpid in each connected part, so it needs neither pygraphviz nor networkx.
+  def spanning_tree(self):
+    tree_edges = []
+    reached = set()
+    for root in sorted(self.port_mappings):
+      if root in reached:
+        continue
+      reached.add(root)
+      frontier = [ root ]
+      while frontier != []:
+        further = []
+        for sw in frontier:
+          for neighbor in sorted(self.port_mappings[sw]):
+            if neighbor not in reached:
+              reached.add(neighbor)
+              tree_edges.append( (sw, neighbor) )
+              further.append(neighbor)
+        frontier = further
+    return tree_edges
+
+  # Call this again whenever the spanning tree changes
+  def compute_next_hops(self):
+    self.logger.info("---> Calculating next hops between switches")
+    if self.path_engine != None:
+      self.path_engine.compute()
+      self.compute_ecmp_next_hops()
+      self.group_by_next_hop()
+      return
+    tree = self.tree = self.tree_from_edges()
+
+    # Walk the tree outwards from each switch.  Each switch we reach gets there through
+    # the one before it, which is one hop closer.
+    self.next_hops_to = {}
+    for dest_dpid in tree:
+      next_hops = {}
+      reached = set([ dest_dpid ])
+      frontier = [ dest_dpid ]
+      while frontier != []:
+        further = []
+        for closer in frontier:
+          for sw in tree[closer]:
+            if sw not in reached:
+              reached.add(sw)
+              next_hops[sw] = self.port_mappings[sw][closer]
+              further.append(sw)
+        frontier = further
+      self.next_hops_to[dest_dpid] = next_hops
+    self.compute_ecmp_next_hops()
+    self.group_by_next_hop()
+
+  # Like the walk above, but over every link that's up, and a switch keeps the ports
+  # towards all its neighbors one hop closer.  Hosts are only learned on edge switches,
+  # so those are the only destinations.
+  def compute_ecmp_next_hops(self):
+    if not self.use_ecmp:
+      return
+    self.logger.info("---> Calculating equal cost next hops")
+    self.ecmp_next_hops_to = {}
+    for dest_dpid in self.edge_switches:
+      distance = { dest_dpid: 0 }
+      next_hops = {}
+      frontier = [ dest_dpid ]
+      while frontier != []:
+        further = []
+        for closer in frontier:
+          for sw in self.port_mappings[closer]:
+            if (sw, closer) in self.down_links:
+              continue
+            if sw not in distance:
+              distance[sw] = distance[closer] + 1
+              next_hops[sw] = []
+              further.append(sw)
+            if distance[sw] == distance[closer] + 1:
+              next_hops[sw].append(self.port_mappings[sw][closer])
+        frontier = further
+      self.ecmp_next_hops_to[dest_dpid] = dict(
+        (sw, tuple(sorted(ports))) for (sw, ports) in next_hops.items()
+      )
+
+  # Regroups every learned host, since their next hops may have changed
+  def group_by_next_hop(self):
+    self.macs_by_next_hop = dict( (core_dpid, {}) for core_dpid in self.core_switches )
+    for (m, (dpid, port_id)) in self.location.iteritems():
+      self.add_to_next_hop_groups(m, dpid, port_id)
+
+  def add_to_next_hop_groups(self, m, dpid, port_id):
+    for core_dpid in self.core_switches:
+      port = self.next_hop_key(core_dpid, m, dpid, port_id)
+      if port != None:
+        self.macs_by_next_hop.setdefault(core_dpid, {}).setdefault(port, set()).add(m)
+
+  # What macs_by_next_hop files a host under: the next hop port, or with use_ecmp, the
+  # one of the equal cost ports that path_choice picks for it
+  def next_hop_key(self, core_dpid, m, dpid, port_id):
+    if self.use_ecmp and core_dpid != dpid:
+      ports = self.ecmp_next_hops_to.get(dpid, {}).get(core_dpid)
+      return ports[self.path_choice(m, core_dpid, len(ports))] if ports != None else None
+    return self.next_hop_port_to(core_dpid, dpid, port_id)
+
+  # Which of n equal cost ports core_dpid sends traffic for MAC m out of.  Choosing by
+  # destination keeps a core switch at one flow entry per host, where choosing by source
+  # too would need one per pair of hosts, and a NetKAT test can't mask a MAC's low bits
+  # to choose by a hash of it instead.  Every switch mixes in its own dpid, or switches
+  # one hop apart would split traffic the same way, and the second would send it all out
+  # of one port.  This has to come out the same in every process, so it doesn't use hash().
+  def path_choice(self, m, core_dpid, n):
+    h = (m * 0x9e3779b1 + core_dpid * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 16
+    return (h * 0x7feb352d & 0xffffffff) % n
+
+  def add_host(self, mac, dpid, port_id, entry=None):
+    IndexedNIB.add_host(self, mac, dpid, port_id, entry)
+    self.add_to_next_hop_groups(mac, dpid, port_id)
+
+  def remove_host(self, mac):
+    (dpid, port_id) = self.location_of(mac)
+    IndexedNIB.remove_host(self, mac)
+    for core_dpid in self.core_switches:
+      port = self.next_hop_key(core_dpid, mac, dpid, port_id)
+      if port != None:
+        self.discard_from_index(self.macs_by_next_hop[core_dpid], port, mac)
+
+  # [ (port, [mac, ...]), ... ] for every port core_dpid sends learned MACs out of
+  def next_hop_groups(self, core_dpid):
+    return [
+      (port, sorted(macs))
+      for (port, macs) in sorted(self.macs_by_next_hop.get(core_dpid, {}).items())
+    ]
+
+  def neighbor_on_port(self, dpid, port_id):
+    for (neighbor, port) in self.port_mappings.get(dpid, {}).items():
+      if port == port_id:
+        return neighbor
+    return None
+
+  # A port went down.  If it's a link on the spanning tree, the tree falls into two
+  # halves, and we join them again with another link between them that's up, if there
+  # is one.  Only next hops from one half to the other change, and only the switches
+  # at either end of the two links and the core switches whose next hops changed need
+  # new policies.  Returns those switches.  With use_ecmp, every link carries traffic,
+  # so equal cost next hops are worked out again whichever link it is.
+  def link_down(self, dpid, port_id):
+    neighbor = self.neighbor_on_port(dpid, port_id)
+    if neighbor == None or (dpid, neighbor) in self.down_links:
+      return set()
+    self.down_links.update([ (dpid, neighbor), (neighbor, dpid) ])
+    if self.path_engine != None:
+      self.path_engine.set_link_state(dpid, neighbor, False)
+      return self.recompute_in_engine()
+    changed = self.cut_tree_link(dpid, neighbor) if neighbor in self.tree[dpid] else set()
+    return self.recompute_ecmp() if self.use_ecmp else changed
+
+  def cut_tree_link(self, dpid, neighbor):
+    self.logger.info("Spanning tree link "+str(dpid)+" -- "+str(neighbor)+" is down")
+    self.remove_tree_link(dpid, neighbor)
+    side = self.smaller_half(dpid, neighbor)
+    # Next hops aren't repaired yet, so any switch in side still has them to the whole
+    # of the tree it was on, and the rest of that is the other half
+    inside = next(iter(side))
+    other_side = set( sw for sw in self.next_hops_to[inside] if sw not in side )
+    replacement = self.replacement_link(side)
+    if replacement == None:
+      self.logger.warning("No link left to join "+str(len(side))+" switches to the rest")
+    else:
+      self.logger.info("Replacing it with "+str(replacement[0])+" -- "+str(replacement[1]))
+    changed = self.rejoin(side, other_side, replacement) | set([ dpid, neighbor ])
+    if replacement != None:
+      changed.update(replacement)
+    return changed
+
+  # A port came back up.  If it joins two halves of the tree that no other link could,
+  # it goes on the tree.  Otherwise it's a spare for the next tree link that goes down.
+  def link_up(self, dpid, port_id):
+    neighbor = self.neighbor_on_port(dpid, port_id)
+    if neighbor == None or (dpid, neighbor) not in self.down_links:
+      return set()
+    self.down_links.difference_update([ (dpid, neighbor), (neighbor, dpid) ])
+    if self.path_engine != None:
+      self.path_engine.set_link_state(dpid, neighbor, True)
+      return self.recompute_in_engine()
+    changed = set()
+    if neighbor not in self.next_hops_to.get(dpid, {}):
+      self.logger.info("Link "+str(dpid)+" -- "+str(neighbor)+" joins the spanning tree")
+      side = set(self.next_hops_to[dpid]) | set([ dpid ])
+      other_side = set(self.next_hops_to[neighbor]) | set([ neighbor ])
+      changed = self.rejoin(side, other_side, (dpid, neighbor)) | set([ dpid, neighbor ])
+    return self.recompute_ecmp() if self.use_ecmp else changed
+
+  # The PathEngine just starts over, which takes milliseconds even for large fabrics
+  def recompute_in_engine(self):
+    self.compute_next_hops()
+    self.enabled_ports = self.path_engine.enabled_ports()
+    self.flood_cache.invalidate()
+    return set(self.port_mappings)
+
+  def recompute_ecmp(self):
+    self.compute_ecmp_next_hops()
+    self.group_by_next_hop()
+    return set(self.port_mappings)
+
+  def remove_tree_link(self, from_dpid, to_dpid):
+    self.tree[from_dpid].discard(to_dpid)
+    self.tree[to_dpid].discard(from_dpid)
+    self.tree_edges = [
+      e for e in self.tree_edges if e != (from_dpid, to_dpid) and e != (to_dpid, from_dpid)
+    ]
+    self.enabled_ports[from_dpid].remove(self.port_mappings[from_dpid][to_dpid])
+    self.enabled_ports[to_dpid].remove(self.port_mappings[to_dpid][from_dpid])
+    self.flood_cache.invalidate()
+
+  def add_tree_link(self, from_dpid, to_dpid):
+    self.tree[from_dpid].add(to_dpid)
+    self.tree[to_dpid].add(from_dpid)
+    self.tree_edges.append( (from_dpid, to_dpid) )
+    self.enabled_ports.setdefault(from_dpid, []).append(self.port_mappings[from_dpid][to_dpid])
+    self.enabled_ports.setdefault(to_dpid, []).append(self.port_mappings[to_dpid][from_dpid])
+    self.flood_cache.invalidate()
+
+  # The switches on whichever side of a cut tree link is smaller.  We walk both sides a
+  # switch at a time, and stop as soon as one runs out, so this costs the size of the
+  # smaller side, not the whole tree.  Most tree links are near the leaves, so that's
+  # usually a handful of switches.
+  def smaller_half(self, dpid, neighbor):
+    frontiers = [ [ dpid ], [ neighbor ] ]
+    reached = [ set([ dpid ]), set([ neighbor ]) ]
+    while True:
+      for i in (0, 1):
+        if frontiers[i] == []:
+          return reached[i]
+        sw = frontiers[i].pop()
+        for n in self.tree[sw]:
+          if n not in reached[i]:
+            reached[i].add(n)
+            frontiers[i].append(n)
+
+  # A link that's up from a switch in side to one outside it, as (inside, outside), or None
+  def replacement_link(self, side):
+    best = None
+    for sw in side:
+      for neighbor in self.port_mappings[sw]:
+        if neighbor not in side and (sw, neighbor) not in self.down_links:
+          if best == None or (sw, neighbor) < best:
+            best = (sw, neighbor)
+    return best
+
+  # Redoes next hops between two halves of the tree, joined by link - (a switch in side,
+  # a switch in other_side) - or left apart if it's None.  Returns the core switches
+  # that now send some learned host out of a different port.  With use_ecmp, groups
+  # follow ecmp_next_hops_to instead, and recompute_ecmp regroups them.
+  def rejoin(self, side, other_side, link):
+    before = self.next_hops_across(side, other_side) if not self.use_ecmp else {}
+    if link == None:
+      for (near, far) in [ (side, other_side), (other_side, side) ]:
+        for dest_dpid in near:
+          next_hops = self.next_hops_to[dest_dpid]
+          for sw in far:
+            next_hops.pop(sw, None)
+    else:
+      (x, y) = link
+      self.add_tree_link(x, y)
+      # From the far half, the way to anything in the near half is the way to the far
+      # end of the link, then across it
+      for (near, far, near_end, far_end) in [ (side, other_side, x, y), (other_side, side, y, x) ]:
+        across = self.port_mappings[far_end][near_end]
+        to_far_end = self.next_hops_to[far_end]
+        for dest_dpid in near:
+          next_hops = self.next_hops_to[dest_dpid]
+          for sw in far:
+            next_hops[sw] = across if sw == far_end else to_far_end[sw]
+
+    changed = set()
+    for ((core_dpid, dpid), old_port) in before.items():
+      new_port = self.next_hops_to[dpid].get(core_dpid)
+      if new_port == old_port:
+        continue
+      changed.add(core_dpid)
+      groups = self.macs_by_next_hop.setdefault(core_dpid, {})
+      for m in self.macs_on_switch[dpid]:
+        if old_port != None:
+          self.discard_from_index(groups, old_port, m)
+        if new_port != None:
+          groups.setdefault(new_port, set()).add(m)
+    return changed
+
+  # { (core dpid, dpid with learned hosts): next hop port }, across two halves of the tree
+  def next_hops_across(self, side, other_side):
+    next_hops = {}
+    for (near, far) in [ (side, other_side), (other_side, side) ]:
+      cores = [ sw for sw in far if sw in self.core_switches ]
+      for dpid in near:
+        if dpid in self.macs_on_switch:
+          for core_dpid in cores:
+            next_hops[(core_dpid, dpid)] = self.next_hops_to[dpid].get(core_dpid)
+    return next_hops
 
   def core_switch_dpids(self):
     return list(self.core_switches)
@@ -102,7 +520,16 @@ class NetworkInformationBaseFromFile(object):
     return self.port_for_dpid[dpid]
 
   def next_hop_port(self, mac, core_dpid):
-    return self.hosts[mac][2][core_dpid]
+    (dpid, port_id) = self.location_of(mac)
+    return self.next_hop_key(core_dpid, mac, dpid, port_id)
+
+  # The port on core_dpid towards a host on (dpid, port_id), or None if there's no way
+  def next_hop_port_to(self, core_dpid, dpid, port_id):
+    if core_dpid == dpid:
+      return port_id
+    if self.path_engine != None:
+      return self.path_engine.next_hop(core_dpid, dpid)
+    return self.next_hops_to.get(dpid, {}).get(core_dpid)
 
   def uplink_port_for_dpid(self, dpid):
     return self.uplink_port[dpid]
@@ -115,86 +542,34 @@ class NetworkInformationBaseFromFile(object):
 
   def learn(self, mac, dpid, port_id):
     # Do not learn a mac twice
-    if mac in self.hosts:
+    if self.knows(mac):
       return
 
-    # Compute next hop table: from each switch, which port gets you closer to destination?
-    self.nx_topo.add_node(mac)
-    dpid_str = str(dpid)
-    self.nx_topo.add_edge(dpid_str, mac)
-    # Note we don't need a mapping from mac to switch - we never see this hop
-    self.port_mappings[dpid][mac] = port_id
-
-    # Return shortest paths from each source in the graph to mac in the form 
-    # [ src: to1, from2: to2 ..., to[n]: dest ]
-    spaths = nx.shortest_path(self.nx_topo, None, mac, None)
-    next_hop_table = { }
-    for from_dpid in self.switches():
-      # If we're on the switch the Mac is connected to, just add the next_hop
-      if from_dpid == dpid:
-        next_hop_table[from_dpid] = port_id
-      else:
-        sw = str(from_dpid)
-        # If there are no paths from sw, just skip it
-        if sw in spaths:
-          next_sw = spaths[sw][1]  # element 0 is the start, element 1 is the next hop
-          # Convert this back to a dpid
-          next_dpid = int(next_sw)
-          # The next hop switch along the shortest path from sw to mac.
-          next_hop_table[from_dpid] = self.port_mappings[from_dpid][next_dpid]
-
-    cd = (dpid, port_id, next_hop_table)
-    self.hosts[mac] = cd
-    self.logger.info("Learning: "+mac+" attached to "+str(cd))
-
-  def port_for_mac_on_switch(self, mac, dpid):
-    return self.hosts[mac][1] \
-      if mac in self.hosts and self.hosts[mac][0] == dpid else None
-
-  def mac_for_port_on_switch(self, dpid, port_id):
-    for mac in self.hosts:
-      if self.hosts[mac][0] == dpid and self.hosts[mac][1] == port_id:
-        return mac
-    return None
-
-  def unlearn(self, mac):
-    if mac in self.hosts:
-      del self.hosts[mac]
-
-  def all_mac_port_pairs_on_switch(self, dpid):
-    return [ 
-      (mac, self.hosts[mac][1]) 
-      for mac in self.hosts.keys() if self.hosts[mac][0] == dpid 
-    ]
-
-  def all_learned_macs_on_switch(self, dpid):
-    return [
-      mac for mac in self.hosts.keys() if self.hosts[mac][0] == dpid 
-    ]
-
-  def all_learned_macs(self):
-    return self.hosts.keys()
-
-  def all_mac_dpid_pairs(self):
-    return [ 
-      (mac, self.hosts[mac][0]) for mac in self.hosts.keys()
-    ]
+    # Unlearning forgets everything this adds
+    self.add_host(mac, dpid, port_id)
+    self.logger.info("Learning: "+int_to_mac(mac)+" attached to ( "+str(dpid)+" , "+str(port_id)+" )")
 
   def set_all_ports(self, switch_list):
     self.ports = switch_list
+    self.flood_cache.invalidate()
 
   def add_port(self, dpid, port_id):
     if port_id not in self.ports[dpid]:
-      self.ports.append(port_id)
+      self.ports[dpid].append(port_id)
+      self.flood_cache.invalidate()
 
   def delete_port(self, dpid, port_id):
-    if port_id in self.ports:
-      self.ports.remove(port_id)
+    if port_id in self.ports[dpid]:
+      self.ports[dpid].remove(port_id)
+      self.flood_cache.invalidate()
 
   def all_enabled_ports_except(self, dpid, in_port_id):
     ports_to_flood = self.enabled_ports[dpid] if dpid in self.core_switches else self.ports[dpid]
     return [p for p in ports_to_flood if p != in_port_id]
 
+  def flood_actions(self, dpid, in_port_id):
+    return self.flood_cache.get(dpid, in_port_id)
+
   def switch_not_yet_connected(self):
     return self.ports == {}
 
@@ -0,0 +1,219 @@
+# path_engine
+# Spanning tree and switch-to-switch next hops computed with NumPy, for fabrics with
+# thousands of switches.
+#
+# NetworkInformationBaseFromFile normally reads the topology with pygraphviz, finds the
+# spanning tree with networkx and keeps next hops in a dictionary per switch.  That's
+# fine for a dozen switches, but the dictionaries alone grow as switches squared.  Given
+# a PathEngine, the NIB hands all of that over to it instead.
+#
+# read_dot_topology() reads the switches and the "a -- b [ src_port = 1, dport = 4 ]"
+# edges of a multiswitch_topo.dot-style file directly, without pygraphviz.  PathEngine
+# keeps the links as integer arrays: switch i's neighbors are neighbors[offsets[i]:
+# offsets[i + 1]], with the ports that reach them in neighbor_ports.  The spanning tree
+# is a breadth-first search from the best connected switch, each step handling the
+# whole frontier at once.
+#
+# Next hops come from numbering the switches in depth-first order along the tree, so
+# every subtree is a run of consecutive numbers.  From switch u, the way to anything in
+# the subtree of one of its children is the port to that child, and the way to anything
+# else is the port to its own parent.  So next_hop_matrix[u] is the port to the parent,
+# with one slice per child overwritten.  Matrix entries are ports, 0 meaning no path, in
+# the smallest integer type that fits: 2 bytes a pair, or 200MB for 10,000 switches.
+
+import re
+import numpy as np
+
+COMMENT = re.compile(r"/\*.*?\*/|//[^\n]*", re.S)
+EDGE = re.compile(r'^\s*"?(\d+)"?\s*--\s*"?(\d+)"?\s*\[([^\]]*)\]')
+NODE = re.compile(r'^\s*"?(\d+)"?\s*(\[[^\]]*\])?\s*;')
+ATTR = re.compile(r'(\w+)\s*=\s*"?(\w+)"?')
+
+# Returns ([dpid, ...], [(dpid, dpid, src_port, dport), ...])
+def read_dot_topology(topology_file):
+  switches = []
+  edges = []
+  with open(topology_file) as f:
+    text = COMMENT.sub("", f.read())
+  for line in text.split("\n"):
+    m = EDGE.match(line)
+    if m:
+      attrs = dict(ATTR.findall(m.group(3)))
+      edges.append( (int(m.group(1)), int(m.group(2)), int(attrs["src_port"]), int(attrs["dport"])) )
+      continue
+    m = NODE.match(line)
+    if m:
+      switches.append(int(m.group(1)))
+  return (switches, edges)
+
+class PathEngine(object):
+
+  def __init__(self, switches, edges):
+    dpids = sorted(set(switches) | set(e[0] for e in edges) | set(e[1] for e in edges))
+    self.dpids = np.array(dpids, dtype=np.int64)
+    self.index = dict( (dpid, i) for (i, dpid) in enumerate(dpids) )
+    n = len(dpids)
+
+    # Each edge both ways, as (from switch, to switch, port on from switch)
+    index = self.index
+    src = np.array([ index[e[0]] for e in edges ], dtype=np.int64)
+    dst = np.array([ index[e[1]] for e in edges ], dtype=np.int64)
+    heads = np.concatenate([ src, dst ])
+    tails = np.concatenate([ dst, src ])
+    ports = np.array([ e[2] for e in edges ] + [ e[3] for e in edges ], dtype=np.int64)
+
+    # Sort by (from, to), keeping the last of any repeated edge, as a strict graph does
+    keys = heads * n + tails
+    order = np.lexsort((np.arange(len(keys)), keys))
+    keys = keys[order]
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    self.link_keys = keys[last]
+    self.neighbors = tails[order][last]
+    self.neighbor_ports = ports[order][last]
+    self.degree = np.bincount(heads[order][last], minlength=n)
+    self.offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(self.degree, out=self.offsets[1:])
+    # Links that are down are left out of the spanning tree
+    self.link_up = np.ones(len(self.neighbors), dtype=bool)
+
+    self.port_type = np.int16 if n == 0 or ports.size == 0 or ports.max() < 2 ** 15 else np.int32
+    self.compute()
+
+  # Port on switch i leading to switch j, for arrays of i and j
+  def ports_between(self, i, j):
+    slots = np.searchsorted(self.link_keys, i * len(self.dpids) + j)
+    return self.neighbor_ports[slots]
+
+  def set_link_state(self, from_dpid, to_dpid, up):
+    i = np.array([ self.index[from_dpid], self.index[to_dpid] ])
+    slots = np.searchsorted(self.link_keys, i * len(self.dpids) + i[::-1])
+    self.link_up[slots] = up
+
+  # Call this again whenever the links change
+  def compute(self):
+    self.compute_spanning_tree()
+    self.compute_next_hops()
+
+  def compute_spanning_tree(self):
+    n = len(self.dpids)
+    self.parent = np.full(n, -1, dtype=np.int64)
+    visited = np.zeros(n, dtype=bool)
+    # Switches in each level of each component's tree, roots first
+    self.levels = []
+    self.roots = []
+    # Best connected first, lowest dpid on ties
+    for root in np.lexsort((self.dpids, -self.degree)):
+      if visited[root]:
+        continue
+      self.roots.append(root)
+      visited[root] = True
+      frontier = np.array([ root ], dtype=np.int64)
+      depth = 0
+      while frontier.size > 0:
+        if depth < len(self.levels):
+          self.levels[depth] = np.concatenate([ self.levels[depth], frontier ])
+        else:
+          self.levels.append(frontier)
+        depth += 1
+        # Every link out of the frontier
+        counts = self.degree[frontier]
+        starts = np.repeat(self.offsets[frontier] - np.cumsum(counts) + counts, counts)
+        slots = starts + np.arange(counts.sum())
+        found = self.neighbors[slots]
+        via = np.repeat(frontier, counts)
+        new = ~visited[found] & self.link_up[slots]
+        # A switch reached from several frontier switches hangs off the first
+        (found, first) = np.unique(found[new], return_index=True)
+        self.parent[found] = via[new][first]
+        visited[found] = True
+        frontier = found
+    self.roots = np.array(self.roots, dtype=np.int64)
+
+    has_parent = self.parent >= 0
+    children = np.nonzero(has_parent)[0]
+    self.up_port = np.zeros(n, dtype=np.int64)
+    self.down_port = np.zeros(n, dtype=np.int64)
+    self.up_port[children] = self.ports_between(children, self.parent[children])
+    self.down_port[children] = self.ports_between(self.parent[children], children)
+
+  def compute_next_hops(self):
+    n = len(self.dpids)
+    # Subtree sizes, adding each level into the one above it
+    self.size = np.ones(n, dtype=np.int64)
+    for level in reversed(self.levels[1:]):
+      np.add.at(self.size, self.parent[level], self.size[level])
+
+    # Depth-first numbers.  Each component takes the next run of numbers, and the
+    # children of a switch split up the run after it, in the order they were found.
+    self.position = np.zeros(n, dtype=np.int64)
+    component_sizes = self.size[self.roots]
+    self.position[self.roots] = np.cumsum(component_sizes) - component_sizes
+    for level in self.levels[1:]:
+      level = level[np.argsort(self.parent[level], kind="mergesort")]
+      sizes = self.size[level]
+      before = np.cumsum(sizes) - sizes
+      parents = self.parent[level]
+      group_start = np.ones(len(level), dtype=bool)
+      group_start[1:] = parents[1:] != parents[:-1]
+      first_before = np.maximum.accumulate(np.where(group_start, before, 0))
+      self.position[level] = self.position[parents] + 1 + before - first_before
+
+    # Everything in the same component is up the tree, unless it's below a child
+    matrix = np.zeros((n, n), dtype=self.port_type)
+    for root in self.roots:
+      start = self.position[root]
+      end = start + self.size[root]
+      members = np.nonzero((self.position >= start) & (self.position < end))[0]
+      matrix[members, start:end] = self.up_port[members][:, np.newaxis]
+    for child in np.nonzero(self.parent >= 0)[0]:
+      start = self.position[child]
+      matrix[self.parent[child], start:start + self.size[child]] = self.down_port[child]
+    matrix[np.arange(n), self.position] = 0
+    self.next_hop_matrix = matrix
+
+  # The port on from_dpid that leads towards to_dpid, or None if there's no path
+  def next_hop(self, from_dpid, to_dpid):
+    port = self.next_hop_matrix[self.index[from_dpid], self.position[self.index[to_dpid]]]
+    return int(port) if port != 0 else None
+
+  # { dpid: { neighbor dpid: port, ... }, ... }, as NetworkInformationBaseFromFile keeps it
+  def port_mappings(self):
+    mappings = dict( (int(dpid), {}) for dpid in self.dpids )
+    for i in range(len(self.dpids)):
+      start = self.offsets[i]
+      end = self.offsets[i + 1]
+      mappings[int(self.dpids[i])] = dict(zip(
+        self.dpids[self.neighbors[start:end]].tolist(), self.neighbor_ports[start:end].tolist()
+      ))
+    return mappings
+
+  # Switches with just one link to another switch
+  def edge_switches(self):
+    return self.dpids[self.degree == 1].tolist()
+
+  def core_switches(self):
+    return self.dpids[self.degree != 1].tolist()
+
+  # { edge dpid: the port of its one link }
+  def uplink_ports(self):
+    edges = np.nonzero(self.degree == 1)[0]
+    return dict(zip(self.dpids[edges].tolist(), self.neighbor_ports[self.offsets[edges]].tolist()))
+
+  # { dpid: [ports on the spanning tree], ... }
+  def enabled_ports(self):
+    enabled = {}
+    children = np.nonzero(self.parent >= 0)[0]
+    for (i, port) in zip(children.tolist(), self.up_port[children].tolist()):
+      enabled.setdefault(int(self.dpids[i]), []).append(port)
+    for (i, port) in zip(self.parent[children].tolist(), self.down_port[children].tolist()):
+      enabled.setdefault(int(self.dpids[i]), []).append(port)
+    return enabled
+
+  def tree_edges(self):
+    children = np.nonzero(self.parent >= 0)[0]
+    return zip(self.dpids[children].tolist(), self.dpids[self.parent[children]].tolist())
+
+def from_dot(topology_file):
+  (switches, edges) = read_dot_topology(topology_file)
+  return PathEngine(switches, edges)
@@ -1,13 +1,18 @@
 import sys,logging
 import frenetic
 from frenetic.syntax import *
-from ryu.lib.packet import ethernet
 from network_information_base import *
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+from nib_journal import NibJournal
 
 class NatApp1(frenetic.App):
 
   client_id = "nat"
 
+  # Set this to a path to keep translated flows across restarts (see nib_journal.py)
+  nib_journal_path = None
+
   def __init__(self):
     frenetic.App.__init__(self)     
     self.nib = NetworkInformationBase(logging)
@@ -16,7 +21,13 @@ class NatApp1(frenetic.App):
     def handle_current_switches(switches):
       logging.info("Connected to Frenetic - Switches: "+str(switches))
       self.nib.connected(switches.keys()[0])
-      self.update( id >> SendToController("nat_app") )
+      if self.nib_journal_path != None and self.nib.journal == None:
+        NibJournal(self.nib_journal_path, logging, self.nib.journal_tables).restore_into(self.nib)
+      # Flows we translated before a restart are rewritten in the switch straight away
+      if self.nib.all_flows() != []:
+        self.update(self.policy())
+      else:
+        self.update( id >> SendToController("nat_app") )
     self.current_switches(callback=handle_current_switches)
 
   def predicate_flow_match(self, f):
@@ -75,17 +86,15 @@ class NatApp1(frenetic.App):
     if nib.switch_not_yet_connected():
       return
 
-    # Parse the interesting stuff from the packet
-    ethernet_packet = self.packet(payload, "ethernet")
-    src_mac = ethernet_packet.src
-    dst_mac = ethernet_packet.dst
+    # Parse the interesting stuff from the packet.  Each header is decoded once, when read.
+    pkt = LazyPacket.from_payload(dpid, port_id, payload)
+    src_mac = pkt.ethSrc
+    dst_mac = pkt.ethDst
 
     # If it's not an IP or TCP packet, just drop it
-    if ethernet_packet.ethertype == 0x800:
-      ip_packet = self.packet(payload, "ipv4")
-      if ip_packet.proto == 6:
-        tcp_packet = self.packet(payload, "tcp")
-        pkt_flow = Flow(ip_packet.src, tcp_packet.src_port, ip_packet.dst, tcp_packet.dst_port, Flow.OUTGOING)
+    if pkt.ethType == 0x800:
+      if pkt.ipProto == 6:
+        pkt_flow = Flow(pkt.ip4Src, pkt.tcpSrcPort, pkt.ip4Dst, pkt.tcpDstPort, Flow.OUTGOING)
         if nib.learn(port_id, src_mac, pkt_flow):
           self.update(self.policy())
 
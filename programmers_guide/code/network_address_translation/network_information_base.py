@@ -1,4 +1,7 @@
+import sys, time
 from datetime import datetime
+sys.path.append("../common")
+from addresses import ip_to_int, int_to_ip, mac_to_int, int_to_mac
 
 class Flow(object):
   INCOMING = 0
@@ -40,6 +43,7 @@ class NetworkInformationBase(object):
 
   def __init__(self, logger):
     self.logger = logger
+    self.journal = None
     # We pre-seed the ip table with this info to make it easy.
     self.ips[self.visible_ip] = (self.router_port, self.visible_mac)
 
@@ -59,12 +63,15 @@ class NetworkInformationBase(object):
     # Remember port and mac of the source IP
     if not flow.src_ip in self.ips:
       self.ips[flow.src_ip] = ( src_port_id, src_mac )
+      self.journal_ip(flow.src_ip)
 
     # Pick an arbitrary port to use and remember it
     visible_tcp_port = self.visible_tcp_port_bag.pop()
     reverse_flow = Flow(flow.dst_ip, flow.dst_tcp_port, self.visible_ip, visible_tcp_port, Flow.INCOMING)
     self.flows[flow] = ( self.visible_ip, visible_tcp_port, datetime.now() )
     self.flows[reverse_flow] = ( flow.src_ip, flow.src_tcp_port, datetime.now() )
+    self.journal_flow(flow)
+    self.journal_flow(reverse_flow)
 
     msg = "Learning flow: ({0},{1}) => ({4},{5}) -> ({2},{3})".format(
       flow.src_ip, flow.src_tcp_port,
@@ -74,6 +81,50 @@ class NetworkInformationBase(object):
     self.logger.info(msg)
     return True
 
+  # Flow => rewrite, and IP => (port, MAC), packed as numbers for a NibJournal
+  journal_tables = [ ("flows", "IHIHB", "IHd"), ("ips", "I", "IQ") ]
+
+  def set_journal(self, journal):
+    self.journal = journal
+
+  def flow_record(self, flow):
+    (ip, tcp_port, created) = self.flows[flow]
+    return ("flows",
+      (ip_to_int(flow.src_ip), flow.src_tcp_port, ip_to_int(flow.dst_ip), flow.dst_tcp_port, flow.direction),
+      (ip_to_int(ip), tcp_port, time.mktime(created.timetuple()) + created.microsecond / 1e6)
+    )
+
+  def ip_record(self, ip):
+    (port_id, mac) = self.ips[ip]
+    return ("ips", (ip_to_int(ip),), (port_id, mac_to_int(mac)))
+
+  def journal_flow(self, flow):
+    if self.journal != None:
+      self.journal.set(*self.flow_record(flow))
+
+  def journal_ip(self, ip):
+    if self.journal != None:
+      self.journal.set(*self.ip_record(ip))
+
+  def journal_records(self):
+    for flow in self.flows:
+      yield self.flow_record(flow)
+    for ip in self.ips:
+      yield self.ip_record(ip)
+
+  # Flows and IPs are never forgotten, so every record is a set
+  def restore(self, table, key, value):
+    if table == "flows":
+      (src_ip, src_tcp_port, dst_ip, dst_tcp_port, direction) = key
+      (ip, tcp_port, created) = value
+      flow = Flow(int_to_ip(src_ip), src_tcp_port, int_to_ip(dst_ip), dst_tcp_port, direction)
+      self.flows[flow] = ( int_to_ip(ip), tcp_port, datetime.fromtimestamp(created) )
+      if direction == Flow.OUTGOING:
+        self.visible_tcp_port_bag.discard(tcp_port)
+    elif table == "ips":
+      (port_id, mac) = value
+      self.ips[int_to_ip(key[0])] = ( port_id, int_to_mac(mac) )
+
   def all_flows(self):
     return self.flows.keys()
 
@@ -1,7 +1,7 @@
 import re, sys, os
-from networkx import *
-import pygraphviz as pgv
 from net_utils import NetUtils
+sys.path.append("../common")
+from topology_cache import compiled_topology
 
 # Mininet imports
 from mininet.log import lg, info, error, debug, output
@@ -14,26 +14,44 @@ class RouterMininetBuilder(object):
   def __init__(self, topo_dot_file):
     self.topo_dot_file = topo_dot_file
 
-  def build(self, net):
-    topo_agraph = pgv.AGraph(self.topo_dot_file)
+  # Switches, hosts and links from the dot file.  They're cached next to it (see
+  # common/topology_cache.py), so this only runs when the file changes.
+  def compile_topology(self, topo_dot_file):
+    import pygraphviz as pgv
+    topo_agraph = pgv.AGraph(topo_dot_file)
+    switches = []
+    hosts = []
     for node in topo_agraph.nodes():
       if node.startswith("s"):
-        net.addSwitch(node, dpid=str(node.attr['dpid']))
+        switches.append( (str(node), str(node.attr['dpid'])) )
       else:
-        net.addHost(
-          node, 
-          mac=node.attr['mac'], 
-          ip=node.attr['ip'], 
-          defaultRoute="dev "+node+"-eth0 via "+node.attr['gateway']
-        )
+        hosts.append( (str(node), node.attr['mac'], node.attr['ip'], node.attr['gateway']) )
 
+    links = []
     for link in topo_agraph.edges():
       (src_node, dst_node) = link
-      net.addLink(src_node, dst_node,
+      links.append( (str(src_node), str(dst_node), 
         int(link.attr['src_port']), 
         int(link.attr['dport']) 
+      ) )
+    return (switches, hosts, links)
+
+  def build(self, net):
+    (switches, hosts, links) = \
+      compiled_topology(self.topo_dot_file, "mininet", self.compile_topology, lg)
+    for (name, dpid) in switches:
+      net.addSwitch(name, dpid=dpid)
+    for (name, mac, ip, gateway) in hosts:
+      net.addHost(
+        name, 
+        mac=mac, 
+        ip=ip, 
+        defaultRoute="dev "+name+"-eth0 via "+gateway
       )
 
+    for (src_node, dst_node, src_port, dport) in links:
+      net.addLink(src_node, dst_node, src_port, dport)
+
 def start(ip="127.0.0.1",port=6633):
 
   ctrlr = lambda n: RemoteController(n, ip=ip, port=port, inNamespace=False)
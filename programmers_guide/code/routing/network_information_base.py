@@ -1,6 +1,10 @@
-import json
-import pygraphviz as pgv
+import sys, json
 from net_utils import NetUtils
+sys.path.append("../common")
+from indexed_nib import IndexedNIB
+from flood_cache import FloodCache
+from topology_cache import compiled_topology
+from addresses import ip_to_int, int_to_ip, int_to_mac, mask_for_prefix
 
 class ConnectedDevice(object):
   dpid = None
@@ -15,7 +19,7 @@ class ConnectedDevice(object):
     self.mac = mac
 
   def __str__(self):
-    return str(self.ip)+"/"+self.mac+ \
+    return str(self.ip)+"/"+int_to_mac(self.mac)+ \
       " attached to ( "+str(self.dpid)+" , "+str(self.port_id)+" )"
 
 class Subnet(object):
@@ -29,32 +33,45 @@ class Subnet(object):
     self.router_mac = router_mac
     self.router_port = router_port
     self.gateway = gateway
+    # The network and netmask as ints, so matching an IP against the subnet is one AND
+    (net, prefix_len) = NetUtils.net_mask(subnet_cidr)
+    self.netmask = mask_for_prefix(prefix_len)
+    self.network = ip_to_int(net) & self.netmask
 
-class NetworkInformationBase(object):
+  def contains(self, ip_int):
+    return ip_int & self.netmask == self.network
 
-  # hosts is a dictionary of MAC addresses to ConnectedDevice
-  #  { "11:11:11:11:11:11": ConnectedDevice() ...}
-  hosts = {}
+class NetworkInformationBase(IndexedNIB):
 
-  # dictionary of live ports on each switch
-  # { "11:11:11:11:11:11": [1,2], ...}
-  ports = {}
+  # hosts, from IndexedNIB, is a dictionary of MAC addresses to ConnectedDevice
+  #  { 0x111111111111: ConnectedDevice() ...}
 
-  # dictionary of router ports (internal ports) on each switch
-  # { "11:11:11:11:11:11": [3], ...}
-  internal_ports = {}
+  def __init__(self, logger, topo_file, routing_table_file):
+    IndexedNIB.__init__(self, logger)
 
-  # Dirty flag set if policies need to be regenerated and sent to switches
-  dirty = False
+    # IP addresses of learned hosts, so mac_for_ip needn't scan them all.  Both are 
+    # kept as ints: { ip_to_int("10.0.1.2"): 0x111111111111, ...}
+    self.macs_by_ip = {}
 
-  # Router 
-  router_dpid = None
+    # dictionary of live ports on each switch
+    # { "11:11:11:11:11:11": [1,2], ...}
+    self.ports = {}
 
-  # List of all subnets connected to the router
-  subnets = [ ] 
+    # SetPort actions for flooding, keyed by switch and ingress port
+    self.flood_cache = FloodCache(self.all_ports_except)
 
-  def __init__(self, logger, topo_file, routing_table_file):
-    self.logger = logger
+    # dictionary of router ports (internal ports) on each switch
+    # { "11:11:11:11:11:11": [3], ...}
+    self.internal_ports = {}
+
+    # Dirty flag set if policies need to be regenerated and sent to switches
+    self.dirty = False
+
+    # Router 
+    self.router_dpid = None
+
+    # List of all subnets connected to the router
+    self.subnets = [ ] 
 
     # Read the Fixed routing table first
     f = open(routing_table_file, "r")
@@ -64,7 +81,13 @@ class NetworkInformationBase(object):
       sn = Subnet(rt["subnet"],rt["router_port"],rt["router_mac"],rt["gateway"])
       self.subnets.append(sn)
 
-    # Read the fixed configuration from the topology file
+    # Read the fixed configuration from the topology file, or from its cache if the file
+    # hasn't changed (see topology_cache.py)
+    (self.router_dpid, self.internal_ports) = \
+      compiled_topology(topo_file, "routing", self.compile_topology, self.logger)
+
+  def compile_topology(self, topo_file):
+    import pygraphviz as pgv
     topo_agraph = pgv.AGraph(topo_file)
     switchnames = {}
 
@@ -85,13 +108,33 @@ class NetworkInformationBase(object):
         if dpid not in self.internal_ports:
           self.internal_ports[dpid] = []
         self.internal_ports[dpid].append(int(link.attr['dport']))
+    return (self.router_dpid, self.internal_ports)
+
+  # Works the internal ports out again from the links between switches, as
+  # topology_discovery.py finds them: { dpid: { neighbor dpid: port to it, ... }, ... }.
+  # The router is still the one the topology file names.  Hosts learned on what turn
+  # out to be router ports are unlearned.
+  def set_internal_ports(self, port_mappings):
+    internal_ports = {}
+    for (dpid, neighbors) in port_mappings.items():
+      if dpid != self.router_dpid and self.router_dpid in neighbors:
+        internal_ports[dpid] = [ neighbors[self.router_dpid] ]
+    if internal_ports == self.internal_ports:
+      return
+    self.logger.info("Router ports are now "+str(internal_ports))
+    self.internal_ports = internal_ports
+    for (dpid, ports) in internal_ports.items():
+      for port_id in ports:
+        self.unlearn_port_on_switch(dpid, port_id)
+    self.set_dirty()
 
   def is_internal_port(self, dpid, port_id):
-    return port_id in self.internal_ports[dpid]
+    return port_id in self.internal_ports.get(dpid, [])
 
   def subnet_for(self, ip):
+    ip_int = ip_to_int(ip)
     for sn in self.subnets:
-      if NetUtils.ip_in_network(ip, sn.subnet_cidr):
+      if sn.contains(ip_int):
         return sn
     return None
 
@@ -102,32 +145,63 @@ class NetworkInformationBase(object):
     # Flag it if we've already learned the IP
     if ip != None and self.mac_for_ip(ip) != None:
       self.logger.error(
-        "Saw IP " + ip + "on mac "+mac+
-        " but it's already assigned to "+self.mac_for_ip(ip)
+        "Saw IP " + ip + "on mac "+int_to_mac(mac)+
+        " but it's already assigned to "+int_to_mac(self.mac_for_ip(ip))
       )
       return
 
     # Do not learn a mac twice, but record the IP address if new
     if mac in self.hosts:
       if ip != self.hosts[mac].ip:
+        self.forget_ip(self.hosts[mac].ip)
         self.hosts[mac].ip = ip
+        self.remember_ip(ip, mac)
         self.set_dirty()
       return
 
     cd = ConnectedDevice(dpid, port_id, ip, mac)
-    self.hosts[mac] = cd
+    self.add_host(mac, dpid, port_id, cd)
+    self.remember_ip(ip, mac)
     self.logger.info( "Learning: "+ str(cd) )
     self.set_dirty()
 
-  def port_for_mac_on_switch(self, mac, dpid):
-    return self.hosts[mac].port_id \
-      if mac in self.hosts and self.hosts[mac].dpid == dpid else None
-
-  def mac_for_port_on_switch(self, dpid, port_id):
-    for mac in self.hosts:
-      if self.hosts[mac].dpid == dpid and self.hosts[mac].port_id == port_id:
-        return mac
-    return None
+  def remember_ip(self, ip, mac):
+    if ip != None:
+      self.macs_by_ip[ip_to_int(ip)] = mac
+      if self.journal != None:
+        self.journal.set("ips", (ip_to_int(ip),), (mac,))
+
+  def forget_ip(self, ip):
+    if ip != None:
+      self.macs_by_ip.pop(ip_to_int(ip), None)
+      if self.journal != None:
+        self.journal.delete("ips", (ip_to_int(ip),))
+
+  # IP => MAC of each ConnectedDevice, on top of IndexedNIB's hosts
+  journal_tables = IndexedNIB.journal_tables + [ ("ips", "I", "Q") ]
+
+  def journal_records(self):
+    for r in IndexedNIB.journal_records(self):
+      yield r
+    for (ip, m) in self.macs_by_ip.iteritems():
+      yield ("ips", (ip,), (m,))
+
+  def restore_host(self, mac, dpid, port_id):
+    self.add_host(mac, dpid, port_id, ConnectedDevice(dpid, port_id, None, mac))
+
+  def restore(self, table, key, value):
+    if table != "ips":
+      return IndexedNIB.restore(self, table, key, value)
+    ip = int_to_ip(key[0])
+    if value == None:
+      mac = self.macs_by_ip.pop(key[0], None)
+      if mac in self.hosts and self.hosts[mac].ip == ip:
+        self.hosts[mac].ip = None
+    else:
+      mac = value[0]
+      self.macs_by_ip[key[0]] = mac
+      if mac in self.hosts:
+        self.hosts[mac].ip = ip
 
   def all_learned_macs_with_ip(self):
     return [ cd for (_, cd) in self.hosts.iteritems() if cd.ip != None ]
@@ -145,41 +219,34 @@ class NetworkInformationBase(object):
     ]
 
   def mac_for_ip(self, ip):
-    for (_,cd) in self.hosts.iteritems():
-      if cd.ip == ip:
-        return cd.mac
-    return None
+    return self.macs_by_ip.get(ip_to_int(ip))
 
   def unlearn(self, mac):
     if mac in self.hosts:
-      del self.hosts[mac]
+      self.forget_ip(self.hosts[mac].ip)
+      self.remove_host(mac)
       self.set_dirty()
 
-  def all_mac_port_pairs_on_switch(self, dpid):
-    return [ 
-      (mac, self.hosts[mac].port_id) 
-      for mac in self.hosts.keys() if self.hosts[mac].dpid == dpid 
-    ]
-
-  def all_learned_macs_on_switch(self, dpid):
-    return [
-      mac for mac in self.hosts.keys() if self.hosts[mac].dpid == dpid 
-    ]
-
   def set_all_ports(self, switch_list):
     self.ports = switch_list
+    self.flood_cache.invalidate()
 
   def add_port(self, dpid, port_id):
     if port_id not in self.ports[dpid]:
-      self.ports.append(port_id)
+      self.ports[dpid].append(port_id)
+      self.flood_cache.invalidate()
 
   def delete_port(self, dpid, port_id):
-    if port_id in self.ports:
-      self.ports.remove(port_id)
+    if port_id in self.ports[dpid]:
+      self.ports[dpid].remove(port_id)
+      self.flood_cache.invalidate()
 
   def all_ports_except(self, dpid, in_port_id):
     return [p for p in self.ports[dpid] if p != in_port_id]
 
+  def flood_actions(self, dpid, in_port_id):
+    return self.flood_cache.get(dpid, in_port_id)
+
   def switch_not_yet_connected(self):
     return self.ports == {}
 
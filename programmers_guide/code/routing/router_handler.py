@@ -3,6 +3,7 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base import *
+from addresses import int_to_mac
 
 class WaitingPacket(object):
   def __init__(self, dpid, port_id, payload):
@@ -24,7 +25,7 @@ class RouterHandler(object):
   def policy_for_learned_ip(self, cd):
     sn = self.nib.subnet_for(cd.ip)
     return Filter( EthTypeEq(0x800) & IP4DstEq(cd.ip) ) >> \
-      SetEthSrc(sn.router_mac) >> SetEthDst(cd.mac) >> \
+      SetEthSrc(sn.router_mac) >> SetEthDst(int_to_mac(cd.mac)) >> \
       SetPort(sn.router_port)
 
   def policies_for_learned_ips(self):
@@ -83,7 +84,7 @@ class RouterHandler(object):
     for wp in self.arp_requests[dst_ip]:
       actions = [ 
         SetEthSrc(sn.router_mac),
-        SetEthDst(dst_mac),
+        SetEthDst(int_to_mac(dst_mac)),
         Output(Physical(sn.router_port))
       ]
       self.main_app.pkt_out(wp.dpid, wp.payload, actions)
@@ -119,8 +120,7 @@ class RouterHandler(object):
     if pkt.switch != self.nib.router_dpid:
       return
 
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = pkt.ethSrcInt
 
     if pkt.ethType == 0x806: # ARP
       reply_sent = False
@@ -129,7 +129,7 @@ class RouterHandler(object):
         for sn in self.nib.subnets:
           if pkt.ip4Dst == sn.gateway:
             self.logger.info("ARP Reply sent")
-            self.arp_reply( pkt.switch, pkt.port, src_mac, pkt.ip4Src, sn.router_mac, pkt.ip4Dst)
+            self.arp_reply( pkt.switch, pkt.port, pkt.ethSrc, pkt.ip4Src, sn.router_mac, pkt.ip4Dst)
             reply_sent = True
         if not reply_sent:
           self.logger.info("ARP Request Ignored")
@@ -161,7 +161,7 @@ class RouterHandler(object):
       else:
         sn = nib.subnet_for(dst_ip)
         if sn != None:
-          actions = [SetEthSrc(sn.router_mac), SetEthDst(dst_mac), SetPort(sn.router_port)]
+          actions = [SetEthSrc(sn.router_mac), SetEthDst(int_to_mac(dst_mac)), SetPort(sn.router_port)]
           self.main_app.pkt_out(pkt.switch, payload, actions)
         else:
           # Usually we would send the packet to the default gateway, but in this case.  
@@ -1,12 +1,15 @@
-import sys,logging,datetime
+import sys,logging
 from network_information_base import *
 from frenetic import *
-from frenetic.packet import *
 from switch_handler import *
 from router_handler import *
-from tornado.ioloop import IOLoop
+sys.path.append("../common")
+from update_scheduler import UpdateScheduler
+from lazy_packet import LazyPacket
+from coroutine_app import CoroutineApp
+from tornado import gen
 
-class RoutingApp(frenetic.App):
+class RoutingApp(CoroutineApp):
 
   client_id = "routing"
 
@@ -15,50 +18,55 @@ class RoutingApp(frenetic.App):
     routing_table_file="/home/vagrant/manual/programmers_guide/code/routing/routing_table.json",
     topo_file="/home/vagrant/manual/programmers_guide/code/routing/topology.dot"
     ):
-    frenetic.App.__init__(self)     
+    CoroutineApp.__init__(self)
     self.nib = NetworkInformationBase(logging, topo_file, routing_table_file)
 
     self.switch_handler = SwitchHandler(self.nib, logging, self)
     self.router_handler = RouterHandler(self.nib, logging, self)
+    self.update_scheduler = UpdateScheduler(self, logging)
 
   def policy(self):
     return Union([
       self.switch_handler.policy(),
-      self.router_handler.policy(),
+      self.router_handler.policy()
     ])
 
-  def update_and_clear_dirty(self):
-    self.update(self.policy())
+  def policy_and_clear_dirty(self):
+    logging.info("Installing new policy")
     self.nib.clear_dirty()
+    return self.policy()
+
+  def update_and_clear_dirty(self):
+    self.update_scheduler.schedule(self.policy_and_clear_dirty)
 
+  @gen.coroutine
   def connected(self):
-    def handle_current_switches(switches):
-      logging.info("Connected to Frenetic - Switches: "+str(switches))
-      self.nib.set_all_ports( switches )
-      self.update( self.policy() )
-    self.current_switches(callback=handle_current_switches)
+    switches = yield self.current_switches()
+    logging.info("Connected to Frenetic - Switches: "+str(switches))
+    self.nib.set_all_ports( switches )
+    yield self.update( self.policy() )
 
   def packet_in(self, dpid, port, payload):
-    pkt = Packet.from_payload(dpid, port, payload)
+    pkt = LazyPacket.from_payload(dpid, port, payload)
     self.switch_handler.packet_in(pkt, payload)
     self.router_handler.packet_in(pkt, payload)
 
     if self.nib.is_dirty():
-      logging.info("Installing new policy")
-      # This doesn't actually wait two seconds, but it serializes the updates 
-      # so they occur in the right order
-      IOLoop.instance().add_timeout(datetime.timedelta(seconds=2), self.update_and_clear_dirty)
+      # A burst of packets collapses into one update, sent in order with any others
+      self.update_and_clear_dirty()
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid, port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.delete_port(dpid, port_id)
     self.update_and_clear_dirty()
+    self.update_scheduler.flush()
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid, port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.add_port(dpid, port_id)
     self.update_and_clear_dirty()
+    self.update_scheduler.flush()
 
 if __name__ == '__main__':
   logging.basicConfig(\
@@ -66,4 +74,4 @@ if __name__ == '__main__':
     format='%(asctime)s [%(levelname)s] %(message)s', level=logging.INFO \
   )
   app = RoutingApp()
-  app.start_event_loop()
\ No newline at end of file
+  app.start_event_loop()
@@ -0,0 +1,126 @@
+import sys,logging
+from frenetic.syntax import *
+from tornado import gen
+from tornado.ioloop import IOLoop
+from routing2 import RoutingApp2
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+from policy_partitions import PolicyPartitions
+from sharding import ShardWorker, run_sharded
+
+# RoutingApp2 split across processes by switch (see common/sharding.py).  Each worker runs
+# the switch handler for its own switches, and whichever worker owns the router runs the
+# router handler and ages out hosts.  Hosts and their IP addresses are shared with every
+# worker, since the router needs them all.
+#
+#   python routing1_sharded.py [shards]
+
+class ShardedRoutingApp(ShardWorker, RoutingApp2):
+
+  def join_shards(self, shard, n_shards, sock):
+    ShardWorker.join_shards(self, shard, n_shards, sock)
+    self.partitions = PolicyPartitions(self, self.client_id, self.policy_for_switch, logging)
+    self.push_pending = False
+
+  @gen.coroutine
+  def connected(self):
+    switches = yield self.current_switches()
+    logging.info("Shard "+str(self.shard)+" connected to Frenetic - Switches: "+str(switches))
+    self.nib.set_all_ports( switches )
+    for dpid in switches:
+      if self.owns(dpid):
+        self.partitions.mark_dirty(dpid)
+    self.push_partitions()
+    if self.owns(self.nib.router_dpid):
+      self.mac_ager.start()
+
+  def policy_for_switch(self, dpid):
+    if dpid == self.nib.router_dpid:
+      return Union([ self.router_handler.policy(), self.mac_ager.query_policy() ])
+    return self.switch_handler.policy_for_switch(dpid)
+
+  # A host coming or going changes the policy on its own switch and the router
+  def host_changed(self, dpid):
+    for changed in [ dpid, self.nib.router_dpid ]:
+      if changed != None and self.owns(changed):
+        self.partitions.mark_dirty(changed)
+
+  def push_partitions(self):
+    self.push_pending = False
+    self.nib.clear_dirty()
+    if not self.nib.switch_not_yet_connected():
+      self.partitions.push_dirty()
+
+  # Replaces the UpdateScheduler, which only knows about the app's own client id
+  def update_and_clear_dirty(self):
+    if not self.push_pending:
+      self.push_pending = True
+      IOLoop.instance().add_callback(self.push_partitions)
+
+  def host_entry(self, mac):
+    cd = self.nib.hosts.get(mac)
+    return None if cd == None else (cd.dpid, cd.port_id, cd.ip)
+
+  def packet_in(self, dpid, port, payload):
+    src_mac = LazyPacket.from_payload(dpid, port, payload).ethSrcInt
+    before = self.host_entry(src_mac)
+    RoutingApp2.packet_in(self, dpid, port, payload)
+    after = self.host_entry(src_mac)
+    if after != before and after != None:
+      self.host_locations.learn(src_mac, *after)
+      self.host_changed(after[0])
+      self.update_and_clear_dirty()
+
+  def host_learned(self, mac, dpid, port_id, ip):
+    entry = self.host_entry(mac)
+    if entry == (dpid, port_id, ip):
+      return
+    if entry != None and entry[:2] != (dpid, port_id):
+      self.host_unlearned(mac)
+    self.nib.learn(mac, dpid, port_id, ip)
+    self.host_changed(dpid)
+    self.update_and_clear_dirty()
+
+  def host_unlearned(self, mac):
+    entry = self.host_entry(mac)
+    if entry == None:
+      return
+    self.nib.unlearn(mac)
+    self.host_changed(entry[0])
+    self.update_and_clear_dirty()
+
+  def hosts_expired(self, macs):
+    # The ager has already unlearned them here
+    for mac in macs:
+      location = self.host_locations.locations.get(mac)
+      self.host_locations.unlearn(mac)
+      if location != None:
+        self.host_changed(location[0])
+    self.update_and_clear_dirty()
+
+  def port_down(self, dpid, port_id):
+    self.unlearn_port(dpid, port_id)
+    self.nib.delete_port(dpid, port_id)
+    self.update_and_clear_dirty()
+
+  def port_up(self, dpid, port_id):
+    # Just to be safe, in case we have old MACs mapped to this port
+    self.unlearn_port(dpid, port_id)
+    self.nib.add_port(dpid, port_id)
+    self.update_and_clear_dirty()
+
+  def unlearn_port(self, dpid, port_id):
+    macs = self.nib.unlearn_port_on_switch(dpid, port_id)
+    for mac in macs:
+      self.host_locations.unlearn(mac)
+    if macs != []:
+      self.host_changed(dpid)
+    # Flooding changes with the ports, even if no hosts were behind this one
+    self.partitions.mark_dirty(dpid)
+
+if __name__ == '__main__':
+  logging.basicConfig(\
+    stream = sys.stderr, \
+    format='%(asctime)s [%(levelname)s] %(message)s', level=logging.INFO \
+  )
+  run_sharded(ShardedRoutingApp, int(sys.argv[1]) if len(sys.argv) > 1 else 4)
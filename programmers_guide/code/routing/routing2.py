@@ -0,0 +1,114 @@
+import sys,logging
+from frenetic.syntax import *
+from tornado import gen
+from routing1 import RoutingApp
+sys.path.append("../common")
+from mac_aging import MacAger
+from lazy_packet import LazyPacket
+from addresses import int_to_mac
+from pkt_out_batcher import PktOutBatcher
+from hot_path_timer import HotPathTimer
+from nib_journal import NibJournal
+from topology_discovery import TopologyDiscovery, without_probes
+
+# RoutingApp for a network that runs unattended: it ages out idle hosts, batches
+# pkt_outs, and can time its packet_in path, journal the NIB and discover the router
+# ports.  routing1_sharded.py builds on this one.
+
+class RoutingApp2(RoutingApp):
+
+  # Hosts quiet for this many seconds are forgotten.  Since switch rules forward most 
+  # traffic without us seeing it, we count packets from each host to tell if it's quiet.
+  max_mac_age = 300
+
+  # Time each stage of packet_in from the start.  Or send the process SIGUSR1 to flip it.
+  hot_path_timing = False
+
+  # Set this to a path to keep learned hosts across restarts (see nib_journal.py)
+  nib_journal_path = None
+
+  # Set this to find the router ports with LLDP probes rather than read them from
+  # topo_file, which still names the router (see topology_discovery.py)
+  discover_topology = False
+
+  def __init__(self, *args, **kwargs):
+    RoutingApp.__init__(self, *args, **kwargs)
+    # Floods and packets released after ARP replies go out in pipelined batches
+    self.pkt_outs = PktOutBatcher(self, logging)
+    self.mac_ager = MacAger(
+      self, self.nib, logging, self.hosts_expired, self.max_mac_age,
+      query_label=lambda mac: "age_"+int_to_mac(mac)
+    )
+    self.hot_path_timer = HotPathTimer(logging, [
+      ("packet_in", self, "packet_in"),
+      ("parse", LazyPacket, "from_payload"),
+      ("switch_handler", self.switch_handler, "packet_in"),
+      ("router_handler", self.router_handler, "packet_in"),
+      ("nib_lookup", self.nib, "port_for_mac_on_switch"),
+      ("nib_lookup", self.nib, "mac_for_ip"),
+      ("nib_lookup", self.nib, "subnet_for"),
+      ("flood_actions", self.nib, "flood_actions"),
+      ("pkt_out", self, "pkt_out"),
+    ])
+    if self.hot_path_timing:
+      self.hot_path_timer.enable()
+    self.discovery = None
+    if self.discover_topology:
+      self.discovery = TopologyDiscovery(self, logging, self.topology_discovered)
+
+  def policy(self):
+    policy = Union([ RoutingApp.policy(self), self.mac_ager.query_policy() ])
+    return without_probes(policy) if self.discovery != None else policy
+
+  @gen.coroutine
+  def connected(self):
+    switches = yield self.current_switches()
+    logging.info("Connected to Frenetic - Switches: "+str(switches))
+    self.nib.set_all_ports( switches )
+    if self.nib_journal_path != None and self.nib.journal == None:
+      NibJournal(self.nib_journal_path, logging, self.nib.journal_tables).restore_into(self.nib)
+    yield self.update( self.policy() )
+    self.mac_ager.start()
+    if self.discovery != None:
+      self.discovery.start( switches )
+
+  def topology_discovered(self, port_mappings):
+    self.nib.set_internal_ports(port_mappings)
+    if self.nib.is_dirty():
+      self.update_and_clear_dirty()
+
+  def packet_in(self, dpid, port, payload):
+    if self.discovery != None and self.discovery.packet_in(dpid, port, payload):
+      return
+    pkt = LazyPacket.from_payload(dpid, port, payload)
+    self.switch_handler.packet_in(pkt, payload)
+    self.router_handler.packet_in(pkt, payload)
+    self.nib.touch(pkt.ethSrcInt)
+
+    if self.nib.is_dirty():
+      self.update_and_clear_dirty()
+
+  def pkt_out(self, switch_id, payload, actions, in_port=None, policies=None):
+    return self.pkt_outs.pkt_out(switch_id, payload, actions, in_port, policies)
+
+  def hosts_expired(self, macs):
+    # Unlearning marked the NIB dirty, so this is one update for all of them
+    self.update_and_clear_dirty()
+
+  def port_down(self, dpid, port_id):
+    if self.discovery != None:
+      self.discovery.port_down(dpid, port_id)
+    RoutingApp.port_down(self, dpid, port_id)
+
+  def port_up(self, dpid, port_id):
+    if self.discovery != None:
+      self.discovery.port_up(dpid, port_id)
+    RoutingApp.port_up(self, dpid, port_id)
+
+if __name__ == '__main__':
+  logging.basicConfig(\
+    stream = sys.stderr, \
+    format='%(asctime)s [%(levelname)s] %(message)s', level=logging.INFO \
+  )
+  app = RoutingApp2()
+  app.start_event_loop()
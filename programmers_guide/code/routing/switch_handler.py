@@ -2,6 +2,7 @@ import frenetic
 from frenetic.syntax import *
 from frenetic.packet import *
 from network_information_base import *
+from addresses import int_to_mac, ints_to_macs
 
 class SwitchHandler(object):
 
@@ -12,7 +13,7 @@ class SwitchHandler(object):
 
   def policy_for_dest(self, dpid, mac_port):
     (mac, port) = mac_port
-    return Filter(SwitchEq(dpid) & EthDstEq(mac)) >> SetPort(port)
+    return Filter(SwitchEq(dpid) & EthDstEq(int_to_mac(mac))) >> SetPort(port)
 
   def policies_for_dest(self, dpid, all_mac_ports):
     return [ self.policy_for_dest(dpid, mp) for mp in all_mac_ports ]
@@ -21,8 +22,8 @@ class SwitchHandler(object):
     return \
       IfThenElse(
         SwitchEq(dpid) & 
-        (EthSrcNotEq( self.nib.all_learned_macs_on_switch(dpid) ) | 
-        EthDstNotEq( self.nib.all_learned_macs_on_switch(dpid) )),
+        (EthSrcNotEq( ints_to_macs(self.nib.all_learned_macs_on_switch(dpid)) ) | 
+        EthDstNotEq( ints_to_macs(self.nib.all_learned_macs_on_switch(dpid)) )),
         SendToController("switch"),
         Union( self.policies_for_dest(dpid, self.nib.all_mac_port_pairs_on_switch(dpid)) )
       )
@@ -41,8 +42,8 @@ class SwitchHandler(object):
     if pkt.switch == self.nib.router_dpid:
       return
 
-    src_mac = pkt.ethSrc
-    dst_mac = pkt.ethDst
+    src_mac = pkt.ethSrcInt
+    dst_mac = pkt.ethDstInt
 
     # If we haven't learned the source mac
     if nib.port_for_mac_on_switch( src_mac, pkt.switch ) == None: 
@@ -64,7 +65,7 @@ class SwitchHandler(object):
     if  dst_port != None:
       actions = SetPort(dst_port)
     else:
-      actions = SetPort(nib.all_ports_except(pkt.switch, pkt.port))
+      actions = nib.flood_actions(pkt.switch, pkt.port)
     self.main_app.pkt_out(pkt.switch, payload, actions )
 
 
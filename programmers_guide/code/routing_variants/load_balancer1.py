@@ -5,11 +5,23 @@ from load_balancer_nib import *
 from switch_handler import *
 from load_balancer_handler import *
 from tornado.ioloop import IOLoop
+sys.path.append("../common")
+from update_scheduler import UpdateScheduler
+from hot_path_timer import HotPathTimer
+from lazy_packet import LazyPacket
+from nib_journal import NibJournal
 
 class LoadBalancerApp(frenetic.App):
 
   client_id = "load_balancer"
 
+  # Time each stage of packet_in from the start.  Or send the process SIGUSR1 to flip it.
+  hot_path_timing = False
+
+  # Set this to a path to keep learned hosts and backend choices across restarts (see
+  # nib_journal.py)
+  nib_journal_path = None
+
   def __init__(self, 
     topo_file="../routing/topology.dot", 
     routing_table_file="../routing/routing_table.json",
@@ -23,18 +35,39 @@ class LoadBalancerApp(frenetic.App):
 
     self.switch_handler = SwitchHandler(self.nib, logging, self)
     self.load_balancer_handler = LoadBalancerHandler(self.nib, logging, self)
+    self.update_scheduler = UpdateScheduler(self, logging)
+    self.hot_path_timer = HotPathTimer(logging, [
+      ("packet_in", self, "packet_in"),
+      ("parse", LazyPacket, "from_payload"),
+      ("switch_handler", self.switch_handler, "packet_in"),
+      ("load_balancer_handler", self.load_balancer_handler, "packet_in"),
+      ("nib_lookup", self.nib, "port_for_mac_on_switch"),
+      ("nib_lookup", self.nib, "mac_for_ip"),
+      ("nib_lookup", self.nib, "subnet_for"),
+      ("nib_lookup", self.nib, "lb_frontend_ip"),
+      ("flood_actions", self.nib, "flood_actions"),
+      ("pkt_out", self, "pkt_out"),
+    ])
+    if self.hot_path_timing:
+      self.hot_path_timer.enable()
 
   def policy(self):
     return self.switch_handler.policy() | self.load_balancer_handler.policy()
 
-  def update_and_clear_dirty(self):
-    self.update(self.policy())
+  def policy_and_clear_dirty(self):
+    logging.info("Installing new policy")
     self.nib.clear_dirty()
+    return self.policy()
+
+  def update_and_clear_dirty(self):
+    self.update_scheduler.schedule(self.policy_and_clear_dirty)
 
   def connected(self):
     def handle_current_switches(switches):
       logging.info("Connected to Frenetic - Switches: "+str(switches))
       self.nib.set_all_ports( switches )
+      if self.nib_journal_path != None and self.nib.journal == None:
+        NibJournal(self.nib_journal_path, logging, self.nib.journal_tables).restore_into(self.nib)
       self.update( self.policy() )
       # Wait a few seconds for the policy to be installed
       logging.info("Pausing 2 seconds to allow rules to be installed")
@@ -44,27 +77,26 @@ class LoadBalancerApp(frenetic.App):
     self.current_switches(callback=handle_current_switches)
 
   def packet_in(self, dpid, port, payload):
-    pkt = Packet.from_payload(dpid, port, payload)
+    pkt = LazyPacket.from_payload(dpid, port, payload)
     self.switch_handler.packet_in(pkt, payload)
     self.load_balancer_handler.packet_in(pkt, payload)
 
     if self.nib.is_dirty():
-      # This doesn't actually wait two seconds, but it serializes the updates 
-      # so they occur in the right order
-      IOLoop.instance().add_timeout(datetime.timedelta(seconds=2), 
-        self.update_and_clear_dirty
-      )
+      # A burst of packets collapses into one update, sent in order with any others
+      self.update_and_clear_dirty()
 
   def port_down(self, dpid, port_id):
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid, port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.delete_port(dpid, port_id)
     self.update_and_clear_dirty()
+    self.update_scheduler.flush()
 
   def port_up(self, dpid, port_id):
     # Just to be safe, in case we have old MACs mapped to this port
-    self.nib.unlearn( self.nib.mac_for_port_on_switch(dpid, port_id) )
+    self.nib.unlearn_port_on_switch(dpid, port_id)
     self.nib.add_port(dpid, port_id)
     self.update_and_clear_dirty()
+    self.update_scheduler.flush()
 
 if __name__ == '__main__':
   logging.basicConfig(\
@@ -1,6 +1,7 @@
 import sys
 sys.path.append("../routing")
 from router_handler import *
+from addresses import int_to_mac
 
 class LoadBalancerHandler(RouterHandler):
 
@@ -58,12 +59,12 @@ class LoadBalancerHandler(RouterHandler):
         if backend_mac == None:
           self.where_is(backend_ip)
         else:
-          self.logger.info("Rerouting request for "+frontend_ip+" to "+backend_ip+"/"+backend_mac)
+          self.logger.info("Rerouting request for "+frontend_ip+" to "+backend_ip+"/"+int_to_mac(backend_mac))
           self.logger.info("Using subnet on router port "+str(sn.router_port)+" mac "+sn.router_mac)
           actions = [
             SetIP4Dst(backend_ip),           
             SetEthSrc(sn.router_mac),
-            SetEthDst(backend_mac),
+            SetEthDst(int_to_mac(backend_mac)),
             SetPort(sn.router_port)
           ]
           self.main_app.pkt_out(pkt.switch, payload, actions)
@@ -83,7 +84,7 @@ class LoadBalancerHandler(RouterHandler):
           actions = [
             SetIP4Src(frontend_ip),           
             SetEthSrc(sn.router_mac),
-            SetEthDst(dst_mac),
+            SetEthDst(int_to_mac(dst_mac)),
             SetPort(sn.router_port)
           ]
           self.main_app.pkt_out(pkt.switch, payload, actions)
@@ -1,6 +1,7 @@
 import sys
 sys.path.append("../routing")
 from router_handler import *
+from addresses import int_to_mac
 
 class LoadBalancerHandler2(RouterHandler):
 
@@ -34,7 +35,7 @@ class LoadBalancerHandler2(RouterHandler):
     return Seq([
       SetIP4Dst(backend_ip),
       SetEthSrc(sn.router_mac),
-      SetEthDst(dst_mac),
+      SetEthDst(int_to_mac(dst_mac)),
       SetPort(sn.router_port)
     ])
 
@@ -47,7 +48,7 @@ class LoadBalancerHandler2(RouterHandler):
     return Seq([
       SetIP4Src(frontend_ip),
       SetEthSrc(sn.router_mac),
-      SetEthDst(dst_mac),
+      SetEthDst(int_to_mac(dst_mac)),
       SetPort(sn.router_port)
     ])
 
@@ -27,9 +27,27 @@ class LoadBalancerNIB(NetworkInformationBase):
       n_backends = len(backends)
       self.backend_map[src_ip] = backends[self.current_backend_index]
       self.current_backend_index = (self.current_backend_index + 1) % n_backends
+      if self.journal != None:
+        self.journal.set("backends", (ip_to_int(src_ip),), (ip_to_int(self.backend_map[src_ip]),))
 
     return self.backend_map[src_ip]
 
+  # Source IP => backend IP, so clients stay on the same backend across restarts
+  journal_tables = NetworkInformationBase.journal_tables + [ ("backends", "I", "I") ]
+
+  def journal_records(self):
+    for r in NetworkInformationBase.journal_records(self):
+      yield r
+    for (src_ip, backend) in self.backend_map.iteritems():
+      yield ("backends", (ip_to_int(src_ip),), (ip_to_int(backend),))
+
+  def restore(self, table, key, value):
+    if table != "backends":
+      return NetworkInformationBase.restore(self, table, key, value)
+    self.backend_map[int_to_ip(key[0])] = int_to_ip(value[0])
+    # Sources are only ever added, one backend along each time
+    self.current_backend_index = len(self.backend_map) % len(self.lb_config["backends"])
+
   def lb_frontend_ip(self):
     return self.lb_config["frontend"]
 
@@ -0,0 +1,157 @@
+# Benchmark: packet_in to pkt_out latency and update traffic for each guide app
+#
+# Runs each app, unchanged, in its own process against a StandInFrenetic in another, so
+# like test_suite.py it exercises the whole app, but needs neither Mininet nor sudo.  Each
+# app gets a workload that fits its chapter's topology: hosts on a single switch for the
+# learning and VLAN apps, a tree for the multiswitch apps, the hosts from
+# routing/topology.dot for the router and load balancers, and outgoing TCP flows for NAT.
+# Hosts take turns sending to each other, so the first round is all new MACs and the rest
+# go to hosts already learned.
+#
+# "answered" counts packet_ins whose own frame came back in a pkt_out.  The router holds
+# packets until it has ARPed for their destination, which nobody answers here, so it only
+# sees traffic within a subnet.  "updates/s" and the update sizes count only the updates
+# sent while packets were arriving.
+#
+#   python bench_suite.py [packets] [packets_per_second] [app ...]
+
+import sys, os, time, logging, multiprocessing
+from tornado.ioloop import IOLoop
+from stand_in_frenetic import StandInFrenetic, tcp_frame, paced
+
+PORT = 9127
+CODE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def mac_for(i):
+  return "02:00:00:00:%02x:%02x" % ((i >> 8) & 255, i & 255)
+
+def ip_for(i):
+  return "10.0.%d.%d" % ((i >> 8) & 255, (i & 255) + 1)
+
+# hosts is a list of (dpid, port_id, mac, ip).  Host i sends to host i + step.
+def round_robin(hosts, n_packets, step=1, vlan_of=None):
+  frames = []
+  for k in range(n_packets):
+    (dpid, port_id, src_mac, src_ip) = hosts[k % len(hosts)]
+    (_, _, dst_mac, dst_ip) = hosts[(k + step) % len(hosts)]
+    vlan = vlan_of(port_id) if vlan_of != None else None
+    frames.append( (dpid, port_id, tcp_frame(src_mac, dst_mac, src_ip, dst_ip, 40000, 80, vlan)) )
+  return frames
+
+# One switch with 4 ports and 16 hosts.  Host i talks to host i + 2, which is on a port
+# with the same parity, and so the same VLAN in handling_vlans.
+def single_switch(n_packets, vlan_of=None):
+  hosts = [ (1, i % 4 + 1, mac_for(i), ip_for(i)) for i in range(16) ]
+  return ({ 1: [1, 2, 3, 4] }, round_robin(hosts, n_packets, 2, vlan_of))
+
+def tagged_single_switch(n_packets):
+  return single_switch(n_packets, lambda port_id: 1001 if port_id % 2 == 1 else 1002)
+
+# Mininet's TreeTopo(2,4), as in test_suite.py: core switch 1, edge switches 2-5 with
+# their uplink on port 5
+def tree(n_packets):
+  hosts = [ (2 + i % 4, 1 + (i // 4) % 4, mac_for(i), ip_for(i)) for i in range(16) ]
+  switches = { 1: [1, 2, 3, 4] }
+  for dpid in range(2, 6):
+    switches[dpid] = [1, 2, 3, 4, 5]
+  return (switches, round_robin(hosts, n_packets))
+
+# multiswitch_topologies/multiswitch_topo.dot, with hosts on ports 1-3 of each edge switch
+def multiswitch_topo(n_packets):
+  edges = [3, 4, 5, 7, 8, 9, 11, 12, 13]
+  hosts = [ (edges[i % 9], 1 + (i // 9) % 3, mac_for(i), ip_for(i)) for i in range(27) ]
+  switches = { 1: [1, 2, 3], 2: [1, 2, 3, 4, 5], 6: [1, 2, 3, 4, 5], 10: [1, 2, 3, 4] }
+  for dpid in edges:
+    switches[dpid] = [1, 2, 3, 4]
+  return (switches, round_robin(hosts, n_packets))
+
+def dpid_from_mac(mac):
+  return int(mac.replace(":", ""), 16)
+
+# routing/topology.dot.  h1 and h2 talk to each other on s1, h3 and h4 on s2.
+def routing_topo(n_packets):
+  (router, s1, s2) = [ dpid_from_mac("01:01:00:00:00:00:0" + str(i)) for i in range(3) ]
+  h1 = (s1, 1, "00:00:01:00:00:02", "10.0.1.2")
+  h2 = (s1, 2, "00:00:01:00:00:03", "10.0.1.3")
+  h3 = (s2, 1, "00:00:02:00:00:02", "10.0.2.2")
+  h4 = (s2, 2, "00:00:02:00:00:03", "10.0.2.3")
+  return (
+    { router: [1, 2], s1: [1, 2, 3], s2: [1, 2, 3] },
+    round_robin([ h1, h3, h2, h4 ], n_packets, 2)
+  )
+
+# Four inside hosts opening connections to a web server through the router on port 5.
+# Every packet is a new flow until the source ports wrap around.
+def nat_flows(n_packets):
+  frames = []
+  for k in range(n_packets):
+    i = k % 4
+    tcp_src = 1024 + (k // 4) % 1000
+    frames.append( (1, i + 1, tcp_frame(
+      mac_for(i), "08:00:27:94:44:d6", "192.168.0.%d" % (i + 2), "93.184.216.34", tcp_src, 80
+    )) )
+  return ({ 1: [1, 2, 3, 4, 5] }, frames)
+
+# name, folder, module, class, constructor arguments, workload
+APPS = [
+  ("learning1", "l2_learning_switch", "learning1", "LearningApp1", {}, single_switch),
+  ("learning2", "l2_learning_switch", "learning2", "LearningApp2", {}, single_switch),
+  ("learning3", "l2_learning_switch", "learning3", "LearningApp3", {}, single_switch),
+  ("learning4", "l2_learning_switch", "learning4", "LearningApp4", {}, single_switch),
+  ("learning6", "l2_learning_switch", "learning6", "LearningApp6", {}, single_switch),
+  ("multiswitch1", "multiswitch_topologies", "multiswitch1", "MultiswitchApp1", {}, tree),
+  ("multiswitch2", "multiswitch_topologies", "multiswitch2", "MultiswitchApp2", {}, tree),
+  ("multiswitch3", "multiswitch_topologies", "multiswitch3", "MultiswitchApp3", {}, multiswitch_topo),
+  ("routing1", "routing", "routing1", "RoutingApp",
+    { "routing_table_file": "routing_table.json", "topo_file": "topology.dot" }, routing_topo),
+  ("routing2", "routing", "routing2", "RoutingApp2",
+    { "routing_table_file": "routing_table.json", "topo_file": "topology.dot" }, routing_topo),
+  ("load_balancer1", "routing_variants", "load_balancer1", "LoadBalancerApp", {}, routing_topo),
+  ("load_balancer2", "routing_variants", "load_balancer2", "LoadBalancerApp", {}, routing_topo),
+  ("nat1", "network_address_translation", "nat1", "NatApp1", {}, nat_flows),
+  ("vlan1", "handling_vlans", "vlan1", "VlanApp1", {}, single_switch),
+  ("vlan2", "handling_vlans", "vlan2", "VlanApp2", {}, tagged_single_switch),
+]
+
+def run_stand_in(switches, frames, rate, results):
+  controller = StandInFrenetic(switches, paced(frames, rate))
+  results.put(IOLoop.instance().run_sync(lambda: controller.run(PORT)))
+
+def run_app(folder, module, class_name, kwargs, port=PORT):
+  # Apps find their NIBs, topology files and ../common relative to their own folder
+  os.chdir(os.path.join(CODE_ROOT, folder))
+  sys.path.insert(0, os.getcwd())
+  sys.stdout = open(os.devnull, "w")
+  logging.basicConfig(level=logging.WARNING)
+  app_class = getattr(__import__(module), class_name)
+  app_class.frenetic_http_port = str(port)
+  app_class(**kwargs).start_event_loop()
+
+def measure(spec, n_packets, rate):
+  (name, folder, module, class_name, kwargs, workload) = spec
+  (switches, frames) = workload(n_packets)
+  results = multiprocessing.Queue()
+  controller = multiprocessing.Process(target=run_stand_in, args=(switches, frames, rate, results))
+  controller.start()
+  time.sleep(0.5)
+  app = multiprocessing.Process(target=run_app, args=(folder, module, class_name, kwargs))
+  app.start()
+  summary = results.get()
+  app.terminate()
+  controller.join()
+  app.join()
+  return summary
+
+if __name__ == '__main__':
+  n_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  rate = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+  names = sys.argv[3:] or [ spec[0] for spec in APPS ]
+  print "%d packet_ins per app at %d/s" % (n_packets, rate)
+  print "%-16s%10s%10s%10s%10s%12s%14s%14s" % ("app", "answered", "other",
+    "p50 ms", "p99 ms", "updates/s", "mean upd KB", "max upd KB")
+  for spec in APPS:
+    if spec[0] in names:
+      s = measure(spec, n_packets, rate)
+      print "%-16s%10d%10d%10.2f%10.2f%12.1f%14.1f%14.1f" % (spec[0], s["answered"],
+        s["other_pkt_outs"], s["p50_ms"], s["p99_ms"], s["updates_per_sec"],
+        s["mean_update_bytes"] / 1024.0, s["max_update_bytes"] / 1024.0)
@@ -0,0 +1,117 @@
+# Replays a pcap capture into a guide app as packet_ins, for load testing without a network
+#
+# Like bench_suite.py, the app runs unchanged in its own process against a StandInFrenetic
+# in another.  Frames are read from the capture as they're needed, so captures larger
+# than memory are fine.  Every frame arrives on the switch given by --dpid, on the port
+# given by --port, or with --ports N, spread over ports 1-N by source MAC so each host
+# stays on one port.  By default frames keep the spacing they were captured with;
+# --speed 2 plays them twice as fast, and --fast as fast as the app takes them.
+#
+# Frames the app's policy would handle in the switch are counted as switched and never
+# reach the app, just as with a real Frenetic.  The stand-in decides that by evaluating
+# the policies the app pushes (see policy_model.py).  --no-policy sends every frame to the
+# app instead.
+#
+#   python pcap_replay.py [--dpid 1] [--port 1 | --ports N] [--speed X | --fast] [--no-policy] app capture.pcap
+
+import sys, struct, argparse, multiprocessing, time
+from tornado.ioloop import IOLoop
+from stand_in_frenetic import StandInFrenetic
+from policy_model import PolicyModel
+from bench_suite import APPS, run_app
+sys.path.append("../common")
+from policy_partitions import bucket_for
+
+PORT = 9129
+LINKTYPE_ETHERNET = 1
+
+# Per magic number: byte order, and how many of the subsecond field make a second
+MAGICS = {
+  0xa1b2c3d4: ("<", 1e6), 0xd4c3b2a1: (">", 1e6),
+  0xa1b23c4d: ("<", 1e9), 0x4d3cb2a1: (">", 1e9),
+}
+
+# (seconds since the first frame, frame) for each frame in a pcap file
+def read_pcap(path):
+  with open(path, "rb") as f:
+    header = f.read(24)
+    if len(header) < 24 or struct.unpack("<I", header[:4])[0] not in MAGICS:
+      raise ValueError(path + " is not a pcap file")
+    (order, ticks) = MAGICS[struct.unpack("<I", header[:4])[0]]
+    linktype = struct.unpack(order + "I", header[20:24])[0]
+    if linktype != LINKTYPE_ETHERNET:
+      raise ValueError("%s has link type %d, only Ethernet is supported" % (path, linktype))
+    first = None
+    while True:
+      record = f.read(16)
+      if len(record) < 16:
+        return
+      (secs, subsecs, captured, _) = struct.unpack(order + "IIII", record)
+      data = f.read(captured)
+      if len(data) < captured:
+        return
+      at = secs + subsecs / ticks
+      if first == None:
+        first = at
+      yield (at - first, data)
+
+def mac_at(data, offset):
+  return ":".join( "%02x" % ord(b) for b in data[offset:offset + 6] )
+
+# Streams (at, dpid, port_id, data) for StandInFrenetic
+def frames_from(path, dpid, port_id, n_ports, speed):
+  for (at, data) in read_pcap(path):
+    # Runt frames have no Ethernet header for the app to parse
+    if len(data) < 14:
+      continue
+    port = port_id if n_ports == None else bucket_for(mac_at(data, 6), n_ports) + 1
+    yield (None if speed == None else at / speed, dpid, port, data)
+
+def run_stand_in(args, results):
+  ports = [ args.port ] if args.ports == None else range(1, args.ports + 1)
+  controller = StandInFrenetic(
+    { args.dpid: ports },
+    frames_from(args.capture, args.dpid, args.port, args.ports, None if args.fast else args.speed),
+    policy_model=None if args.no_policy else PolicyModel()
+  )
+  results.put(IOLoop.instance().run_sync(lambda: controller.run(PORT)))
+
+def replay(args):
+  spec = [ s for s in APPS if s[0] == args.app ][0]
+  (_, folder, module, class_name, kwargs, _) = spec
+  results = multiprocessing.Queue()
+  controller = multiprocessing.Process(target=run_stand_in, args=(args, results))
+  controller.start()
+  time.sleep(0.5)
+  app = multiprocessing.Process(target=run_app, args=(folder, module, class_name, kwargs, PORT))
+  app.start()
+  summary = results.get()
+  app.terminate()
+  controller.join()
+  app.join()
+  return summary
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Replay a pcap capture into a guide app")
+  parser.add_argument("app", choices=[ spec[0] for spec in APPS ])
+  parser.add_argument("capture")
+  parser.add_argument("--dpid", type=int, default=1)
+  ports = parser.add_mutually_exclusive_group()
+  ports.add_argument("--port", type=int, default=1)
+  ports.add_argument("--ports", type=int, help="spread hosts over ports 1-N by source MAC")
+  pace = parser.add_mutually_exclusive_group()
+  pace.add_argument("--speed", type=float, default=1.0, help="multiple of the captured rate")
+  pace.add_argument("--fast", action="store_true", help="send as fast as the app takes them")
+  parser.add_argument("--no-policy", action="store_true",
+    help="send every frame to the app, whatever its policy")
+  args = parser.parse_args()
+
+  s = replay(args)
+  print "%s, %d frames in %.1fs" % (args.capture, s["packets"], s["elapsed"])
+  print "  switched %d, punted %d, answered %d, other pkt_outs %d" % (
+    s["switched"], s["punted"], s["answered"], s["other_pkt_outs"])
+  print "  updates %d, mean %.1f KB, max %.1f KB" % (
+    s["updates"], s["mean_update_bytes"] / 1024.0, s["max_update_bytes"] / 1024.0)
+  print "  processing p50 %.3f ms, p99 %.3f ms, latency p50 %.3f ms, p99 %.3f ms" % (
+    s["processing_p50_ms"], s["processing_p99_ms"], s["p50_ms"], s["p99_ms"])
+  print "  %.1f packet_ins/s answered" % s["packets_per_sec"]
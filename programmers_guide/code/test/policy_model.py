@@ -0,0 +1,151 @@
+# policy_model
+# Works out what the switches would do with a packet, from the policies apps push.
+#
+# Frenetic compiles the union of every client id's policy into flow tables, and only
+# packets the tables send to a pipe reach the app as packet_ins.  PolicyModel keeps the
+# latest JSON policy for each client id and evaluates it directly on a packet, following
+# the REST syntax in the NetKAT reference chapter.  Only the headers a policy can test are
+# looked at, and the answer is cached for each combination of them until the next update,
+# so traffic between the same hosts is only evaluated once.
+
+import sys, json, socket, struct, collections, operator
+sys.path.append("../common")
+from lazy_packet import LazyPacket
+
+HEADERS = [ "switch", "location", "ethsrc", "ethdst", "vlan", "vlanpcp", "ethtype",
+  "ipproto", "ip4src", "ip4dst", "tcpsrcport", "tcpdstport" ]
+
+# LazyPacket reads its frame from a payload's data
+NotBuffered = collections.namedtuple("NotBuffered", ["data"])
+
+def mac_int(mac):
+  return int(mac.replace(":", ""), 16)
+
+def ip_int(ip):
+  return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+def headers_of(dpid, port_id, data):
+  pkt = LazyPacket(dpid, port_id, NotBuffered(data))
+  headers = {
+    "switch": dpid, "location": ("physical", port_id),
+    "ethsrc": mac_int(pkt.ethSrc), "ethdst": mac_int(pkt.ethDst),
+    "vlan": pkt.vlan, "vlanpcp": pkt.vlanPcp, "ethtype": pkt.ethType,
+    "ipproto": pkt.ipProto, "tcpsrcport": pkt.tcpSrcPort, "tcpdstport": pkt.tcpDstPort,
+  }
+  headers["ip4src"] = ip_int(pkt.ip4Src) if pkt.ip4Src != None else None
+  headers["ip4dst"] = ip_int(pkt.ip4Dst) if pkt.ip4Dst != None else None
+  return headers
+
+# Header values as they appear in headers_of
+def value_of(header, value):
+  if header == "location":
+    return (value["type"], value.get("port", value.get("name")))
+  if header in ("ip4src", "ip4dst"):
+    return ip_int(value["addr"])
+  # The Python bindings write switch ids and MACs, which can be 64 bits, as strings
+  if header in ("switch", "ethsrc", "ethdst") and isinstance(value, basestring):
+    return mac_int(value) if ":" in value else int(value)
+  return value
+
+def test(pred, pkt):
+  typ = pred["type"]
+  if typ == "test":
+    header = pred["header"].lower()
+    value = pred["value"]
+    if header in ("ip4src", "ip4dst"):
+      if pkt[header] == None:
+        return False
+      mask = (0xffffffff << (32 - value.get("mask", 32))) & 0xffffffff
+      return pkt[header] & mask == ip_int(value["addr"]) & mask
+    return pkt[header] == value_of(header, value)
+  elif typ == "true":
+    return True
+  elif typ == "false":
+    return False
+  elif typ == "and":
+    return all( test(p, pkt) for p in pred["preds"] )
+  elif typ == "or":
+    return any( test(p, pkt) for p in pred["preds"] )
+  elif typ == "neg":
+    return not test(pred["pred"], pkt)
+  raise ValueError("Can't evaluate predicate of type " + typ)
+
+# The list of packets pol turns pkt into
+def evaluate(pol, pkt):
+  typ = pol["type"]
+  if typ == "filter":
+    return [ pkt ] if test(pol["pred"], pkt) else []
+  elif typ == "mod":
+    header = pol["header"].lower()
+    out = dict(pkt)
+    out[header] = value_of(header, pol["value"])
+    return [ out ]
+  elif typ == "union":
+    return [ out for p in pol["pols"] for out in evaluate(p, pkt) ]
+  elif typ == "seq":
+    pkts = [ pkt ]
+    for p in pol["pols"]:
+      pkts = [ out for q in pkts for out in evaluate(p, q) ]
+      if pkts == []:
+        break
+    return pkts
+  raise ValueError("Can't evaluate policy of type " + typ)
+
+# How many flow table entries a switch needs for pol, compiled into one table.  Each value
+# a test can match takes its own entry: a filter on a set of n MACs is n entries, not one,
+# and a filter inside another multiplies them.  A negated test is one catch-all entry
+# below the entries it excludes, and actions on the same packets share an entry.  This
+# counts what Frenetic's compiler would emit without merging or optimizing entries.
+def flow_entries(pol):
+  typ = pol["type"]
+  if typ == "filter":
+    return matches(pol["pred"])
+  elif typ == "mod":
+    return 1
+  elif typ == "union":
+    if all( p["type"] == "mod" for p in pol["pols"] ):
+      return 1
+    return sum( flow_entries(p) for p in pol["pols"] )
+  elif typ == "seq":
+    return reduce(operator.mul, [ flow_entries(p) for p in pol["pols"] ], 1)
+  raise ValueError("Can't count entries for policy of type " + typ)
+
+def matches(pred):
+  typ = pred["type"]
+  if typ in ("test", "true", "neg"):
+    return 1
+  elif typ == "false":
+    return 0
+  elif typ == "or":
+    return sum( matches(p) for p in pred["preds"] )
+  elif typ == "and":
+    return reduce(operator.mul, [ matches(p) for p in pred["preds"] ], 1)
+  raise ValueError("Can't count entries for predicate of type " + typ)
+
+class PolicyModel(object):
+
+  def __init__(self, max_cached=100000):
+    self.max_cached = max_cached
+    # client id => parsed policy
+    self.policies = {}
+    # tuple of header values => whether the packet goes to the controller
+    self.cache = {}
+
+  def update(self, client_id, policy_json):
+    self.policies[client_id] = json.loads(policy_json)
+    self.cache.clear()
+
+  def punts(self, dpid, port_id, data):
+    # Until the app says otherwise, everything goes to the controller
+    if self.policies == {}:
+      return True
+    pkt = headers_of(dpid, port_id, data)
+    key = tuple( pkt[h] for h in HEADERS )
+    punt = self.cache.get(key)
+    if punt == None:
+      punt = any( out["location"][0] == "pipe"
+        for pol in self.policies.values() for out in evaluate(pol, pkt) )
+      if len(self.cache) >= self.max_cached:
+        self.cache.clear()
+      self.cache[key] = punt
+    return punt
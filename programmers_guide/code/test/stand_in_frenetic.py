@@ -0,0 +1,301 @@
+# stand_in_frenetic
+# A pure-Python stand-in for the Frenetic HTTP controller, so apps can run without Mininet,
+# OVS, sudo or frenetic.native.
+#
+# StandInFrenetic answers the REST verbs frenetic.App uses: event, update_json, pkt_out,
+# current_switches, query and port_stats.  It reports the switches and ports you give it,
+# and once the app has asked for its first event, it turns frames into packet_ins.
+# Frames come from any iterable of (at, dpid, port_id, data), where at is when to send
+# the frame, in seconds after the start, or None to send it as soon as the app is ready
+# for it.  paced() makes a steady stream out of a list.  Frames are read as they're
+# needed and at most max_queued packet_ins wait for the app, so a stream can be as long
+# as you like.
+#
+# Each packet_in carries a sequence number in its last 8 bytes, so when a pkt_out of that
+# frame comes back we know which packet_in it answers.  Latency is counted from when the
+# packet_in was queued, so an app that can't keep up shows it in the tail, and processing
+# time from when the app picked it up.  Both go in Histograms.  pkt_outs of frames the
+# app made itself, like ARP replies, are counted but not timed.  Updates are counted
+# with their sizes.  Queries and port_stats answer zeros.
+#
+# Given a PolicyModel as policy_model, frames the app's policy would handle in the switch
+# are counted as switched, and only the rest become packet_ins.
+#
+# Given links, as [ (dpid, dpid, port_id, port_id), ... ] like bench_path_engine.py's
+# fabric() makes, a pkt_out out of one end of a link comes in at the other end, as a
+# packet_in if the policy would punt it there.  That's how LLDP probes find the links
+# (see topology_discovery.py).  These are counted as looped.
+#
+# run() finishes when the frames have run out and every packet_in has been answered, or
+# given up on after grace seconds, and returns summary().
+
+import sys, json, time, base64, struct, socket, collections
+from tornado import gen, web
+from tornado.concurrent import Future
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+sys.path.append("../common")
+from hot_path_timer import Histogram
+
+TAG_LENGTH = 8
+TAG_MODULUS = 10 ** TAG_LENGTH
+
+def mac_bytes(mac):
+  return "".join( chr(int(b, 16)) for b in mac.split(":") )
+
+def ip_checksum(header):
+  total = sum(struct.unpack("!10H", header))
+  total = (total >> 16) + (total & 0xffff)
+  total += total >> 16
+  return ~total & 0xffff
+
+# An Ethernet/IPv4/TCP frame with room for the sequence number as its TCP payload
+def tcp_frame(eth_src, eth_dst, ip_src, ip_dst, tcp_src, tcp_dst, vlan=None):
+  eth = mac_bytes(eth_dst) + mac_bytes(eth_src)
+  if vlan != None:
+    eth += struct.pack("!HH", 0x8100, vlan)
+  eth += struct.pack("!H", 0x800)
+  header = struct.pack("!BBHHHBBH4s4s",
+    0x45, 0, 20 + 20 + TAG_LENGTH, 0, 0, 64, 6, 0,
+    socket.inet_aton(ip_src), socket.inet_aton(ip_dst)
+  )
+  header = header[:10] + struct.pack("!H", ip_checksum(header)) + header[12:]
+  tcp = struct.pack("!HHIIBBHHH", tcp_src, tcp_dst, 0, 0, 5 << 4, 0x02, 8192, 0, 0)
+  return eth + header + tcp
+
+# (dpid, port_id, data) frames, rate per second
+def paced(frames, rate):
+  for (i, (dpid, port_id, data)) in enumerate(frames):
+    yield (i / float(rate), dpid, port_id, data)
+
+class StandInFrenetic(object):
+
+  # switches is { dpid: [port_id, ...] }.  settle is how long to let the app take in the
+  # switch list before the packets start.
+  def __init__(self, switches, frames, settle=1.0, grace=10.0, max_queued=1000,
+    policy_model=None, links=[]):
+    self.switches = switches
+    self.frames = iter(frames)
+    self.settle = settle
+    self.grace = grace
+    self.max_queued = max_queued
+    self.policy_model = policy_model
+    # Each end of each link: { (dpid, port_id): (dpid, port_id), ... }
+    self.peers = {}
+    for (a, b, a_port, b_port) in links:
+      self.peers[(a, a_port)] = (b, b_port)
+      self.peers[(b, b_port)] = (a, a_port)
+
+    # Sequence number => [time queued, time the app picked it up] for each packet_in not
+    # yet answered, oldest first
+    self.outstanding = collections.OrderedDict()
+    self.latency = Histogram()
+    self.processing = Histogram()
+    self.read = 0
+    self.switched = 0
+    self.punted = 0
+    self.answered = 0
+    self.other_pkt_outs = 0
+    self.looped = 0
+    self.last_answered = None
+    # Only updates sent once packets are flowing are counted
+    self.updates = 0
+    self.update_bytes = 0
+    self.max_update_bytes = 0
+
+    self.next_frame = None
+    self.exhausted = False
+    self.events = collections.deque()
+    self.waiting = collections.deque()
+    self.first_poll = None
+    self.started = None
+    self.finished = None
+    self.done = Future()
+    controller = self
+
+    class Version(web.RequestHandler):
+      def get(self):
+        self.write("4.1")
+
+    class Event(web.RequestHandler):
+      @gen.coroutine
+      def get(self, client_id):
+        controller.poll()
+        ftr = Future()
+        controller.waiting.append(ftr)
+        controller.hand_out()
+        self.write((yield ftr))
+
+    class Update(web.RequestHandler):
+      def post(self, client_id):
+        controller.update(client_id, self.request.body)
+
+    class PktOut(web.RequestHandler):
+      def post(self):
+        controller.pkt_out(json.loads(self.request.body))
+
+    class Switches(web.RequestHandler):
+      def get(self):
+        self.write(json.dumps(
+          [ { "switch_id": dpid, "ports": ports } for (dpid, ports) in controller.switches.items() ]
+        ))
+
+    class Query(web.RequestHandler):
+      def get(self, label):
+        self.write(json.dumps({ "packets": 0, "bytes": 0 }))
+
+    class PortStats(web.RequestHandler):
+      def get(self, switch_id, port_id):
+        stats = dict( (field, 0) for field in [ "rx_packets", "tx_packets", "rx_bytes",
+          "tx_bytes", "rx_dropped", "tx_dropped", "rx_errors", "tx_errors" ] )
+        stats["port_no"] = int(port_id)
+        self.write(json.dumps(stats))
+
+    self.server = HTTPServer(web.Application([
+      (r"/version", Version), (r"/([^/]+)/event", Event),
+      (r"/([^/]+)/update_json", Update), (r"/pkt_out", PktOut),
+      (r"/current_switches", Switches), (r"/query/([^/]+)", Query),
+      (r"/port_stats/([^/]+)/([^/]+)", PortStats)
+    ]))
+
+  def poll(self):
+    if self.first_poll == None:
+      self.first_poll = time.time()
+      IOLoop.instance().call_later(self.settle, self.start)
+
+  def start(self):
+    self.started = time.time()
+    self.arrivals = PeriodicCallback(self.arrive, 1)
+    self.arrivals.start()
+
+  def arrive(self):
+    now = time.time()
+    elapsed = now - self.started
+    while not self.exhausted and len(self.events) < self.max_queued:
+      if self.next_frame == None:
+        self.next_frame = next(self.frames, None)
+        if self.next_frame == None:
+          self.exhausted = True
+          break
+      (at, dpid, port_id, data) = self.next_frame
+      if at != None and at > elapsed:
+        break
+      self.next_frame = None
+      self.read += 1
+      if self.policy_model != None and not self.policy_model.punts(dpid, port_id, data):
+        self.switched += 1
+        continue
+      seq = self.punted % TAG_MODULUS
+      self.punted += 1
+      self.outstanding[seq] = [now, None]
+      self.events.append( (seq, json.dumps({
+        "type": "packet_in", "switch_id": dpid, "port_id": port_id,
+        "payload": { "id": None, "buffer": base64.b64encode(data + "%08d" % seq) }
+      })) )
+    self.hand_out()
+    # Give up on packet_ins the app has dropped
+    while self.outstanding and next(iter(self.outstanding.values()))[0] < now - self.grace:
+      self.outstanding.popitem(last=False)
+    if self.exhausted and not self.outstanding:
+      self.finish()
+
+  def hand_out(self):
+    while self.events and self.waiting:
+      (seq, event) = self.events.popleft()
+      if seq in self.outstanding:
+        self.outstanding[seq][1] = time.time()
+      self.waiting.popleft().set_result(event)
+
+  def update(self, client_id, policy_json):
+    if self.policy_model != None:
+      self.policy_model.update(client_id, policy_json)
+    if self.started != None:
+      self.updates += 1
+      self.update_bytes += len(policy_json)
+      self.max_update_bytes = max(self.max_update_bytes, len(policy_json))
+
+  def pkt_out(self, body):
+    data = body["payload"].get("data")
+    seq = None
+    if data != None:
+      tag = base64.b64decode(data)[-TAG_LENGTH:]
+      if tag.isdigit() and int(tag) in self.outstanding:
+        seq = int(tag)
+    if seq == None and self.loop_back(body):
+      return
+    if seq == None:
+      self.other_pkt_outs += 1
+      return
+    now = time.time()
+    (queued, picked_up) = self.outstanding.pop(seq)
+    self.latency.record(now - queued)
+    if picked_up != None:
+      self.processing.record(now - picked_up)
+    self.answered += 1
+    self.last_answered = now
+    if self.exhausted and not self.outstanding:
+      self.finish()
+
+  # Sends a pkt_out out of the ends of links on to the far end.  Returns True if any of
+  # its ports were ends of links.
+  def loop_back(self, body):
+    data = body["payload"].get("data")
+    ports = [ pol["value"]["port"] for pol in body["policies"]
+      if pol.get("header") == "location" and pol["value"]["type"] == "physical" ]
+    peers = [ self.peers[(body["switch"], port_id)] for port_id in ports
+      if (body["switch"], port_id) in self.peers ]
+    if data == None or peers == []:
+      return False
+    for (dpid, port_id) in peers:
+      self.looped += 1
+      frame = base64.b64decode(data)
+      if self.policy_model != None and not self.policy_model.punts(dpid, port_id, frame):
+        continue
+      self.events.append( (None, json.dumps({
+        "type": "packet_in", "switch_id": dpid, "port_id": port_id,
+        "payload": { "id": None, "buffer": data }
+      })) )
+    self.hand_out()
+    return True
+
+  def finish(self):
+    if self.finished == None:
+      self.finished = time.time()
+      self.arrivals.stop()
+      self.done.set_result(self.summary())
+
+  def summary(self):
+    start = self.started or time.time()
+    end = self.last_answered or self.finished or time.time()
+    elapsed = max(end - start, 0.001)
+    return {
+      "packets": self.read,
+      "switched": self.switched,
+      "punted": self.punted,
+      "answered": self.answered,
+      "other_pkt_outs": self.other_pkt_outs,
+      "looped": self.looped,
+      "elapsed": elapsed,
+      "packets_per_sec": self.answered / elapsed,
+      "p50_ms": self.latency.percentile(50) / 1e6,
+      "p99_ms": self.latency.percentile(99) / 1e6,
+      "processing_p50_ms": self.processing.percentile(50) / 1e6,
+      "processing_p99_ms": self.processing.percentile(99) / 1e6,
+      "updates": self.updates,
+      "updates_per_sec": self.updates / elapsed,
+      "mean_update_bytes": self.update_bytes / self.updates if self.updates else 0,
+      "max_update_bytes": self.max_update_bytes,
+    }
+
+  def listen(self, port):
+    self.server.listen(port, address="127.0.0.1")
+
+  def stop(self):
+    self.server.stop()
+
+  @gen.coroutine
+  def run(self, port):
+    self.listen(port)
+    summary = yield self.done
+    self.stop()
+    raise gen.Return(summary)
@@ -0,0 +1,138 @@
+# Tests that NetworkInformationBaseFromFile with use_ecmp finds every shortest path
+# between switches, and spreads hosts evenly over those paths on the core switches, as
+# hosts come and go and links go down.
+#
+#   python test_ecmp.py
+
+import sys, os, random, tempfile, logging
+sys.path.append("../multiswitch_topologies")
+from network_information_base_from_file import NetworkInformationBaseFromFile
+from bench_path_engine import fat_tree, write_dot
+sys.path.append("../common")
+from topology_cache import cache_path
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+# As a 48-bit int, the way the NIB keeps it: 02:00:00:00:00:01 and so on
+def mac_for(i):
+  return 0x020000000000 | (i & 0xffff)
+
+def learn_hosts(nib, n_hosts):
+  edges = sorted(nib.edge_switches)
+  for i in range(n_hosts):
+    nib.learn(mac_for(i), edges[i % len(edges)], 2 + i / len(edges))
+
+def distances_to(nib, dest_dpid):
+  distance = { dest_dpid: 0 }
+  frontier = [ dest_dpid ]
+  while frontier != []:
+    sw = frontier.pop(0)
+    for neighbor in nib.port_mappings[sw]:
+      if neighbor not in distance and (sw, neighbor) not in nib.down_links:
+        distance[neighbor] = distance[sw] + 1
+        frontier.append(neighbor)
+  return distance
+
+# Every port towards a neighbor one hop closer, and nothing else
+def shortest_paths_match(nib):
+  for dest_dpid in nib.edge_switches:
+    distance = distances_to(nib, dest_dpid)
+    expected = {}
+    for sw in distance:
+      ports = [ port for (neighbor, port) in nib.port_mappings[sw].items()
+        if (sw, neighbor) not in nib.down_links and distance.get(neighbor) == distance[sw] - 1 ]
+      if ports != []:
+        expected[sw] = tuple(sorted(ports))
+    if nib.ecmp_next_hops_to[dest_dpid] != expected:
+      return False
+  return True
+
+# Each core switch files every host it can reach once, under the one of its equal cost
+# ports that path_choice picks
+def groups_match(nib):
+  for core_dpid in nib.core_switches:
+    expected = {}
+    for (m, (dpid, port_id)) in nib.location.iteritems():
+      ports = nib.ecmp_next_hops_to[dpid].get(core_dpid)
+      if ports != None:
+        expected.setdefault(ports[nib.path_choice(m, core_dpid, len(ports))], []).append(m)
+    groups = dict( (port, macs) for (port, macs) in nib.next_hop_groups(core_dpid) if macs != [] )
+    if groups != dict( (port, sorted(macs)) for (port, macs) in expected.items() ):
+      return False
+  return True
+
+def consistent(nib):
+  return shortest_paths_match(nib) and groups_match(nib)
+
+def test_fat_tree(path):
+  passed = True
+  nib = NetworkInformationBaseFromFile(logging, path, use_ecmp=True)
+  learn_hosts(nib, 64)
+  passed &= check("shortest paths", shortest_paths_match(nib))
+  passed &= check("hosts grouped by their ports", groups_match(nib))
+
+  # In a 4-ary fat-tree, switch 5 is pod 0's first aggregation switch, with spines 1 and
+  # 2 on ports 1 and 2, and 7 is a top-of-rack switch under it
+  far_edge = max(nib.edge_switches)
+  passed &= check("aggregation switches use every spine",
+    nib.ecmp_next_hops_to[far_edge][5] == (1, 2), str(nib.ecmp_next_hops_to[far_edge][5]))
+  passed &= check("top-of-rack switches use every aggregation switch",
+    len(nib.ecmp_next_hops_to[far_edge][7]) == 2)
+  # The hosts switch 5 reaches through the spines split between them
+  far_macs = set( m for (m, (dpid, port_id)) in nib.location.iteritems()
+    if nib.ecmp_next_hops_to[dpid].get(5) == (1, 2) )
+  spread = [ len(macs) for (port, macs) in nib.next_hop_groups(5) if port in (1, 2) ]
+  passed &= check("hosts are about even over the ports",
+    sum(spread) == len(far_macs) and min(spread) >= len(far_macs) / 3, str(spread))
+
+  for i in range(0, 64, 3):
+    nib.unlearn(mac_for(i))
+  passed &= check("unlearning keeps groups", groups_match(nib))
+
+  nib.link_down(5, 1)
+  passed &= check("a down link leaves the paths", nib.ecmp_next_hops_to[far_edge][5] == (2,) and
+    consistent(nib))
+  nib.link_up(5, 1)
+  passed &= check("and comes back", nib.ecmp_next_hops_to[far_edge][5] == (1, 2) and consistent(nib))
+  return passed
+
+def test_random_failures(path):
+  nib = NetworkInformationBaseFromFile(logging, path, use_ecmp=True)
+  learn_hosts(nib, 64)
+  rng = random.Random(3)
+  links = sorted( (sw, port) for sw in nib.core_switches for port in nib.port_mappings[sw].values() )
+  for i in range(30):
+    (dpid, port_id) = rng.choice(links)
+    if rng.random() < 0.6:
+      nib.link_down(dpid, port_id)
+    else:
+      nib.link_up(dpid, port_id)
+    if not consistent(nib):
+      return check("random failures", False, "after change " + str(i))
+  return check("random failures", True)
+
+def test_tree_unchanged(path):
+  nib = NetworkInformationBaseFromFile(logging, path)
+  learn_hosts(nib, 16)
+  return check("without use_ecmp, hosts follow the spanning tree",
+    all( nib.next_hop_port(m, core_dpid) == port
+      for core_dpid in nib.core_switches for (port, macs) in nib.next_hop_groups(core_dpid) for m in macs )
+    and nib.ecmp_next_hops_to == {})
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.ERROR)
+  passed = True
+  (switches, edges) = fat_tree(4)
+  (fd, path) = tempfile.mkstemp(suffix=".dot")
+  os.close(fd)
+  try:
+    write_dot(path, switches, edges)
+    for test in [ test_fat_tree, test_random_failures, test_tree_unchanged ]:
+      passed &= test(path)
+  finally:
+    for p in [ path, cache_path(path, "multiswitch") ]:
+      if os.path.exists(p):
+        os.remove(p)
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,78 @@
+# Tests that HostLocations replicas agree however their changes interleave.  The
+# dispatcher is played by a list: changes are relayed to every replica in the order
+# they were published.
+#
+#   python test_host_locations.py
+
+import sys
+sys.path.append("../common")
+from sharding import HostLocations
+
+class Replica(object):
+  def __init__(self, relay):
+    self.nib = {}
+    self.store = HostLocations(relay.append, self.learned, self.unlearned)
+
+  def learned(self, mac, dpid, port_id, extra):
+    self.nib[mac] = (dpid, port_id)
+
+  def unlearned(self, mac):
+    del self.nib[mac]
+
+  # What the app does when it learns a host itself
+  def learn(self, mac, dpid, port_id):
+    self.nib[mac] = (dpid, port_id)
+    self.store.learn(mac, dpid, port_id)
+
+  def unlearn(self, mac):
+    self.nib.pop(mac, None)
+    self.store.unlearn(mac)
+
+def relay_all(relay, replicas):
+  while relay != []:
+    change = relay.pop(0)
+    for r in replicas:
+      r.store.apply(list(change))
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+def test_learn_spreads():
+  relay = []
+  replicas = [ Replica(relay) for i in range(3) ]
+  replicas[0].learn("02:00:00:00:00:01", 4, 2)
+  replicas[2].learn("02:00:00:00:00:02", 7, 3)
+  relay_all(relay, replicas)
+  return check("learned hosts reach every replica",
+    all( r.nib == { "02:00:00:00:00:01": (4, 2), "02:00:00:00:00:02": (7, 3) } for r in replicas ),
+    str([ r.nib for r in replicas ]))
+
+def test_racing_moves():
+  relay = []
+  replicas = [ Replica(relay) for i in range(3) ]
+  # Two replicas see the same host in different places before hearing from each other
+  replicas[0].learn("02:00:00:00:00:01", 4, 2)
+  replicas[1].learn("02:00:00:00:00:01", 5, 2)
+  relay_all(relay, replicas)
+  return check("racing learns settle on the last one relayed",
+    all( r.nib == { "02:00:00:00:00:01": (5, 2) } for r in replicas ),
+    str([ r.nib for r in replicas ]))
+
+def test_unlearn():
+  relay = []
+  replicas = [ Replica(relay) for i in range(2) ]
+  replicas[0].learn("02:00:00:00:00:01", 4, 2)
+  relay_all(relay, replicas)
+  replicas[1].unlearn("02:00:00:00:00:01")
+  replicas[1].unlearn("02:00:00:00:00:01")
+  relay_all(relay, replicas)
+  return check("unlearning reaches every replica, once",
+    all( r.nib == {} for r in replicas ) and all( len(r.store) == 0 for r in replicas ),
+    str([ r.nib for r in replicas ]))
+
+if __name__ == '__main__':
+  passed = True
+  for test in [ test_learn_spreads, test_racing_moves, test_unlearn ]:
+    passed = test() and passed
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,54 @@
+# Tests HotPathTimer's histograms, and that disabling it puts every method back.
+#
+#   python test_hot_path_timer.py
+
+import sys, logging
+sys.path.append("../common")
+from hot_path_timer import Histogram, HotPathTimer
+
+class Parser(object):
+  @staticmethod
+  def parse(x):
+    return x + 1
+
+class Handler(object):
+  def handle(self, x):
+    return Parser.parse(x) * 2
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+def test_percentiles():
+  h = Histogram()
+  # 1us to 10ms, evenly
+  for i in range(1, 10001):
+    h.record(i / 1e6)
+  p50 = h.percentile(50) / 1000.0
+  p99 = h.percentile(99) / 1000.0
+  return check("percentiles are within 2%",
+    abs(p50 - 5000) / 5000 < 0.02 and abs(p99 - 9900) / 9900 < 0.02 and h.max == 10000000,
+    str((p50, p99, h.max)))
+
+def test_enable_disable():
+  handler = Handler()
+  original_parse = Parser.__dict__["parse"]
+  timer = HotPathTimer(logging, [
+    ("parse", Parser, "parse"), ("handle", handler, "handle")
+  ], summary_interval=None, toggle_signal=None)
+  timer.enable()
+  results = [ handler.handle(i) for i in range(100) ]
+  stats = timer.stats()
+  timer.disable()
+  handler.handle(1)
+  return check("enabled stages are timed", results == [ (i + 1) * 2 for i in range(100) ] and
+      stats["parse"]["count"] == 100 and stats["handle"]["count"] == 100, str(stats)) and \
+    check("disabled stages are put back", Parser.__dict__["parse"] is original_parse and
+      "handle" not in vars(handler) and timer.stats()["handle"]["count"] == 100)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = True
+  for test in [ test_percentiles, test_enable_disable ]:
+    passed = test() and passed
+  sys.exit(0 if passed else 1)
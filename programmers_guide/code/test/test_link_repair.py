@@ -0,0 +1,204 @@
+# Tests that NetworkInformationBaseFromFile repairs its spanning tree as links between
+# switches go down and come back: next hops and core switch groups match what computing
+# them from scratch gives, and every core switch still reaches every host it can.  Then
+# that MultiswitchApp3 rebuilds only the switches a port going down or up changes.
+#
+#   python test_link_repair.py
+
+import sys, os, copy, random, tempfile, logging
+sys.path.append("../multiswitch_topologies")
+from network_information_base_from_file import NetworkInformationBaseFromFile
+from bench_path_engine import fabric, write_dot
+from bench_policy_cache import new_app, learn_host
+from multiswitch3 import MultiswitchApp3
+sys.path.append("../common")
+from topology_cache import cache_path
+from policy_cache import PolicyCache
+
+TOPOLOGY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+  "../multiswitch_topologies/multiswitch_topo.dot")
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+# As a 48-bit int, the way the NIB keeps it: 02:00:00:00:00:01 and so on
+def mac_for(i):
+  return 0x020000000000 | (i & 0xffff)
+
+def learn_hosts(nib, n_hosts):
+  edges = sorted(nib.edge_switches)
+  for i in range(n_hosts):
+    nib.learn(mac_for(i), edges[i % len(edges)], 10 + i % 3)
+
+def live_components(nib):
+  component = {}
+  for start in nib.port_mappings:
+    if start in component:
+      continue
+    component[start] = start
+    frontier = [ start ]
+    while frontier != []:
+      sw = frontier.pop()
+      for neighbor in nib.port_mappings[sw]:
+        if neighbor not in component and (sw, neighbor) not in nib.down_links:
+          component[neighbor] = start
+          frontier.append(neighbor)
+  return component
+
+# Follows next hops from every core switch to every switch with hosts.  Returns the first
+# pair that should be connected but isn't, or is reached over a link that's down.
+def unreachable(nib):
+  component = live_components(nib)
+  for core_dpid in nib.core_switches:
+    for dpid in nib.macs_on_switch:
+      if component[core_dpid] != component[dpid]:
+        continue
+      sw = core_dpid
+      for hop in range(len(component)):
+        if sw == dpid:
+          break
+        port = nib.next_hop_port_to(sw, dpid, None)
+        neighbor = nib.neighbor_on_port(sw, port) if port != None else None
+        if neighbor == None or (sw, neighbor) in nib.down_links:
+          return (core_dpid, dpid)
+        sw = neighbor
+      if sw != dpid:
+        return (core_dpid, dpid)
+  return None
+
+# Incremental repairs should leave what compute_next_hops would work out for the tree
+def matches_recompute(nib):
+  if nib.path_engine != None:
+    return True
+  next_hops_to = copy.deepcopy(nib.next_hops_to)
+  groups = copy.deepcopy(nib.macs_by_next_hop)
+  nib.compute_next_hops()
+  groups = dict( (sw, g) for (sw, g) in groups.items() if g != {} )
+  recomputed = dict( (sw, g) for (sw, g) in nib.macs_by_next_hop.items() if g != {} )
+  return next_hops_to == nib.next_hops_to and groups == recomputed
+
+def tree_is_spanning(nib):
+  component = live_components(nib)
+  live_tree = all( (a, b) not in nib.down_links for (a, b) in tree_edges(nib) )
+  return live_tree and len(tree_edges(nib)) == len(component) - len(set(component.values()))
+
+def tree_edges(nib):
+  return nib.path_engine.tree_edges() if nib.path_engine != None else nib.tree_edges
+
+def consistent(nib):
+  return tree_is_spanning(nib) and unreachable(nib) == None and matches_recompute(nib)
+
+def test_guide_topology():
+  passed = True
+  nib = NetworkInformationBaseFromFile(logging, TOPOLOGY)
+  learn_hosts(nib, 60)
+  # The tree holds 1 -- 2 and 1 -- 6 but not 2 -- 6
+  changed = nib.link_down(1, nib.port_mappings[1][2])
+  passed &= check("replacement link joins the tree", 6 in nib.tree[2] and 2 not in nib.tree[1],
+    str(nib.tree_edges))
+  passed &= check("next hops repaired", consistent(nib))
+  passed &= check("changed switches reported", set([1, 2, 6]) <= changed, str(changed))
+
+  changed = nib.link_down(3, nib.uplink_port[3])
+  passed &= check("a cut off edge switch is unreachable",
+    nib.next_hop_port(mac_for(0), 1) == None and consistent(nib))
+  passed &= check("its hosts leave the core groups",
+    all( mac_for(0) not in macs
+      for core_dpid in nib.core_switches for (port, macs) in nib.next_hop_groups(core_dpid) ))
+
+  nib.link_up(3, nib.uplink_port[3])
+  passed &= check("a link back up joins it again",
+    nib.next_hop_port(mac_for(0), 1) != None and consistent(nib))
+  nib.link_up(1, nib.port_mappings[1][2])
+  passed &= check("a spare link coming back leaves the tree alone",
+    2 not in nib.tree[1] and consistent(nib))
+  passed &= check("ports that aren't links are ignored", nib.link_down(3, 1) == set())
+  return passed
+
+def test_random_failures(use_path_engine):
+  (switches, edges) = fabric(200)
+  (fd, path) = tempfile.mkstemp(suffix=".dot")
+  os.close(fd)
+  try:
+    write_dot(path, switches, edges)
+    nib = NetworkInformationBaseFromFile(logging, path, use_path_engine)
+    learn_hosts(nib, 500)
+    rng = random.Random(7)
+    links = [ (a, a_port) for (a, b, a_port, b_port) in edges ]
+    for i in range(60):
+      (dpid, port_id) = rng.choice(links)
+      if nib.neighbor_on_port(dpid, port_id) == None:
+        continue
+      if rng.random() < 0.7:
+        nib.link_down(dpid, port_id)
+      else:
+        nib.link_up(dpid, port_id)
+      if not consistent(nib):
+        return check("random failures with use_path_engine=" + str(use_path_engine), False,
+          "after change " + str(i))
+    return check("random failures with use_path_engine=" + str(use_path_engine), True)
+  finally:
+    for p in [ path, cache_path(path, "multiswitch") ]:
+      if os.path.exists(p):
+        os.remove(p)
+
+class PortEventApp(MultiswitchApp3):
+  topology_file = TOPOLOGY
+
+  def policy_for_core_switch(self, core_dpid, learned_macs):
+    self.built.add(core_dpid)
+    return MultiswitchApp3.policy_for_core_switch(self, core_dpid, learned_macs)
+
+  def policy_for_edge_switch(self, dpid):
+    self.built.add(dpid)
+    return MultiswitchApp3.policy_for_edge_switch(self, dpid)
+
+# Keeps the policy it would have sent
+class RecordingCache(PolicyCache):
+  def update(self, app, policy, client_id=None):
+    self.pushed = self.to_json_text(policy)
+    self.sweep()
+
+# Pushes what port_event does to app, and checks it against building every switch again
+def rebuilt_after(app, port_event, dpid, port_id):
+  app.built = set()
+  port_event(dpid, port_id)
+  built = set(app.built)
+  pushed = app.policies.pushed
+  full = PolicyCache().to_json_text(app.policy())
+  app.policies.sweep()
+  return (built, pushed == full)
+
+def test_app_port_events():
+  passed = True
+  app = new_app(PortEventApp)
+  app.policies = RecordingCache()
+  app.built = set()
+  for i in range(60):
+    learn_host(app, i)
+  app.update_policy()
+  cores = set(app.nib.core_switch_dpids())
+  everything = cores | set(app.nib.edge_switch_dpids())
+
+  # The tree holds 1 -- 2, and 2 -- 6 replaces it
+  (built, same) = rebuilt_after(app, app.port_down, 1, app.nib.port_mappings[1][2])
+  passed &= check("a tree link going down rebuilds only the switches it changes",
+    same and set([1, 2, 6]) <= built < everything, str(built))
+  (built, same) = rebuilt_after(app, app.port_up, 1, app.nib.port_mappings[1][2])
+  passed &= check("a spare link coming back rebuilds only its switch", same and built == set([1]),
+    str(built))
+  (dpid, port_id) = app.nib.location_of(app.nib.all_learned_macs()[0])
+  (built, same) = rebuilt_after(app, app.port_down, dpid, port_id)
+  passed &= check("a host port going down rebuilds its switch and the core switches",
+    same and built == cores | set([ dpid ]), str(built))
+  return passed
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.ERROR)
+  passed = True
+  passed &= test_guide_topology()
+  passed &= test_random_failures(False)
+  passed &= test_random_failures(True)
+  passed &= test_app_port_events()
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,74 @@
+# Tests that MacAger checks query counters host by host: a query that fails or never
+# answers puts its host back on the wheel, rather than stranding the others or losing the
+# host.  Frenetic is stood in for by an app whose query() hands back a Future the test
+# resolves, or doesn't, so this needs neither Mininet nor sudo.
+#
+#   python test_mac_aging.py
+
+import sys, logging
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+sys.path.append("../common")
+from mac_aging import MacAger
+
+class StandInApp(object):
+  def __init__(self):
+    # query label => Future for each query made
+    self.queries = {}
+
+  def query(self, label):
+    ftr = Future()
+    self.queries[label] = ftr
+    return ftr
+
+class StandInNIB(object):
+  def __init__(self):
+    self.unlearned = []
+
+  def set_aging(self, ager):
+    pass
+
+  def unlearn(self, mac):
+    self.unlearned.append(mac)
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+@gen.coroutine
+def test_each_query_on_its_own():
+  app = StandInApp()
+  nib = StandInNIB()
+  expired = []
+  ager = MacAger(app, nib, logging, expired.append, max_age=2, tick=1.0,
+    query_label=lambda mac: "count_%d" % mac, query_timeout=0.05)
+  macs = range(1, 5)
+  (idle, busy, failing, silent) = macs
+  for mac in macs:
+    ager.learned(mac)
+  ager.advance()
+  ager.advance()
+  ager.advance()
+  passed = check("every host out of time is queried",
+    sorted(app.queries.keys()) == sorted("count_%d" % mac for mac in macs), str(app.queries.keys()))
+
+  app.queries["count_%d" % failing].set_exception(IOError("HTTP 500"))
+  app.queries["count_%d" % idle].set_result([0, 0])
+  app.queries["count_%d" % busy].set_result([5, 500])
+  yield gen.sleep(0)
+  passed &= check("failed query doesn't wait on the others", failing in ager.wheel.deadline)
+  passed &= check("nothing expires while a query is unanswered", expired == [])
+
+  yield gen.sleep(0.1)
+  passed &= check("idle host expires once every query has settled",
+    expired == [[idle]] and nib.unlearned == [idle], str(expired))
+  passed &= check("busy host stays", busy in ager.wheel.deadline)
+  passed &= check("unanswered host goes back on the wheel", silent in ager.wheel.deadline)
+  passed &= check("failed host goes back on the wheel", failing in ager.wheel.deadline)
+  raise gen.Return(passed)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = IOLoop.instance().run_sync(test_each_query_on_its_own)
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,75 @@
+# Tests that a NIB restored from a NibJournal matches the one that wrote it, before and
+# after compaction, and when the app died partway through a record.
+#
+#   python test_nib_journal.py
+
+import sys, os, shutil, tempfile, logging
+sys.path.append("../common")
+from indexed_nib import IndexedNIB
+from nib_journal import NibJournal
+
+# As a 48-bit int, the way the NIB keeps it: 02:00:00:00:00:01 and so on
+def mac_for(i):
+  return 0x020000000000 | (i & 0xffff)
+
+def state(nib):
+  return sorted( (mac, nib.location_of(mac)) for mac in nib.all_learned_macs() )
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+def restored(path, compact_every=100000):
+  nib = IndexedNIB(logging)
+  journal = NibJournal(path, logging, nib.journal_tables, compact_every)
+  journal.restore_into(nib)
+  return (nib, journal)
+
+# Learn, move and forget some hosts on a journaled NIB
+def churn(nib, start):
+  for i in range(start, start + 100):
+    nib.add_host(mac_for(i), i % 4 + 1, i % 8 + 1)
+  for i in range(start, start + 100, 3):
+    nib.add_host(mac_for(i), 9, 1)
+  for i in range(start, start + 100, 5):
+    nib.unlearn(mac_for(i))
+  nib.add_host(mac_for(start + 1000), None, 2)
+
+def test_restore(path):
+  (nib, journal) = restored(path)
+  churn(nib, 0)
+  journal.close()
+  (again, _) = restored(path)
+  return check("a restart restores the log", state(again) == state(nib), str(len(state(again))))
+
+def test_compaction(path):
+  (nib, journal) = restored(path)
+  churn(nib, 200)
+  journal.compact()
+  churn(nib, 400)
+  journal.close()
+  (again, _) = restored(path)
+  return check("a restart restores the snapshot and the log after it",
+    state(again) == state(nib) and os.path.getsize(path + ".snap") > 0)
+
+def test_partial_record(path):
+  (nib, journal) = restored(path)
+  churn(nib, 600)
+  journal.close()
+  expected = state(nib)
+  with open(path + ".log", "ab") as f:
+    f.write("\0\1\2")
+  (again, _) = restored(path)
+  return check("a partial record at the end is ignored", state(again) == expected)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  directory = tempfile.mkdtemp()
+  path = os.path.join(directory, "nib")
+  passed = True
+  try:
+    for test in [ test_restore, test_compaction, test_partial_record ]:
+      passed = test(path) and passed
+  finally:
+    shutil.rmtree(directory)
+  sys.exit(0 if passed else 1)
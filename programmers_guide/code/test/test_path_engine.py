@@ -0,0 +1,95 @@
+# Tests that PathEngine reads multiswitch_topo.dot the way NetworkInformationBaseFromFile
+# does, and that following its next hops from any switch reaches any other along the
+# spanning tree only.
+#
+#   python test_path_engine.py
+
+import sys, os
+sys.path.append("../multiswitch_topologies")
+from path_engine import PathEngine, read_dot_topology, from_dot
+from bench_path_engine import fabric
+
+TOPOLOGY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+  "../multiswitch_topologies/multiswitch_topo.dot")
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+# Follows next hops from every switch to every other.  Returns the first pair that doesn't
+# arrive, or arrives over a link that isn't on the tree, or None.
+def bad_path(engine):
+  mappings = engine.port_mappings()
+  across = {}
+  for (sw, neighbors) in mappings.items():
+    for (neighbor, port) in neighbors.items():
+      across[(sw, port)] = neighbor
+  tree = set()
+  for (a, b) in engine.tree_edges():
+    tree.add( (a, b) )
+    tree.add( (b, a) )
+  switches = engine.dpids.tolist()
+  for from_dpid in switches:
+    for to_dpid in switches:
+      sw = from_dpid
+      for hop in range(len(switches)):
+        if sw == to_dpid:
+          break
+        port = engine.next_hop(sw, to_dpid)
+        if port == None or (sw, across.get((sw, port))) not in tree:
+          return (from_dpid, to_dpid)
+        sw = across[(sw, port)]
+      if sw != to_dpid:
+        return (from_dpid, to_dpid)
+  return None
+
+def test_guide_topology():
+  passed = True
+  engine = from_dot(TOPOLOGY)
+  passed &= check("edge switches",
+    sorted(engine.edge_switches()) == [3, 4, 5, 7, 8, 9, 11, 12, 13], str(engine.edge_switches()))
+  passed &= check("core switches",
+    sorted(engine.core_switches()) == [1, 2, 6, 10], str(engine.core_switches()))
+  passed &= check("uplink ports", engine.uplink_ports() == dict( (sw, 4) for sw in engine.edge_switches() ))
+  passed &= check("port mappings", engine.port_mappings()[2][6] == 5 and engine.port_mappings()[6][2] == 5)
+  passed &= check("tree spans every switch", len(engine.tree_edges()) == len(engine.dpids) - 1)
+  enabled = engine.enabled_ports()
+  passed &= check("enabled ports are tree ports",
+    sum( len(ports) for ports in enabled.values() ) == 2 * len(engine.tree_edges()))
+  bad = bad_path(engine)
+  passed &= check("next hops follow the tree", bad == None, str(bad))
+  passed &= check("no next hop to itself", engine.next_hop(3, 3) == None)
+  return passed
+
+def test_generated_fabric():
+  (switches, edges) = fabric(300)
+  engine = PathEngine(switches, edges)
+  bad = bad_path(engine)
+  return check("next hops follow the tree in a 300 switch fabric", bad == None, str(bad))
+
+def test_components():
+  passed = True
+  # Two triangles and a switch on its own, with the 1-2 link listed twice
+  edges = [ (1, 2, 1, 1), (2, 3, 2, 1), (3, 1, 2, 2), (1, 2, 3, 3),
+    (4, 5, 1, 1), (5, 6, 2, 1), (6, 4, 2, 2) ]
+  engine = PathEngine([7], edges)
+  passed &= check("later duplicate link wins", engine.port_mappings()[1][2] == 3)
+  passed &= check("one tree per component", len(engine.roots) == 3)
+  passed &= check("no next hop between components",
+    engine.next_hop(1, 4) == None and engine.next_hop(7, 1) == None)
+  bad = bad_path(PathEngine([], edges[:4]))
+  passed &= check("next hops follow the tree in one component", bad == None, str(bad))
+  return passed
+
+def test_read_dot():
+  (switches, edges) = read_dot_topology(TOPOLOGY)
+  return check("reads every switch and link", len(switches) == 13 and len(edges) == 13,
+    "%d switches, %d links" % (len(switches), len(edges)))
+
+if __name__ == '__main__':
+  passed = True
+  passed &= test_read_dot()
+  passed &= test_guide_topology()
+  passed &= test_generated_fabric()
+  passed &= test_components()
+  sys.exit(0 if passed else 1)
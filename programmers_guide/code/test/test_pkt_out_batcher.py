@@ -0,0 +1,132 @@
+# Tests PktOutBatcher against a stand-in Frenetic controller running in this process.
+# Unlike test_suite.py this needs neither Mininet nor sudo.
+#
+#   python test_pkt_out_batcher.py
+
+import sys, json, logging
+from tornado import gen, web
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from frenetic.syntax import NotBuffered, SetPort
+sys.path.append("../common")
+from pkt_out_batcher import PktOutBatcher
+
+PORT = 9123
+
+class StandInController(object):
+  def __init__(self):
+    self.pkt_outs = []
+    # Every connection a pkt_out has come in on
+    self.seen_connections = []
+    # Set these to make the next responses fail, or close the connection
+    self.fail_status = None
+    self.close_after = None
+    controller = self
+
+    class PktOutHandler(web.RequestHandler):
+      def post(self):
+        controller.pkt_outs.append(json.loads(self.request.body))
+        if self.request.connection.stream not in controller.seen_connections:
+          controller.seen_connections.append(self.request.connection.stream)
+        if controller.fail_status != None:
+          self.set_status(controller.fail_status)
+        if controller.close_after != None and len(controller.pkt_outs) >= controller.close_after:
+          controller.close_after = None
+          self.set_header("Connection", "close")
+
+    self.server = HTTPServer(web.Application([ (r"/pkt_out", PktOutHandler) ]))
+
+  def connections(self):
+    return len(self.seen_connections)
+
+  def listen(self, port):
+    self.server.listen(port, address="127.0.0.1")
+
+  def stop(self):
+    self.server.stop()
+
+class StandInApp(object):
+  frenetic_http_host = "localhost"
+  frenetic_http_port = str(PORT)
+
+def payload(i):
+  return NotBuffered("packet %d" % i)
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+@gen.coroutine
+def test_one_connection(controller):
+  batcher = PktOutBatcher(StandInApp(), logging, window=0.01, max_packets=100)
+  results = yield [ batcher.pkt_out(1, payload(i), SetPort(2)) for i in range(250) ]
+  sent = [ p["payload"]["data"] for p in controller.pkt_outs ]
+  expected = [ NotBuffered("packet %d" % i).to_json()["data"] for i in range(250) ]
+  stats = batcher.stats()
+  raise gen.Return(
+    check("250 pkt_outs arrive in order", sent == expected) and
+    check("all answered", results == [200] * 250) and
+    check("one connection", controller.connections() == 1, str(controller.connections())) and
+    check("three batches", stats["batches"] == 3 and stats["mean_packets"] > 80, str(stats))
+  )
+
+@gen.coroutine
+def test_window(controller):
+  batcher = PktOutBatcher(StandInApp(), logging, window=0.01, max_packets=100)
+  yield [ batcher.pkt_out(1, payload(i), SetPort(2)) for i in range(3) ]
+  raise gen.Return(
+    check("window flushes a short batch", batcher.stats()["batches"] == 1 and
+      batcher.stats()["mean_wait_ms"] >= 5, str(batcher.stats()))
+  )
+
+@gen.coroutine
+def test_reconnect(controller):
+  batcher = PktOutBatcher(StandInApp(), logging, window=0.01, max_packets=100)
+  controller.close_after = len(controller.pkt_outs) + 1
+  yield batcher.pkt_out(1, payload(0), SetPort(2))
+  results = yield [ batcher.pkt_out(1, payload(i), SetPort(2)) for i in range(5) ]
+  raise gen.Return(
+    check("reconnects after Connection: close", results == [200] * 5 and controller.connections() == 2,
+      str(controller.connections()))
+  )
+
+@gen.coroutine
+def test_error_status(controller):
+  batcher = PktOutBatcher(StandInApp(), logging, window=0.01, max_packets=100)
+  controller.fail_status = 500
+  try:
+    yield batcher.pkt_out(1, payload(0), SetPort(2))
+    failed = False
+  except IOError:
+    failed = True
+  controller.fail_status = None
+  results = yield [ batcher.pkt_out(1, payload(i), SetPort(2)) for i in range(2) ]
+  raise gen.Return(
+    check("error status fails only that packet", failed and results == [200, 200] and
+      batcher.stats()["errors"] == 1)
+  )
+
+# As with frenetic.App.pkt_out, policies stands in for actions
+@gen.coroutine
+def test_policies_keyword(controller):
+  batcher = PktOutBatcher(StandInApp(), logging, window=0.01, max_packets=100)
+  yield batcher.pkt_out(1, payload(0), None, policies=SetPort(3))
+  yield batcher.pkt_out(1, payload(1), SetPort(2), policies=SetPort(3))
+  ports = [ p["policies"][0]["value"]["port"] for p in controller.pkt_outs ]
+  raise gen.Return(check("policies keyword is taken", ports == [3, 3], str(ports)))
+
+@gen.coroutine
+def run_tests():
+  passed = True
+  for test in [ test_one_connection, test_window, test_reconnect, test_error_status,
+    test_policies_keyword ]:
+    controller = StandInController()
+    controller.listen(PORT)
+    passed = (yield test(controller)) and passed
+    controller.stop()
+  raise gen.Return(passed)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = IOLoop.instance().run_sync(run_tests)
+  sys.exit(0 if passed else 1)
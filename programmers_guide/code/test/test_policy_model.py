@@ -0,0 +1,92 @@
+# Tests that PolicyModel sends a packet to the controller exactly when the app's policy does.
+#
+#   python test_policy_model.py
+
+import sys, json
+from stand_in_frenetic import tcp_frame
+from policy_model import PolicyModel, flow_entries
+
+H1 = ("00:00:00:00:00:01", "10.0.0.1")
+H2 = ("00:00:00:00:00:02", "10.0.0.2")
+H3 = ("00:00:00:00:00:03", "10.0.1.3")
+
+def frame(src, dst):
+  return tcp_frame(src[0], dst[0], src[1], dst[1], 40000, 80)
+
+def test(header, value):
+  return { "type": "test", "header": header, "value": value }
+
+def seq(*pols):
+  return { "type": "seq", "pols": list(pols) }
+
+def union(*pols):
+  return { "type": "union", "pols": list(pols) }
+
+def filter(pred):
+  return { "type": "filter", "pred": pred }
+
+def output(location):
+  return { "type": "mod", "header": "location", "value": location }
+
+def to_port(port_id):
+  return output({ "type": "physical", "port": port_id })
+
+TO_CONTROLLER = output({ "type": "pipe", "name": "learning" })
+
+# Like learning2: send packets to known destinations, and everything else to the controller
+def learning_policy(known):
+  known_pred = { "type": "or", "preds": [ test("ethdst", int(mac.replace(":", ""), 16)) for (mac, _) in known ] }
+  return union(
+    seq(filter(known_pred), to_port(2)),
+    seq(filter({ "type": "neg", "pred": known_pred }), TO_CONTROLLER)
+  )
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+def test_no_policy():
+  model = PolicyModel()
+  return check("everything is punted before the first update", model.punts(1, 1, frame(H1, H2)))
+
+def test_learning():
+  model = PolicyModel()
+  model.update("learning", json.dumps(learning_policy([ H2 ])))
+  before = model.punts(1, 1, frame(H1, H2)), model.punts(1, 1, frame(H1, H3))
+  model.update("learning", json.dumps(learning_policy([ H2, H3 ])))
+  after = model.punts(1, 1, frame(H1, H3))
+  return check("known destinations are switched, unknown ones punted",
+    before == (False, True) and after == False, str((before, after)))
+
+def test_prefix_and_location():
+  model = PolicyModel()
+  subnet = test("ip4dst", { "addr": "10.0.1.0", "mask": 24 })
+  on_port_1 = test("location", { "type": "physical", "port": 1 })
+  model.update("router", json.dumps(
+    seq(filter({ "type": "and", "preds": [ subnet, on_port_1 ] }), TO_CONTROLLER)
+  ))
+  return check("ip4 prefixes and locations are matched",
+    model.punts(1, 1, frame(H1, H3)) and not model.punts(1, 2, frame(H1, H3))
+      and not model.punts(1, 1, frame(H1, H2)))
+
+def test_client_ids_union():
+  model = PolicyModel()
+  model.update("a", json.dumps(seq(filter(test("ethsrc", 1)), to_port(2))))
+  model.update("b", json.dumps(seq(filter(test("ethsrc", 1)), TO_CONTROLLER)))
+  return check("policies of every client id are unioned", model.punts(1, 1, frame(H1, H2)))
+
+def test_flow_entries():
+  macs = { "type": "or", "preds": [ test("ethdst", i) for i in range(5) ] }
+  per_host = union(*[ seq(filter(test("ethdst", i)), to_port(i % 2)) for i in range(5) ])
+  grouped = seq(filter(macs), union(to_port(1), to_port(2)))
+  by_source = seq(filter(macs), learning_policy([ H1, H2 ]))
+  counts = (flow_entries(per_host), flow_entries(grouped), flow_entries(by_source))
+  return check("a filter on n values is n flow entries, and nested filters multiply",
+    counts == (5, 5, 15), str(counts))
+
+if __name__ == '__main__':
+  passed = True
+  for t in [ test_no_policy, test_learning, test_prefix_and_location, test_client_ids_union,
+      test_flow_entries ]:
+    passed = t() and passed
+  sys.exit(0 if passed else 1)
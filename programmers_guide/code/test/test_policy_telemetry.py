@@ -0,0 +1,63 @@
+# Tests PolicyTelemetry's measurements.  Nothing is sent to Frenetic.
+#
+#   python test_policy_telemetry.py
+
+import sys, json, logging
+from frenetic.syntax import *
+sys.path.append("../common")
+from policy_telemetry import PolicyTelemetry, policy_shape, tree_shape
+from policy_cache import PolicyCache
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+def rule(mac, port_id):
+  return Filter(EthDstEq(mac)) >> SetPort(port_id)
+
+def test_shape():
+  policy = Union([ rule("02:00:00:00:00:01", 1), rule("02:00:00:00:00:02", 2),
+    Filter(EthDstEq("02:00:00:00:00:01") & PortEq(3)) >> SetPort(1) ])
+  (nodes, depth, tests) = policy_shape(json.loads(json.dumps(policy.to_json())))
+  # union, 3 x (seq, filter, mod), 2 tests, and an and with 2 tests
+  return check("shape counts nodes, depth and distinct tests",
+    nodes == 15 and depth == 5 and tests == 3, str((nodes, depth, tests)))
+
+def test_tree_shape():
+  pc = PolicyCache()
+  macs = [ "02:00:00:00:00:01", "02:00:00:00:00:02" ]
+  def build():
+    return pc.seq(
+      pc.make(Filter, pc.make(SwitchEq, 1)),
+      pc.make(IfThenElse,
+        pc.make(And, [ pc.make(EthSrcNotEq, macs), pc.make(PortNotEq, 1) ]),
+        pc.make(SendToController, "test"),
+        pc.union([ pc.make(SetPort, [ 1, 2, 3 ]), pc.make(SetPort, 4),
+          pc.seq(pc.make(Filter, pc.make(EthDstEq, macs[0])), pc.make(SetPort, 1)) ])
+      )
+    )
+  policy = build()
+  (nodes, depth, tests) = tree_shape(policy)
+  expected = policy_shape(json.loads(pc.to_json_text(policy)))
+  passed = check("shape of the objects matches shape of their JSON",
+    (nodes, depth, len(tests)) == expected, str(((nodes, depth, len(tests)), expected)))
+  passed &= check("shapes are remembered on the nodes", build().telemetry_shape is policy.telemetry_shape)
+  return passed
+
+def test_records():
+  telemetry = PolicyTelemetry(logging, window=2, summary_interval=None)
+  telemetry.note("lb", "build", 0.004)
+  telemetry.record("lb", json.dumps(rule("02:00:00:00:00:01", 1).to_json()))
+  for i in range(3):
+    telemetry.record("lb", json.dumps(Union([ rule("02:00:00:00:00:01", 1) ] * (i + 2)).to_json()))
+  s = telemetry.stats()["lb"]
+  return check("only the last window updates are kept", len(telemetry.recent["lb"]) == 2 and
+      s["updates"] == 4 and s["nodes"] == 17, str(s)) and \
+    check("build times are dropped with their update", s["mean_build_ms"] == None, str(s))
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = True
+  for test in [ test_shape, test_tree_shape, test_records ]:
+    passed = test() and passed
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,56 @@
+# Tests StandInFrenetic with a small app running in this process.  Like
+# test_pkt_out_batcher.py, this needs neither Mininet nor sudo.
+#
+#   python test_stand_in_frenetic.py
+
+import sys, logging
+from tornado import gen
+from tornado.ioloop import IOLoop
+from frenetic.syntax import NotBuffered, SetPort, SendToController
+sys.path.append("../common")
+from coroutine_app import CoroutineApp
+from lazy_packet import payload_data
+from stand_in_frenetic import StandInFrenetic, tcp_frame, paced
+
+PORT = 9128
+
+# Echoes even-numbered packets back, and answers odd ones with a frame of its own
+class EchoApp(CoroutineApp):
+  client_id = "echo"
+  frenetic_http_port = str(PORT)
+
+  @gen.coroutine
+  def connected(self):
+    self.switches = yield self.current_switches()
+    yield self.update( SendToController("echo") )
+
+  def packet_in(self, dpid, port_id, payload):
+    seq = int(payload_data(payload)[-8:])
+    if seq % 2 == 0:
+      self.pkt_out(dpid, payload, SetPort(2))
+    else:
+      self.pkt_out(dpid, NotBuffered("reply %d" % seq), SetPort(port_id))
+      self.update( SendToController("echo") )
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+@gen.coroutine
+def test_echo():
+  frame = tcp_frame("02:00:00:00:00:01", "02:00:00:00:00:02", "10.0.0.1", "10.0.0.2", 40000, 80)
+  controller = StandInFrenetic({ 1: [1, 2] }, paced([ (1, 1, frame) ] * 20, 200), settle=0.2, grace=1)
+  app = EchoApp()
+  summary = yield controller.run(PORT)
+  raise gen.Return(
+    check("app sees the stand-in's switches", app.switches == { 1: [1, 2] }, str(app.switches)) and
+    check("echoed packets are timed", summary["answered"] == 10 and summary["p99_ms"] > 0,
+      str(summary)) and
+    check("other pkt_outs are counted", summary["other_pkt_outs"] == 10, str(summary)) and
+    check("updates while packets arrive are counted", summary["updates"] == 10, str(summary))
+  )
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = IOLoop.instance().run_sync(test_echo)
+  sys.exit(0 if passed else 1)
@@ -101,6 +101,7 @@ pingall_test("l2_learning_switch", "learning1.py")
 pingall_test("l2_learning_switch", "learning2.py", expect_pct=100)
 pingall_test("l2_learning_switch", "learning3.py")
 pingall_test("l2_learning_switch", "learning4.py")
+pingall_test("l2_learning_switch", "learning6.py")
 pingall_test("handling_vlans", "vlan1.py", expect_pct=66)
 sys.path.append("../handling_vlans")
 from mn_custom_topo import VlanMininetBuilder
@@ -0,0 +1,74 @@
+# Tests that compiled_topology compiles a topology file once, reuses the result until the
+# file or the compiler version changes, and copes with a broken or unwritable cache.
+#
+#   python test_topology_cache.py
+
+import sys, os, shutil, tempfile, logging
+sys.path.append("../common")
+from topology_cache import compiled_topology, cache_path
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+class Compiler(object):
+  def __init__(self):
+    self.runs = 0
+
+  def compile_topology(self, topology_file):
+    self.runs += 1
+    with open(topology_file) as f:
+      lines = f.read().split("\n")
+    return ({ 1: { 2: 3 } }, set([ 4 ]), [ (5, 6) ], lines)
+
+def write(path, text):
+  with open(path, "w") as f:
+    f.write(text)
+
+def test_cache(directory):
+  passed = True
+  path = os.path.join(directory, "topo.dot")
+  write(path, "graph a { 1 -- 2 }")
+  compiler = Compiler()
+  def load(version=1):
+    return compiled_topology(path, "test", compiler.compile_topology, logging, version)
+
+  first = load()
+  second = load()
+  passed &= check("compiles once", compiler.runs == 1, str(compiler.runs))
+  passed &= check("cached value matches", first == second, str(second))
+
+  write(path, "graph a { 1 -- 3 }")
+  changed = load()
+  passed &= check("recompiles when the file changes",
+    compiler.runs == 2 and changed[3] == [ "graph a { 1 -- 3 }" ])
+
+  load(version=2)
+  passed &= check("recompiles when the version changes", compiler.runs == 3)
+  load(version=2)
+  passed &= check("then uses the cache again", compiler.runs == 3)
+
+  write(cache_path(path, "test"), "garbage")
+  passed &= check("recompiles over a broken cache", load(version=2) == changed and compiler.runs == 4)
+  return passed
+
+def test_unwritable(directory):
+  path = os.path.join(directory, "topo.dot")
+  write(path, "graph b { 1 -- 2 }")
+  os.mkdir(cache_path(path, "test"))
+  compiler = Compiler()
+  compiled = compiled_topology(path, "test", compiler.compile_topology, logging)
+  leftovers = [ f for f in os.listdir(directory) if f.endswith(".tmp") ]
+  return check("works without a cache", compiled[3] == [ "graph b { 1 -- 2 }" ] and leftovers == [],
+    str(leftovers))
+
+if __name__ == '__main__':
+  logging.basicConfig(level=logging.ERROR)
+  passed = True
+  for test in [ test_cache, test_unwritable ]:
+    directory = tempfile.mkdtemp()
+    try:
+      passed &= test(directory)
+    finally:
+      shutil.rmtree(directory)
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,128 @@
+# Tests that MultiswitchApp3 with discover_topology finds the links between switches with
+# LLDP probes, against a StandInFrenetic that carries pkt_outs across a generated fabric,
+# and ends up with the same switches and ports as reading the fabric from a file.  Like
+# test_stand_in_frenetic.py, this needs neither Mininet nor sudo.
+#
+#   python test_topology_discovery.py
+
+import sys, os, tempfile, logging
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+sys.path.append("../multiswitch_topologies")
+from multiswitch3 import MultiswitchApp3
+from network_information_base_from_file import NetworkInformationBaseFromFile
+from bench_path_engine import fabric, write_dot
+sys.path.append("../common")
+from topology_cache import cache_path
+from topology_discovery import probe_frame, parse_probe
+from frenetic.syntax import NotBuffered
+from stand_in_frenetic import StandInFrenetic
+
+PORT = 9131
+
+class DiscoveringApp(MultiswitchApp3):
+  frenetic_http_port = str(PORT)
+  discover_topology = True
+
+  def topology_discovered(self, port_mappings):
+    MultiswitchApp3.topology_discovered(self, port_mappings)
+    self.discoveries += 1
+    if not self.first_discovery.done():
+      self.first_discovery.set_result(port_mappings)
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+# Every switch has its links, then a couple of ports for hosts
+def switch_ports(switches, edges):
+  ports = dict( (sw, []) for sw in switches )
+  for (a, b, a_port, b_port) in edges:
+    ports[a].append(a_port)
+    ports[b].append(b_port)
+  return dict( (sw, sorted(p) + [ max(p) + 1, max(p) + 2 ]) for (sw, p) in ports.items() )
+
+def expected_port_mappings(edges):
+  port_mappings = {}
+  for (a, b, a_port, b_port) in edges:
+    port_mappings.setdefault(a, {})[b] = a_port
+    port_mappings.setdefault(b, {})[a] = b_port
+  return port_mappings
+
+def file_nib(switches, edges):
+  (fd, path) = tempfile.mkstemp(suffix=".dot")
+  os.close(fd)
+  try:
+    write_dot(path, switches, edges)
+    return NetworkInformationBaseFromFile(logging, path)
+  finally:
+    for p in [ path, cache_path(path, "multiswitch") ]:
+      if os.path.exists(p):
+        os.remove(p)
+
+def test_probes():
+  frame = probe_frame(0x1234567890, 17, 42)
+  return check("probes name their switch and port", parse_probe(frame, 42) == (0x1234567890, 17)) and \
+    check("other controllers' probes are ignored", parse_probe(frame, 43) == None) and \
+    check("truncated probes are ignored", parse_probe(frame[:30], 42) == None)
+
+@gen.coroutine
+def test_discovery():
+  (switches, edges) = fabric(60)
+  controller = StandInFrenetic(switch_ports(switches, edges), [], settle=0.1, links=edges)
+  controller.listen(PORT)
+  app = DiscoveringApp()
+  app.discoveries = 0
+  app.first_discovery = Future()
+  passed = True
+  try:
+    port_mappings = yield gen.with_timeout(IOLoop.instance().time() + 20, app.first_discovery)
+    passed &= check("every link is found", port_mappings == expected_port_mappings(edges))
+    nib = file_nib(switches, edges)
+    passed &= check("switches are classified as from the file",
+      app.nib.core_switches == nib.core_switches and app.nib.edge_switches == nib.edge_switches and
+      app.nib.uplink_port == nib.uplink_port)
+    passed &= check("every core switch reaches every switch",
+      all( app.nib.next_hop_port_to(core_dpid, dpid, None) != None
+        for core_dpid in app.nib.core_switches for dpid in switches if dpid != core_dpid ))
+    passed &= check("every port is probed once", app.discovery.sent == sum( len(p) for p in controller.switches.values() ),
+      str(app.discovery.sent))
+    passed &= check("probes aren't learned as hosts", app.nib.all_learned_macs() == [])
+
+    foreign = probe_frame(switches[0], 1, app.discovery.nonce + 1)
+    passed &= check("other controllers' probes don't make links",
+      app.discovery.packet_in(switches[-1], 1, NotBuffered(foreign)) and
+      app.discovery.port_mappings() == port_mappings)
+
+    (a, b, a_port, b_port) = edges[-1]
+    app.port_down(a, a_port)
+    yield gen.sleep(0.2)
+    passed &= check("a port going down drops its link",
+      b not in app.nib.port_mappings.get(a, {}) and a not in app.nib.port_mappings[b])
+    app.port_up(a, a_port)
+    yield gen.sleep(0.5)
+    passed &= check("and it's found again when it comes back",
+      app.nib.port_mappings[a].get(b) == a_port and app.discoveries == 3, str(app.discoveries))
+
+    # A switch at the end of one link, so the rest stay connected without it
+    leaf = [ sw for sw in switches if len(expected_port_mappings(edges).get(sw, {})) == 1 ][0]
+    leaf_ports = list(app.nib.ports[leaf])
+    app.switch_down(leaf)
+    yield gen.sleep(0.2)
+    passed &= check("a switch going down takes its ports and links with it",
+      leaf not in app.nib.ports and leaf not in app.nib.port_mappings)
+    app.switch_up(leaf, leaf_ports)
+    yield gen.sleep(0.5)
+    passed &= check("and they're found again when it comes back",
+      app.nib.ports.get(leaf) == leaf_ports and app.nib.port_mappings == port_mappings)
+  finally:
+    app.discovery.stop()
+    controller.stop()
+  raise gen.Return(passed)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = test_probes()
+  passed &= IOLoop.instance().run_sync(test_discovery)
+  sys.exit(0 if passed else 1)
@@ -0,0 +1,82 @@
+# Tests that UpdateScheduler collapses requests made while an update is in flight into
+# one send of the latest policy, and logs what it merged.  Frenetic is stood in for by an
+# app whose update() hands back a Future the test resolves, so this needs neither
+# Mininet nor sudo.
+#
+#   python test_update_scheduler.py
+
+import sys, logging
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+sys.path.append("../common")
+from update_scheduler import UpdateScheduler
+
+class StandInApp(object):
+  client_id = "test"
+
+  def __init__(self):
+    # (policy, Future) for each update sent
+    self.updates = []
+
+  def update(self, policy):
+    ftr = Future()
+    self.updates.append( (policy, ftr) )
+    return ftr
+
+class RecordingLogger(object):
+  def __init__(self):
+    self.lines = []
+
+  def info(self, msg):
+    self.lines.append(msg)
+
+  def error(self, msg):
+    self.lines.append(msg)
+
+def check(name, ok, detail=""):
+  print name + ("...ok" if ok else "...FAILED " + detail)
+  return ok
+
+@gen.coroutine
+def test_coalescing():
+  app = StandInApp()
+  logger = RecordingLogger()
+  scheduler = UpdateScheduler(app, logger, min_interval=0.01, max_staleness=0.05, log_interval=0)
+  passed = True
+
+  scheduler.schedule(lambda: "policy 1")
+  yield gen.sleep(0.03)
+  passed &= check("first request is sent", [ p for (p, f) in app.updates ] == [ "policy 1" ])
+
+  # While policy 1 is in flight, nothing else goes out, however long we wait
+  for i in range(2, 6):
+    scheduler.schedule(lambda i=i: "policy %d" % i)
+  yield gen.sleep(0.1)
+  passed &= check("nothing sent while an update is in flight", len(app.updates) == 1,
+    str(len(app.updates)))
+
+  app.updates[0][1].set_result(None)
+  yield gen.sleep(0.03)
+  passed &= check("requests in flight collapse into one send of the latest",
+    [ p for (p, f) in app.updates ] == [ "policy 1", "policy 5" ],
+    str([ p for (p, f) in app.updates ]))
+  stats = scheduler.stats()
+  passed &= check("merges are counted",
+    stats == { "requested": 5, "sent": 2, "merged": 3, "pending": 0 }, str(stats))
+  # Logged when policy 1 came back, just before policy 5 went out
+  passed &= check("stats are logged as updates finish",
+    logger.lines == [ "Updates: 5 requested, 1 sent, 3 merged, 1 pending" ], str(logger.lines))
+
+  app.updates[1][1].set_result(None)
+  scheduler.schedule(lambda: "policy 6")
+  scheduler.flush()
+  yield gen.sleep(0)
+  yield gen.sleep(0)
+  passed &= check("flush sends at once", len(app.updates) == 3 and app.updates[2][0] == "policy 6")
+  raise gen.Return(passed)
+
+if __name__ == '__main__':
+  logging.basicConfig(stream = sys.stderr, level=logging.CRITICAL)
+  passed = IOLoop.instance().run_sync(test_coalescing)
+  sys.exit(0 if passed else 1)